@@ -0,0 +1 @@
+"""每日美股與天氣推送 (LINE / Slack)"""
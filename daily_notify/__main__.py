@@ -0,0 +1,74 @@
+"""
+命令列入口
+
+    python -m daily_notify [stocks|weather|all] [--dry-run]
+    python -m daily_notify alerts
+    python -m daily_notify subscribers [--at HH:MM] [--dry-run]
+
+只載入該工作需要的模組: --help 不會載入任何推送相關模組,
+Slack 與 dry-run 不會載入 linebot。
+"""
+import argparse
+import os
+import sys
+
+# 各模組以同目錄匯入 (與 python daily_notify/run.py 相同)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m daily_notify', description='每日美股與天氣推送')
+    parser.add_argument('job', nargs='?', default='all',
+                        choices=['stocks', 'weather', 'all', 'alerts',
+                                 'subscribers'],
+                        help='要執行的工作 (預設 all;alerts 檢查一次警示規則;'
+                             'subscribers 推送個人化訂閱)')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='只抓取並輸出內容,不推送')
+    parser.add_argument('--location', default='高雄市', help='天氣預報縣市')
+    parser.add_argument('--batch', action='store_true', default=None,
+                        help='LINE 合併成 carousel 推送 (預設讀取 LINE_BATCH)')
+    parser.add_argument('--incremental', action='store_true', default=None,
+                        help='內容未變動時略過推送 (預設讀取 PUSH_ONLY_CHANGED)')
+    parser.add_argument('--at', metavar='HH:MM',
+                        help='subscribers: 只推送設定此時間的訂閱者 (預設全部)')
+    args = parser.parse_args(argv)
+    if args.job == 'alerts' and args.dry_run:
+        parser.error('--dry-run is not supported for alerts')
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    import run
+    from metrics import metrics
+
+    if args.job == 'alerts':
+        if not run.alert_rules_path:
+            print('ALERT_RULES_PATH not set')
+            return 1
+        pipeline = run.build_alert_pipeline()
+    elif args.job == 'subscribers':
+        if not run.subscribers_db:
+            print('SUBSCRIBERS_DB not set')
+            return 1
+        pipeline = run.build_subscriber_pipeline(deliver_at=args.at,
+                                                 dry_run=args.dry_run)
+    else:
+        pipeline = run.build_pipeline(
+            location=args.location,
+            batch=run.line_batch if args.batch is None else args.batch,
+            incremental=(run.push_only_changed if args.incremental is None
+                         else args.incremental),
+            stocks=args.job in ('stocks', 'all'),
+            weather=args.job in ('weather', 'all'),
+            dry_run=args.dry_run)
+    pipeline.run()
+    pipeline.report()
+    metrics.export()
+    return 0 if pipeline.ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
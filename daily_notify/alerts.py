@@ -0,0 +1,209 @@
+"""
+門檻警示
+
+規則設定檔 (JSON):
+    {
+      "symbols": {"台積電": "twstock/TWS/2330"},
+      "rules": [
+        {"id": "sox-3", "symbol": "費城半導體", "field": "percent",
+         "op": "abs>", "value": 3, "users": ["Uxxxxxxxx"]},
+        {"id": "khh-rain", "location": "高雄市", "field": "rain",
+         "op": ">", "value": 70, "users": ["Uxxxxxxxx"], "cooldown": 21600}
+      ]
+    }
+
+報價欄位: price / change / percent;天氣欄位 (36 小時內): rain (最高降雨機率)、
+maxTemp (最高溫)、minTemp (最低溫)。op 為 >、< 或 abs> (絕對值大於)。
+
+規則依 (代號或縣市, 欄位, op) 建立索引並依門檻排序,新資料只需二分搜尋
+相關的規則,與規則總數無關。觸發後在 cooldown 秒內不再重複通知。
+"""
+import bisect
+import json
+import os
+import threading
+import time
+
+OPS = ('>', '<', 'abs>')
+QUOTE_FIELDS = ('price', 'change', 'percent')
+WEATHER_FIELDS = ('rain', 'maxTemp', 'minTemp')
+DEFAULT_COOLDOWN = 60 * 60
+
+FIELD_LABELS = {
+    'price': '價格',
+    'change': '漲跌',
+    'percent': '漲跌幅',
+    'rain': '降雨機率',
+    'maxTemp': '最高溫',
+    'minTemp': '最低溫',
+}
+FIELD_UNITS = {'percent': '%', 'rain': '%', 'maxTemp': '°C', 'minTemp': '°C'}
+
+
+def weather_values(weather_data):
+    """36 小時預報 (weather_data) -> 各欄位的極值"""
+    return {
+        'rain': max(float(w['rain']) for w in weather_data),
+        'maxTemp': max(float(w['maxTemp']) for w in weather_data),
+        'minTemp': min(float(w['minTemp']) for w in weather_data),
+    }
+
+
+class RuleIndex:
+    """(類別, key, 欄位, op) -> 依門檻排序的規則"""
+
+    def __init__(self):
+        self._index = {}  # -> (thresholds, rules)
+        self.keys = {}  # 類別 -> {key: 顯示名稱}
+
+    def add(self, rule):
+        if rule['op'] not in OPS:
+            raise ValueError(f"Unknown alert op in rule {rule['id']}: {rule['op']}")
+        fields = QUOTE_FIELDS if rule['kind'] == 'quote' else WEATHER_FIELDS
+        if rule['field'] not in fields:
+            raise ValueError(
+                f"Unknown alert field in rule {rule['id']}: {rule['field']}")
+        slot = self._index.setdefault(
+            (rule['kind'], rule['key'], rule['field'], rule['op']), ([], []))
+        i = bisect.bisect_right(slot[0], rule['value'])
+        slot[0].insert(i, rule['value'])
+        slot[1].insert(i, rule)
+        self.keys.setdefault(rule['kind'], {})[rule['key']] = rule['name']
+
+    def match(self, kind, key, values):
+        """回傳 [(規則, 目前數值)],只檢查參照此 key 的規則"""
+        matched = []
+        for field, value in values.items():
+            for op in OPS:
+                slot = self._index.get((kind, key, field, op))
+                if slot is None:
+                    continue
+                thresholds, rules = slot
+                if op == '>':
+                    hits = rules[:bisect.bisect_left(thresholds, value)]
+                elif op == 'abs>':
+                    hits = rules[:bisect.bisect_left(thresholds, abs(value))]
+                else:
+                    hits = rules[bisect.bisect_right(thresholds, value):]
+                matched.extend((rule, value) for rule in hits)
+        return matched
+
+    def __len__(self):
+        return sum(len(rules) for _, rules in self._index.values())
+
+
+class AlertEngine:
+    """
+    Args:
+        rules: 已正規化的規則 (load_rules 的結果)
+        state_path: 記錄最後觸發時間的 JSON 檔,None 表示只存在記憶體
+    """
+
+    def __init__(self, rules, state_path=None):
+        self.index = RuleIndex()
+        for rule in rules:
+            self.index.add(rule)
+        self.state_path = state_path
+        self._lock = threading.Lock()
+        self._fired = self._load_state()
+
+    def _load_state(self):
+        if not self.state_path:
+            return {}
+        try:
+            with open(self.state_path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save(self):
+        if not self.state_path:
+            return
+        with self._lock:
+            state = dict(self._fired)
+        directory = os.path.dirname(self.state_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp = f'{self.state_path}.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(tmp, self.state_path)
+
+    def symbols(self):
+        """規則參照的 {網址: 名稱}"""
+        return dict(self.index.keys.get('quote', {}))
+
+    def locations(self):
+        """規則參照的縣市"""
+        return list(self.index.keys.get('weather', {}))
+
+    def evaluate(self, kind, key, values, now=None):
+        """檢查一筆新資料,回傳這次要通知的 [(規則, 數值)] 並記錄觸發時間"""
+        now = time.time() if now is None else now
+        alerts = []
+        with self._lock:
+            for rule, value in self.index.match(kind, key, values):
+                last = self._fired.get(rule['id'])
+                if last is not None and now - last < rule['cooldown']:
+                    continue
+                self._fired[rule['id']] = now
+                alerts.append((rule, value))
+        return alerts
+
+
+def format_alert(rule, value):
+    unit = FIELD_UNITS.get(rule['field'], '')
+    op = '±' if rule['op'] == 'abs>' else ''
+    comparison = '低於' if rule['op'] == '<' else '超過'
+    return (f"⚠️ {rule['name']} {FIELD_LABELS[rule['field']]} "
+            f"{value:,.2f}{unit} ({comparison} {op}{rule['value']:g}{unit})")
+
+
+def group_messages(alerts):
+    """
+    [(規則, 數值)] -> {訊息文字: [user_id, ...]}
+
+    每位使用者的所有警示合併成一則訊息,內容相同的使用者共用 multicast
+    """
+    per_user = {}
+    for rule, value in alerts:
+        for user_id in rule['users']:
+            per_user.setdefault(user_id, []).append(format_alert(rule, value))
+    groups = {}
+    for user_id, lines in per_user.items():
+        groups.setdefault('\n'.join(lines), []).append(user_id)
+    return groups
+
+
+def load_rules(path, resolve):
+    """
+    讀取規則設定檔
+
+    Args:
+        resolve: callable(symbols) -> callable(名稱或路徑) -> 網址,
+            用來將 symbol 轉成與報價來源相同的網址
+    """
+    with open(path, encoding='utf-8') as f:
+        config = json.load(f)
+    to_url = resolve(config.get('symbols'))
+    rules = []
+    for i, raw in enumerate(config.get('rules') or []):
+        rule_id = str(raw.get('id', i))
+        if 'symbol' in raw:
+            kind, key, name = 'quote', to_url(raw['symbol']), raw['symbol']
+        elif 'location' in raw:
+            kind, key, name = 'weather', raw['location'], raw['location']
+        else:
+            raise ValueError(f"Alert rule {rule_id} needs a symbol or location")
+        rules.append({
+            'id': rule_id,
+            'kind': kind,
+            'key': key,
+            'name': name,
+            'field': raw['field'],
+            'op': raw.get('op', '>'),
+            'value': float(raw['value']),
+            'users': list(raw.get('users') or []),
+            'cooldown': float(raw.get('cooldown', DEFAULT_COOLDOWN)),
+        })
+    return rules
@@ -0,0 +1,87 @@
+"""
+指數技術指標
+
+只讀取每個指數最近 LOOKBACK 筆歷史 (mmap 尾端切片),
+因此每次執行的成本固定,不隨歷史長度增加。
+"""
+import bisect
+from array import array
+
+DAY = 24 * 60 * 60
+# 報價時間為台北時間,以此切分日期
+TAIPEI_OFFSET = 8 * 60 * 60
+MA_WINDOWS = (5, 20, 60)  # 交易日數
+# 52 週約 252 個交易日,多取一些涵蓋假日
+LOOKBACK = 300
+SPARKLINE_POINTS = 60
+
+
+def with_quote(history, record):
+    """歷史尾端加上本次報價 (歷史寫入可能尚未完成)"""
+    times, prices = history['time'], history['price']
+    if record and (not times or record['time'] > times[-1]):
+        times = times + array('q', [record['time']])
+        prices = prices + array('d', [record['price']])
+    return times, prices
+
+
+def daily_closes(times, prices):
+    """
+    每個 (台北時間) 日期只保留最後一筆
+
+    同一天可能寫入多筆 (盤中輪詢、重複執行),均線的視窗必須以交易日計算
+    """
+    days = [(t + TAIPEI_OFFSET) // DAY for t in times]
+    keep = [i for i in range(len(days))
+            if i + 1 == len(days) or days[i + 1] != days[i]]
+    if len(keep) == len(days):
+        return times, prices
+    return (array('q', (times[i] for i in keep)),
+            array('d', (prices[i] for i in keep)))
+
+
+def _change_since(times, prices, seconds):
+    """最新價格相對 seconds 秒前 (或更早最近一筆) 的漲跌幅 %"""
+    i = bisect.bisect_right(times, times[-1] - seconds) - 1
+    if i < 0 or not prices[i]:
+        return None
+    return (prices[-1] / prices[i] - 1) * 100
+
+
+def indicators(times, prices):
+    """
+    Args:
+        times / prices: 每個交易日一筆 (見 daily_closes)
+
+    Returns:
+        {'ma': {天數: 均價}, 'week': %, 'month': %, 'high52', 'low52'},
+        資料不足的欄位為 None;沒有資料時回傳 None
+    """
+    if not prices:
+        return None
+    year = prices[bisect.bisect_left(times, times[-1] - 365 * DAY):]
+    return {
+        'ma': {w: sum(prices[-w:]) / w if len(prices) >= w else None
+               for w in MA_WINDOWS},
+        'week': _change_since(times, prices, 7 * DAY),
+        'month': _change_since(times, prices, 30 * DAY),
+        'high52': max(year),
+        'low52': min(year),
+    }
+
+
+def analyze(history, record=None, sparklines=None):
+    """
+    Args:
+        history: QuoteHistory.latest(name, LOOKBACK) 的結果
+        record: 本次報價 (quote_record),尚未寫入歷史時一併計算
+        sparklines: SparklineStore,None 表示不產生走勢圖
+    """
+    times, prices = daily_closes(*with_quote(history, record))
+    stats = indicators(times, prices)
+    if stats is None:
+        return None
+    stats['sparkline'] = None
+    if sparklines is not None and len(prices) > 1:
+        stats['sparkline'] = sparklines.url(prices[-SPARKLINE_POINTS:])
+    return stats
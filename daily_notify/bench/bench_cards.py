@@ -0,0 +1,84 @@
+"""
+PNG 卡片繪製與快取效能
+
+    python daily_notify/bench/bench_cards.py [--cards N] [--recipients N] [--processes N]
+
+模擬 --recipients 位收件者共用 --cards 種不同的卡片 (一半美股、一半天氣):
+比較本程序逐張繪製、子程序並行繪製,以及所有卡片都已存在 (快取命中) 的時間。
+需要 Pillow。
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fixtures  # noqa: E402
+from image_cards import CardStore  # noqa: E402
+
+
+def make_cards(count):
+    """count 種不同的卡片"""
+    cards = []
+    for i in range(count):
+        if i % 2 == 0:
+            stocks = [{'name': name, 'date': '2026/10/17', 'price': price,
+                       'change': net.lstrip('+-'), 'percent': pct.lstrip('+-'),
+                       'trend': 'down' if net.startswith('-') else 'up'}
+                      for name, _, price, net, pct in fixtures.INDICES]
+            stocks[0] = dict(stocks[0], price=f'{40000 + i:,}.00')
+            cards.append(('stock', {'stocks_data': stocks}))
+        else:
+            location = fixtures.COUNTIES[i % len(fixtures.COUNTIES)]
+            weather = [{'period': '晚上', 'emoji': '🌃',
+                        'time': f'{start[5:16]} - {end[5:16]}',
+                        'weather': '多雲', 'comfort': '舒適',
+                        'minTemp': str(18 + i % 7), 'maxTemp': '28',
+                        'rain': str(10 * (i % 10))}
+                       for start, end in fixtures.PERIODS]
+            cards.append(('weather', {'location_name': location,
+                                      'weather_data': weather}))
+    return cards
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--cards', type=int, default=48)
+    parser.add_argument('--recipients', type=int, default=2000)
+    parser.add_argument('--processes', type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    try:
+        import PIL  # noqa: F401
+    except ImportError:
+        print("skipped (Pillow not installed)")
+        return
+
+    distinct = make_cards(args.cards)
+    requests = [distinct[i % len(distinct)] for i in range(args.recipients)]
+    print(f"{args.recipients} recipients, {len(distinct)} distinct cards")
+
+    for name, processes in (('inline', 1), ('pool', args.processes)):
+        directory = tempfile.mkdtemp(prefix='cards-')
+        store = CardStore(directory, processes=processes)
+        try:
+            start = time.perf_counter()
+            store.render(requests)
+            cold = time.perf_counter() - start
+            start = time.perf_counter()
+            store.render(requests)
+            warm = time.perf_counter() - start
+        finally:
+            store.close()
+            size = sum(os.path.getsize(os.path.join(directory, f))
+                       for f in os.listdir(directory))
+            shutil.rmtree(directory)
+        print(f"{name:<7} x{processes:<3} cold {cold * 1000:8.1f} ms  "
+              f"warm {warm * 1000:7.1f} ms  {size / 1024:.0f} KiB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""
+擷取後端效能比較
+
+    python daily_notify/bench/bench_extract.py [--pages DIR] [--repeat N] [--generated]
+
+--pages 指定存放已下載 cnyes 頁面 (*.html) 的目錄,未指定時使用
+bench/recorded/ 錄製的頁面,沒有錄製或加上 --generated 時使用
+fixtures.py 產生的頁面。所有後端的結果必須與 bs4 完全相同。
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fixtures  # noqa: E402
+from extractors import EXTRACTORS  # noqa: E402
+
+
+def load_pages(directory):
+    pages = []
+    for path in sorted(glob.glob(os.path.join(directory, '*.html'))):
+        with open(path, encoding='utf-8') as f:
+            pages.append((os.path.basename(path), f.read()))
+    return pages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--pages', help='saved page directory')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--generated', action='store_true',
+                        help='use generated fixtures instead of recordings')
+    args = parser.parse_args()
+    if args.generated:
+        fixtures.PREFER_RECORDED = False
+    print(fixtures.describe())
+
+    pages = load_pages(args.pages) if args.pages else fixtures.cnyes_pages()
+    total_bytes = sum(len(html.encode('utf-8')) for _, html in pages)
+    print(f"{len(pages)} pages, {total_bytes / 1024:.0f} KiB")
+
+    baseline = None
+    for name, cls in EXTRACTORS.items():
+        try:
+            extractor = cls()
+        except ImportError:
+            print(f"{name:<8} skipped (not installed)")
+            continue
+        best = float('inf')
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            output = [extractor.extract(html) for _, html in pages]
+            best = min(best, time.perf_counter() - start)
+        if baseline is None:
+            baseline = (output, best)
+        same = output == baseline[0]
+        print(f"{name:<8} {best * 1000:8.2f} ms  "
+              f"x{baseline[1] / best:5.1f}  {'identical' if same else 'MISMATCH'}")
+        if not same:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""
+啟動 (import) 時間量測
+
+    python daily_notify/bench/bench_import.py [--repeat N] [--budget-ms MS] [--top N]
+
+每個情境以新的 python -X importtime 程序執行,統計該情境額外載入模組的
+累計時間 (扣除直譯器啟動本身就會載入的模組),取中位數。
+eager 情境模擬原本在 run.py 開頭就載入 linebot 的作法,作為比較基準。
+指定 --budget-ms 時,任一單一工作情境超過預算即以 exit code 1 結束。
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 情境名稱 -> (程式碼, 是否為單一工作情境)
+SCENARIOS = {
+    'eager': ('import linebot.models; import run', False),
+    'run': ('import run', False),
+    'stocks': ('import run; run.build_pipeline(weather=False)', True),
+    'weather': ('import run; run.build_pipeline(stocks=False)', True),
+    'slack': ('import run; run.SlackFanout(); run.get_delivery_queue()', True),
+    'dry-run': ('import run; run.build_pipeline(dry_run=True)', True),
+    'line': ('import run; run.LineBot().line_bot_api', False),
+}
+
+
+def importtime(code):
+    """執行 code,回傳 [(累計微秒, 模組名稱 (含縮排))]"""
+    env = dict(os.environ, PYTHONPATH=PACKAGE_DIR, LINE_BOT_TOKEN='bench',
+               LINE_USER_ID='Ubench', HTTP_CACHE_DIR='', DEAD_LETTER_PATH='')
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                          env=env, cwd=PACKAGE_DIR, capture_output=True,
+                          text=True, check=True)
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        rows.append((int(cumulative), name.rstrip()))
+    return rows
+
+
+def top_level(rows):
+    # 縮排的是被其他模組間接載入的,已計入上層的累計時間
+    return {name.strip(): us for us, name in rows
+            if not name.startswith(' ' * 2)}
+
+
+def scenario_ms(code, startup):
+    times = top_level(importtime(code))
+    return sum(us for name, us in times.items() if name not in startup) / 1000
+
+
+def heaviest(code, startup, top):
+    rows = [(us, name) for us, name in importtime(code)
+            if name.strip() not in startup]
+    return sorted(rows, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--budget-ms', type=float,
+                        help='import budget for single-job scenarios')
+    parser.add_argument('--top', type=int, default=0,
+                        help='show the N heaviest imports of each scenario')
+    args = parser.parse_args()
+
+    startup = set(top_level(importtime('pass')))
+    baseline = None
+    over = []
+    print(f"{'scenario':<10}{'import ms':>11}{'vs eager':>10}")
+    for name, (code, single_job) in SCENARIOS.items():
+        ms = statistics.median(scenario_ms(code, startup)
+                               for _ in range(args.repeat))
+        if baseline is None:
+            baseline = ms
+        flag = ''
+        if args.budget_ms is not None and single_job and ms > args.budget_ms:
+            over.append(name)
+            flag = '  OVER BUDGET'
+        print(f"{name:<10}{ms:>11.1f}{ms / baseline:>9.0%}{flag}")
+        for cumulative, module in (heaviest(code, startup, args.top)
+                                   if args.top else ()):
+            print(f"    {cumulative / 1000:8.1f} ms {module}")
+
+    if over:
+        print(f"Import budget of {args.budget_ms:.0f} ms exceeded: "
+              f"{', '.join(over)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,182 @@
+"""
+daily_notify 離線效能測試
+
+以本機 stub 伺服器重播 cnyes 頁面、氣象署 JSON,並接收 LINE / Slack 推送,
+量測各階段的延遲、吞吐量與記憶體峰值:
+
+    python daily_notify/bench/bench_pipeline.py \
+        --symbols 4,60 --locations 1,22 --recipients 1,1000 --latency 50
+
+預設重播 bench/recorded/ 中錄製的實際回應 (bench/record.py 錄製),數量
+不足時循環使用;--generated 改用 fixtures.py 產生的資料。
+不會連到任何外部服務。
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+import fixtures  # noqa: E402
+from stub_server import StubServer  # noqa: E402
+
+
+def parse_sizes(text):
+    return [int(n) for n in text.split(',') if n]
+
+
+def setup_env(stub_url):
+    """run.py 在載入時讀取環境變數,必須在 import 前設定"""
+    os.environ.update({
+        'CWA_API_KEY': 'bench',
+        'LINE_BOT_TOKEN': 'bench',
+        'LINE_USER_ID': 'Ubench',
+        'SLACK_WEBHOOK': stub_url + '/slack',
+        'HTTP_CACHE_DIR': '',
+        'DEAD_LETTER_PATH': '',
+        'LINE_API_ENDPOINT': stub_url,
+    })
+
+
+class Bench:
+    def __init__(self, stub, source, extractor):
+        import run
+        self.run = run
+        self.stub = stub
+        self.source = source
+        self.extractor = extractor
+        self.crawler = None
+        self.weather = None
+        self.pages = []
+
+    # 各階段回傳處理的項目數
+    def stock_fetch(self, symbols):
+        crawler = self.run.WebCrawlerUSA(source=self.source,
+                                         extractor=self.extractor)
+        crawler.urls = [(f'指數{i}', f'{self.stub.url}/index/GI/S{i}')
+                        for i in range(symbols)]
+        for source in getattr(crawler.source, 'sources', [crawler.source]):
+            if hasattr(source, 'api_url'):
+                source.api_url = self.stub.url + '/ws/api/v1/quote/quotes/{symbols}'
+        crawler.fetch()
+        # 每個指數都必須能轉成歷史紀錄 (否則只會印出 "Skipping history for")
+        if len(crawler.quotes) != len(crawler.stocks_data):
+            sys.exit(f"stock_fetch: only {len(crawler.quotes)} of "
+                     f"{len(crawler.stocks_data)} quotes parsed for history")
+        self.crawler = crawler
+        return symbols
+
+    def stock_parse(self, symbols):
+        from extractors import get_extractor
+        extractor = get_extractor(self.extractor)
+        if len(self.pages) < symbols:
+            self.pages = fixtures.cnyes_pages(symbols)
+        for _, html in self.pages[:symbols]:
+            extractor.extract(html)
+        return symbols
+
+    def weather_fetch(self, locations):
+        weather = self.run.WeatherForecast()
+        weather.api_url = self.stub.url + '/api/v1/rest/datastore/F-C0032-001'
+        names = None if locations >= len(fixtures.COUNTIES) else fixtures.COUNTIES[:locations]
+        weather.fetch_many(names)
+        self.weather = weather
+        return locations
+
+    def render(self, recipients):
+        # 每位收件者各自的縣市天氣 + 共用的美股 bubble
+        names = list(self.weather.forecasts)
+        for i in range(recipients):
+            name = names[i % len(names)]
+            self.run.create_weather_flex_message(name, self.weather.forecasts[name])
+            self.run.create_stock_flex_message(self.crawler.stocks_data)
+        return recipients
+
+    def line_push(self, recipients):
+        user_ids = [f'U{i:032d}' for i in range(recipients)]
+        messages = [self.crawler.flex_message()]
+        name = next(iter(self.weather.forecasts))
+        messages.append(self.run.create_weather_flex_message(
+            name, self.weather.forecasts[name]))
+        self.run.LineBot(user_ids=user_ids).push_batch(messages)
+        return recipients
+
+    def slack_push(self, _):
+        self.crawler.push_slack()
+        return 1
+
+
+def measure(func, size, memory):
+    if memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    count = func(size)
+    elapsed = time.perf_counter() - start
+    peak = 0
+    if memory:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return {'items': count, 'seconds': elapsed, 'peak_bytes': peak}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--symbols', default='4,60')
+    parser.add_argument('--locations', default='1,22')
+    parser.add_argument('--recipients', default='1,1000')
+    parser.add_argument('--latency', type=float, default=20,
+                        help='stub latency per request (ms)')
+    parser.add_argument('--source', default='html', choices=['html', 'api'])
+    parser.add_argument('--extractor', default=None)
+    parser.add_argument('--json', help='write results to this file')
+    parser.add_argument('--generated', action='store_true',
+                        help='use generated fixtures instead of recordings')
+    args = parser.parse_args()
+    if args.generated:
+        fixtures.PREFER_RECORDED = False
+    print(fixtures.describe())
+
+    symbols = parse_sizes(args.symbols)
+    locations = parse_sizes(args.locations)
+    recipients = parse_sizes(args.recipients)
+    rounds = max(len(symbols), len(locations), len(recipients))
+
+    results = []
+    with StubServer(latency=args.latency / 1000) as stub:
+        setup_env(stub.url)
+        bench = Bench(stub, args.source, args.extractor)
+        for r in range(rounds):
+            sizes = {
+                'stock_fetch': symbols[min(r, len(symbols) - 1)],
+                'stock_parse': symbols[min(r, len(symbols) - 1)],
+                'weather_fetch': locations[min(r, len(locations) - 1)],
+                'render': recipients[min(r, len(recipients) - 1)],
+                'line_push': recipients[min(r, len(recipients) - 1)],
+                'slack_push': 1,
+            }
+            for stage, size in sizes.items():
+                func = getattr(bench, stage)
+                timing = measure(func, size, memory=False)
+                # 記憶體另外量一次,避免 tracemalloc 影響時間
+                timing['peak_bytes'] = measure(func, size, memory=True)['peak_bytes']
+                timing.update(stage=stage, size=size)
+                results.append(timing)
+
+    print(f"{'stage':<14}{'N':>7}{'latency ms':>12}{'items/s':>12}{'peak KiB':>11}")
+    for row in results:
+        rate = row['items'] / row['seconds'] if row['seconds'] else 0
+        print(f"{row['stage']:<14}{row['size']:>7}{row['seconds'] * 1000:>12.1f}"
+              f"{rate:>12.0f}{row['peak_bytes'] / 1024:>11.0f}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
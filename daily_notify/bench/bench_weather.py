@@ -0,0 +1,89 @@
+"""
+氣象署預報解析效能比較
+
+    python daily_notify/bench/bench_weather.py [--payload FILE] [--copies N] [--repeat N] [--generated]
+
+比較逐筆解析 (WeatherForecast.parse_location) 與欄式表格
+(forecast_table.ForecastTable + summarize) 處理全國預報的時間,
+兩者的結果必須完全相同。
+
+--payload 指定已下載的 F-C0032-001 回應 (JSON),未指定時使用
+bench/recorded/ 錄製的回應,沒有錄製或加上 --generated 時使用
+fixtures.py 產生的 22 縣市資料;--copies 將縣市複製 N 份
+(名稱加上編號),模擬鄉鎮層級的資料量。
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# run.py 在載入時讀取環境變數,不使用磁碟快取與歷史報價
+os.environ.setdefault('HTTP_CACHE_DIR', '')
+os.environ.setdefault('HISTORY_DIR', '')
+
+import fixtures  # noqa: E402
+from forecast_table import ForecastTable, summarize  # noqa: E402
+from run import WeatherForecast  # noqa: E402
+
+
+def load_locations(path, copies):
+    if path:
+        with open(path, encoding='utf-8') as f:
+            locations = json.load(f)['records']['location']
+    else:
+        locations = fixtures.cwa_payload()['records']['location']
+    if copies <= 1:
+        return locations
+    return [dict(location, locationName=f"{location['locationName']}{i}")
+            for i in range(copies) for location in locations]
+
+
+def per_location(locations):
+    forecast = WeatherForecast()
+    return [forecast.parse_location(location) for location in locations]
+
+
+def columnar(locations):
+    table = ForecastTable(locations)
+    today = date.today()
+    return [summarize(table, name, today) for name in table.names]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--payload', help='saved F-C0032-001 response')
+    parser.add_argument('--copies', type=int, default=1)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--generated', action='store_true',
+                        help='use generated fixtures instead of recordings')
+    args = parser.parse_args()
+    if args.generated:
+        fixtures.PREFER_RECORDED = False
+    print(fixtures.describe())
+
+    locations = load_locations(args.payload, args.copies)
+    size = len(json.dumps(locations, ensure_ascii=False).encode('utf-8'))
+    print(f"{len(locations)} locations, {size / 1024:.0f} KiB")
+
+    baseline = None
+    for name, parse in (('dict', per_location), ('columnar', columnar)):
+        best = float('inf')
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            output = parse(locations)
+            best = min(best, time.perf_counter() - start)
+        if baseline is None:
+            baseline = (output, best)
+        same = output == baseline[0]
+        print(f"{name:<8} {best * 1000:8.2f} ms  "
+              f"x{baseline[1] / best:5.1f}  {'identical' if same else 'MISMATCH'}")
+        if not same:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
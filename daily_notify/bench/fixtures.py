@@ -0,0 +1,233 @@
+"""
+離線測試用的頁面與 API 資料
+
+預設重播 recorded/ 下實際下載的回應 (以 record.py 更新):
+    recorded/cnyes/<代號>.html   invest.cnyes.com/index/GI/<代號> 頁面
+    recorded/cnyes/quotes.json   cnyes 報價 API 回應
+    recorded/cwa/F-C0032-001.json 氣象署全國 36 小時預報
+需要的數量超過錄製的份數時 (N 個代號) 循環使用錄製的資料。
+
+沒有錄製資料或 PREFER_RECORDED = False (各 bench 的 --generated) 時改用產生器:
+cnyes_page() 產生與 invest.cnyes.com 指數頁結構相同的 HTML,
+另外填入大量無關的導覽、新聞列表與 script 內容,模擬實際頁面大小。
+產生的頁面依擷取器的 selector 建立,無法發現實際頁面改版造成的問題。
+"""
+import glob
+import json
+import os
+import random
+from functools import lru_cache
+
+RECORDED_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            'recorded')
+CWA_RECORDING = os.path.join(RECORDED_DIR, 'cwa', 'F-C0032-001.json')
+QUOTES_RECORDING = os.path.join(RECORDED_DIR, 'cnyes', 'quotes.json')
+# False 時一律使用產生器
+PREFER_RECORDED = True
+
+
+@lru_cache(maxsize=None)
+def _recorded_pages():
+    pages = {}
+    for path in sorted(glob.glob(os.path.join(RECORDED_DIR, 'cnyes', '*.html'))):
+        with open(path, encoding='utf-8') as f:
+            pages[os.path.splitext(os.path.basename(path))[0]] = f.read()
+    return pages
+
+
+@lru_cache(maxsize=None)
+def _recorded_json(path):
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def recorded_pages():
+    """{代號: HTML},未錄製或 PREFER_RECORDED 為 False 時為空"""
+    return _recorded_pages() if PREFER_RECORDED else {}
+
+
+def recorded_cwa():
+    """錄製的 F-C0032-001 回應,沒有時為 None"""
+    return _recorded_json(CWA_RECORDING) if PREFER_RECORDED else None
+
+
+def recorded_quotes():
+    """錄製的報價 API data (list),沒有時為空"""
+    data = _recorded_json(QUOTES_RECORDING) if PREFER_RECORDED else None
+    return (data or {}).get('data') or []
+
+
+def describe():
+    """目前使用的資料來源 (bench 輸出用)"""
+    sources = []
+    pages = recorded_pages()
+    sources.append(f"cnyes: {len(pages)} recorded pages" if pages
+                   else "cnyes: generated")
+    sources.append("quotes API: recorded" if recorded_quotes()
+                   else "quotes API: generated")
+    sources.append("CWA: recorded" if recorded_cwa() else "CWA: generated")
+    text = ', '.join(sources)
+    if PREFER_RECORDED and not pages:
+        text += "\nWARNING: no recordings in bench/recorded/, run bench/record.py"
+    return text
+
+# (名稱, 代號, 價格, 漲跌, 漲跌幅)
+INDICES = [
+    ('道瓊指數', 'DJI', '46,190.61', '+238.37', '+0.52%'),
+    ('S&P 500', 'INX', '6,664.01', '+34.94', '+0.53%'),
+    ('費城半導體', 'SOX', '7,023.23', '-52.85', '-0.75%'),
+    ('那斯達克綜合指數', 'IXIC', '22,679.97', '+117.44', '+0.52%'),
+]
+
+
+def _filler(rng, blocks):
+    parts = []
+    for i in range(blocks):
+        items = ''.join(
+            f'<li class="jsx-1803445427 news-item"><a href="/news/id/{rng.randint(1, 10**7)}">'
+            f'<span class="jsx-1803445427 title">新聞標題 {i}-{j} &amp; 市場快訊</span>'
+            f'<time class="jsx-1803445427">2026/10/16 {j:02d}:00</time></a></li>'
+            for j in range(20))
+        parts.append(
+            f'<section class="jsx-3625047685 block-{i}"><h3>區塊 {i}</h3>'
+            f'<ul class="jsx-1803445427">{items}</ul><br><img src="/a{i}.png"></section>')
+    return ''.join(parts)
+
+
+def cnyes_page(name, code, price, net, percent, date='2026/10/16', blocks=40,
+               seed=0):
+    """產生單一指數頁面 HTML"""
+    rng = random.Random(seed)
+    state = {'props': {'pageProps': {'quote': {
+        'symbol': f'GI:{code}:INDEX', 'name': name, 'price': price,
+        'change': net, 'changePercent': percent, 'date': date}}}}
+    return (
+        '<!DOCTYPE html><html lang="zh-TW"><head><meta charset="utf-8">'
+        f'<title>{name} | 鉅亨網</title><link rel="stylesheet" href="/s.css">'
+        '<script>window.__ENV__={"a":1,"b":"<div>"};</script></head><body>'
+        f'<nav class="jsx-2967817107">{_filler(rng, 3)}</nav>'
+        '<main><div class="jsx-2214436525 info-wrap">'
+        f'<h1 class="jsx-2214436525">{name}</h1>'
+        f'<div class="jsx-2214436525 info-lp"><span class="jsx-2214436525 info-price">{price}</span>'
+        f'<div class="jsx-2214436525 change"><span class="jsx-2214436525 change-net">{net}</span>'
+        f'<span class="jsx-2214436525 change-percent">{percent}</span></div></div>'
+        f'<div class="_zFXfK"><span>{date} 16:00</span> 收盤價</div></div>'
+        f'{_filler(rng, blocks)}</main>'
+        f'<script id="__NEXT_DATA__" type="application/json">{json.dumps(state, ensure_ascii=False)}</script>'
+        '</body></html>'
+    )
+
+
+def page_for(code, index=0):
+    """stub 伺服器的指數頁: 錄製的頁面 (未錄製的代號依 index 循環使用),
+    沒有錄製資料時產生"""
+    recorded = recorded_pages()
+    if recorded:
+        return recorded.get(code) or list(recorded.values())[
+            index % len(recorded)]
+    name, _, price, net, percent = INDICES[index % len(INDICES)]
+    return cnyes_page(name, code, price, net, percent, seed=index)
+
+
+def cnyes_pages(count=None, blocks=40):
+    """[(名稱, HTML)],count 超過錄製 (或 4 個指數) 的數量時重複使用"""
+    recorded = recorded_pages()
+    if recorded:
+        items = list(recorded.items())
+        count = count or len(items)
+        return [items[i % len(items)] for i in range(count)]
+    count = count or len(INDICES)
+    pages = []
+    for i in range(count):
+        name, code, price, net, percent = INDICES[i % len(INDICES)]
+        pages.append((name, cnyes_page(name, code, price, net, percent,
+                                       blocks=blocks, seed=i)))
+    return pages
+
+
+# 氣象署 F-C0032-001 的 22 縣市
+COUNTIES = [
+    '臺北市', '新北市', '桃園市', '臺中市', '臺南市', '高雄市', '基隆市',
+    '新竹縣', '新竹市', '苗栗縣', '彰化縣', '南投縣', '雲林縣', '嘉義縣',
+    '嘉義市', '屏東縣', '宜蘭縣', '花蓮縣', '臺東縣', '澎湖縣', '金門縣',
+    '連江縣',
+]
+
+PERIODS = [
+    ('2026-10-18 18:00:00', '2026-10-19 06:00:00'),
+    ('2026-10-19 06:00:00', '2026-10-19 18:00:00'),
+    ('2026-10-19 18:00:00', '2026-10-20 06:00:00'),
+]
+
+
+def _element(name, values, unit=None):
+    times = []
+    for (start, end), value in zip(PERIODS, values):
+        parameter = {'parameterName': value}
+        if unit:
+            parameter['parameterUnit'] = unit
+        times.append({'startTime': start, 'endTime': end,
+                      'parameter': parameter})
+    return {'elementName': name, 'time': times}
+
+
+def cwa_location(name, seed=0):
+    """單一縣市的 records.location 項目"""
+    rng = random.Random(f'{name}-{seed}')
+    low = [rng.randint(15, 26) for _ in PERIODS]
+    return {
+        'locationName': name,
+        'weatherElement': [
+            _element('Wx', [rng.choice(['晴時多雲', '多雲', '多雲時陰', '短暫陣雨'])
+                            for _ in PERIODS]),
+            _element('PoP', [str(rng.randrange(0, 101, 10)) for _ in PERIODS],
+                     '百分比'),
+            _element('MinT', [str(t) for t in low], 'C'),
+            _element('CI', [rng.choice(['舒適', '悶熱', '稍有寒意'])
+                            for _ in PERIODS]),
+            _element('MaxT', [str(t + rng.randint(2, 8)) for t in low], 'C'),
+        ],
+    }
+
+
+def cwa_payload(names=None, seed=0):
+    """F-C0032-001 回應,names 為 None 時包含全部縣市"""
+    recorded = recorded_cwa()
+    if recorded is not None:
+        locations = recorded['records']['location']
+        if names is not None:
+            locations = [location for location in locations
+                         if location['locationName'] in names]
+        return dict(recorded, records=dict(recorded['records'],
+                                           location=locations))
+    return {
+        'success': 'true',
+        'result': {'resource_id': 'F-C0032-001'},
+        'records': {
+            'datasetDescription': '三十六小時天氣預報',
+            'location': [cwa_location(n, seed) for n in (names or COUNTIES)],
+        },
+    }
+
+
+def cnyes_quote(code, seed=0):
+    """
+    cnyes 報價 API 的單一代號資料,code 可為指數代號或完整 API 代號;
+    有錄製資料時使用同代號 (或依 seed 循環) 的錄製項目
+    """
+    symbol = code if ':' in code else f'GI:{code}:INDEX'
+    recorded = recorded_quotes()
+    if recorded:
+        by_symbol = {item.get('0'): item for item in recorded}
+        item = by_symbol.get(symbol) or recorded[seed % len(recorded)]
+        return dict(item, **{'0': symbol})
+    _, _, price, net, percent = INDICES[seed % len(INDICES)]
+    return {
+        '0': code if ':' in code else f'GI:{code}:INDEX',
+        '6': float(price.replace(',', '')),
+        '11': float(net),
+        '56': float(percent.rstrip('%')),
+        '200007': 1760644800,
+    }
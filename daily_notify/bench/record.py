@@ -0,0 +1,63 @@
+"""
+錄製 bench 重播用的實際回應
+
+    CWA_API_KEY=... python daily_notify/bench/record.py
+
+下載預設追蹤指數的 cnyes 頁面與報價 API 回應,以及氣象署 F-C0032-001
+全國預報,存到 bench/recorded/ (見 fixtures.py)。只保存回應內容,
+不會保存 API key。頁面改版或 API 格式變動時重新錄製並檢查 bench 結果。
+"""
+import json
+import os
+import sys
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fixtures  # noqa: E402
+from quote_sources import CNYES_QUOTE_API, api_symbol  # noqa: E402
+from watchlist import DEFAULT_SYMBOLS  # noqa: E402
+
+CWA_API_URL = 'https://opendata.cwa.gov.tw/api/v1/rest/datastore/F-C0032-001'
+HEADERS = {'User-Agent': 'Mozilla/5.0 (daily_notify bench recorder)'}
+
+
+def save(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    print(f"saved {os.path.relpath(path, fixtures.RECORDED_DIR)} "
+          f"({len(text.encode('utf-8')) / 1024:.0f} KiB)")
+
+
+def main():
+    session = requests.Session()
+    session.headers.update(HEADERS)
+
+    for _, url in DEFAULT_SYMBOLS:
+        response = session.get(url, timeout=30)
+        response.raise_for_status()
+        code = url.rstrip('/').rsplit('/', 1)[-1]
+        save(os.path.join(fixtures.RECORDED_DIR, 'cnyes', f'{code}.html'),
+             response.text)
+
+    symbols = ','.join(api_symbol(url) for _, url in DEFAULT_SYMBOLS)
+    response = session.get(CNYES_QUOTE_API.format(symbols=symbols), timeout=30)
+    response.raise_for_status()
+    save(fixtures.QUOTES_RECORDING,
+         json.dumps(response.json(), ensure_ascii=False, indent=1))
+
+    api_key = os.getenv('CWA_API_KEY')
+    if not api_key:
+        print("CWA_API_KEY not set: skipping CWA recording")
+        return
+    response = session.get(CWA_API_URL, params={'Authorization': api_key},
+                           timeout=30)
+    response.raise_for_status()
+    save(fixtures.CWA_RECORDING,
+         json.dumps(response.json(), ensure_ascii=False, indent=1))
+
+
+if __name__ == '__main__':
+    main()
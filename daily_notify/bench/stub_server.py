@@ -0,0 +1,113 @@
+"""
+本機 stub 伺服器: 模擬 cnyes、氣象署、LINE 與 Slack
+
+所有請求都在同一個 ThreadingHTTPServer 處理,可設定固定延遲模擬網路往返。
+cnyes 與氣象署的回應取自 fixtures (有錄製資料時重播錄製的回應)。
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import fixtures
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, body, content_type='application/json'):
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _record(self, body=b''):
+        server = self.server
+        with server.lock:
+            server.requests.append((self.command, self.path, len(body)))
+
+    def do_GET(self):
+        self._record()
+        time.sleep(self.server.latency)
+        url = urlsplit(self.path)
+        parts = url.path.strip('/').split('/')
+        if parts[:2] == ['index', 'GI']:
+            code = parts[2]
+            page = self.server.pages.get(code)
+            if page is None:
+                if code in self.server.codes:
+                    i = self.server.codes.index(code)
+                elif code[1:].isdigit():
+                    # bench_pipeline 的代號為 S0、S1...: 依編號循環使用頁面
+                    i = int(code[1:])
+                else:
+                    i = 0
+                page = fixtures.page_for(code, i)
+                self.server.pages[code] = page
+            return self._send(200, page, 'text/html; charset=utf-8')
+        if url.path.startswith('/ws/api/v1/quote/quotes/'):
+            symbols = unquote(parts[-1]).split(',')
+            data = [fixtures.cnyes_quote(s, i)
+                    for i, s in enumerate(symbols)]
+            return self._send(200, json.dumps({'statusCode': 200, 'data': data}))
+        if url.path.endswith('/F-C0032-001'):
+            query = parse_qs(url.query)
+            names = query.get('locationName', [''])[0]
+            names = names.split(',') if names else None
+            return self._send(200, json.dumps(fixtures.cwa_payload(names),
+                                              ensure_ascii=False))
+        self._send(404, '{}')
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length)
+        self._record(body)
+        time.sleep(self.server.latency)
+        if self.path.startswith('/v2/bot/message/'):
+            return self._send(200, '{}')
+        if self.path.startswith('/slack'):
+            return self._send(200, 'ok', 'text/plain')
+        self._send(404, '{}')
+
+
+class StubServer:
+    """
+    Args:
+        latency: 每個請求的延遲秒數
+        codes: 指數代號順序,決定頁面內容
+    """
+
+    def __init__(self, latency=0.0, codes=()):
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.latency = latency
+        self.httpd.codes = list(codes)
+        self.httpd.pages = {}
+        self.httpd.requests = []
+        self.httpd.lock = threading.Lock()
+        self.thread = threading.Thread(target=self.httpd.serve_forever,
+                                       daemon=True)
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address
+        return f'http://{host}:{port}'
+
+    @property
+    def requests(self):
+        return self.httpd.requests
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
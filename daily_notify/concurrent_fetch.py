@@ -0,0 +1,60 @@
+"""
+並行抓取引擎
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+
+class ConcurrentFetcher:
+    """
+    以有上限的 thread pool 同時抓取多個網址
+
+    Args:
+        session: requests.Session (或相容物件),所有請求共用
+        max_workers: 同時進行的請求總數上限
+        per_host: 同一個主機同時進行的請求上限 (禮貌限制)
+        timeout: 每個請求的逾時秒數
+        cache: HttpCache,None 表示不使用快取
+        ttl: 快取有效秒數
+    """
+
+    def __init__(self, session, max_workers=8, per_host=4, timeout=10,
+                 cache=None, ttl=0):
+        self.session = session
+        self.cache = cache
+        self.ttl = ttl
+        self.max_workers = max(1, max_workers)
+        self.per_host = max(1, per_host)
+        self.timeout = timeout
+        self._host_locks = {}
+        self._lock = threading.Lock()
+
+    def _host_semaphore(self, url):
+        host = urlsplit(url).netloc
+        with self._lock:
+            if host not in self._host_locks:
+                self._host_locks[host] = threading.BoundedSemaphore(
+                    self.per_host)
+            return self._host_locks[host]
+
+    def get(self, url, **kwargs):
+        """單一請求,受主機上限與逾時控制"""
+        kwargs.setdefault('timeout', self.timeout)
+        with self._host_semaphore(url):
+            if self.cache is not None:
+                return self.cache.get(self.session, url, ttl=self.ttl, **kwargs)
+            return self.session.get(url, **kwargs)
+
+    def fetch_all(self, urls, **kwargs):
+        """
+        同時抓取所有網址,依傳入順序回傳 response
+
+        任一請求失敗時,依原順序拋出第一個例外
+        """
+        urls = list(urls)
+        if not urls:
+            return []
+        workers = min(self.max_workers, len(urls))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(lambda u: self.get(u, **kwargs), urls))
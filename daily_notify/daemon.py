@@ -0,0 +1,170 @@
+"""
+常駐模式
+
+以程式內排程器取代每次冷啟動的 cron 執行: HTTP 連線池、磁碟快取與
+LineBotApi 在多次執行之間保持暖機。另提供本機 HTTP 端點查詢狀態或手動觸發:
+
+    GET  /health              存活檢查
+    GET  /jobs                各工作的排程與最近一次結果
+    POST /jobs/<name>/run     立即執行 (執行中回 409)
+
+排程可用 DAEMON_SCHEDULE 覆寫,格式為 JSON:
+    {"工作名稱": {"cron": "0 6 * * *", "stocks": true, "weather": true,
+                  "push": true, "incremental": true}}
+
+push=false 的工作只抓取資料 (更新快取),不推送。常駐模式預設為增量模式
+(incremental): 內容與上次推送相同時略過,同一份報價或預報不會重複推送;
+設為 false 則每次都推送。
+
+設定 ALERT_RULES_PATH 時另有 alerts 工作,依 ALERT_CRON (預設每分鐘) 檢查警示規則。
+設定 SUBSCRIBERS_DB 時另有 subscribers 工作,每分鐘推送設定在該分鐘的訂閱者。
+"""
+import json
+import os
+import signal
+import threading
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from zoneinfo import ZoneInfo
+
+from metrics import metrics
+from run import (alert_rules_path, build_alert_pipeline, build_pipeline,
+                 build_subscriber_pipeline, line_batch, subscribers_db)
+from scheduler import Scheduler
+
+TIMEZONE = ZoneInfo('Asia/Taipei')
+
+# 時間皆為台北時間
+DEFAULT_SCHEDULE = {
+    # 原本 GitHub Actions 的每日推送 (美股收盤後與當日天氣)
+    'daily': {'cron': '0 6 * * *'},
+    # 美股開盤前: 報價仍是前一日收盤時 (與 daily 相同) 由增量模式略過
+    'premarket': {'cron': '0 21 * * 1-5', 'weather': False},
+    # 更新氣象預報快取,不推送 (05:30 這次讓 daily 直接使用快取)
+    'weather': {'cron': '30 5,11,17,23 * * *', 'stocks': False,
+                'push': False},
+}
+
+daemon_host = os.getenv('DAEMON_HOST', '127.0.0.1')
+daemon_port = int(os.getenv('DAEMON_PORT', '8787'))
+daemon_location = os.getenv('DAEMON_LOCATION', '高雄市')
+alert_cron = os.getenv('ALERT_CRON', '* * * * *')
+
+
+def load_schedule():
+    text = os.getenv('DAEMON_SCHEDULE')
+    return json.loads(text) if text else DEFAULT_SCHEDULE
+
+
+def pipeline_job(name, stocks=True, weather=True, push=True, incremental=True,
+                 build=None):
+    """每次執行都建立新的 Pipeline,但共用同一個 session 與快取"""
+    def job():
+        if build is not None:
+            pipeline = build()
+        else:
+            pipeline = build_pipeline(location=daemon_location,
+                                      batch=line_batch,
+                                      incremental=incremental,
+                                      stocks=stocks, weather=weather,
+                                      push=push)
+        pipeline.run()
+        print(f"[{name}]")
+        pipeline.report()
+        metrics.export()
+        if not pipeline.ok:
+            failed = [n for n, r in pipeline.results.items()
+                      if r['status'] != 'ok']
+            raise RuntimeError(f"jobs not ok: {', '.join(failed)}")
+    return job
+
+
+def build_scheduler(schedule=None):
+    scheduler = Scheduler(tz=TIMEZONE)
+    for name, options in (schedule or load_schedule()).items():
+        scheduler.add(name,
+                      pipeline_job(name, stocks=options.get('stocks', True),
+                                   weather=options.get('weather', True),
+                                   push=options.get('push', True),
+                                   incremental=options.get('incremental',
+                                                           True)),
+                      cron=options.get('cron'))
+    if alert_rules_path:
+        scheduler.add('alerts',
+                      pipeline_job('alerts', build=build_alert_pipeline),
+                      cron=alert_cron)
+    if subscribers_db:
+        scheduler.add('subscribers',
+                      pipeline_job('subscribers', build=subscriber_pipeline),
+                      cron='* * * * *')
+    return scheduler
+
+
+def subscriber_pipeline():
+    """推送設定在目前這一分鐘 (台北時間) 的訂閱者"""
+    deliver_at = datetime.now(TIMEZONE).strftime('%H:%M')
+    return build_subscriber_pipeline(deliver_at=deliver_at)
+
+
+def make_handler(scheduler):
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, status, body):
+            data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path == '/health':
+                self._send(200, {'status': 'ok'})
+            elif self.path == '/jobs':
+                self._send(200, scheduler.status())
+            else:
+                self._send(404, {'error': 'not found'})
+
+        def do_POST(self):
+            parts = self.path.strip('/').split('/')
+            if len(parts) != 3 or parts[0] != 'jobs' or parts[2] != 'run':
+                self._send(404, {'error': 'not found'})
+                return
+            try:
+                started = scheduler.trigger(parts[1])
+            except KeyError:
+                self._send(404, {'error': f'unknown job: {parts[1]}'})
+                return
+            if started:
+                self._send(202, {'job': parts[1], 'status': 'started'})
+            else:
+                self._send(409, {'job': parts[1], 'status': 'running'})
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def main():
+    scheduler = build_scheduler().start()
+    server = ThreadingHTTPServer((daemon_host, daemon_port),
+                                 make_handler(scheduler))
+    print(f"daily_notify daemon listening on {daemon_host}:{daemon_port}")
+    for name, job in scheduler.status().items():
+        print(f"  {name:<12} {job['cron'] or '-':<16} next {job['next_run']}")
+
+    def shutdown(signum, frame):
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, shutdown)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        scheduler.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,406 @@
+"""
+推送佇列
+
+所有 LINE / Slack 推送先放進佇列,由背景 thread 並行送出:
+- 每個通道各自限速 (token bucket),收到 429 時整個通道暫停 Retry-After 秒
+- 可重試的錯誤 (429、5xx、連線錯誤) 以帶抖動的指數退避重送
+- 重試用盡或不可重試的項目寫入 dead-letter 檔 (JSON Lines),可再重送;
+  重送時丟棄不可重試、太舊或已重送多次的項目
+"""
+import heapq
+import itertools
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+
+import requests
+
+from metrics import incr, span
+
+# 每個通道每秒最多送出的請求數
+RATE_LIMITS = {
+    'line': 100,
+    'slack': 1,
+}
+
+# dead-letter 項目的保存期限 (秒,自第一次失敗起算) 與最多重送次數;
+# 超過時丟棄,避免過期的每日摘要在幾天後才送出
+DEAD_LETTER_MAX_AGE = 12 * 60 * 60
+DEAD_LETTER_MAX_REPLAYS = 3
+
+
+class DeliveryError(Exception):
+    """推送失敗,retryable 表示可以重送"""
+
+    def __init__(self, message, status=None, retry_after=None, retryable=False):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+        self.retryable = retryable
+
+
+def _retry_after(headers):
+    try:
+        return float(headers.get('Retry-After'))
+    except (TypeError, ValueError):
+        return None
+
+
+def check_response(response, ok=(200,)):
+    """依 HTTP 狀態碼判斷成功、可重試或失敗"""
+    if response.status_code in ok:
+        return response
+    status = response.status_code
+    raise DeliveryError(
+        f"{status} {response.text[:200]}", status=status,
+        retry_after=_retry_after(response.headers),
+        retryable=status == 429 or status >= 500)
+
+
+class RateLimiter:
+    """token bucket,可被 429 暫停"""
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.capacity = float(burst or max(1, rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def pause(self, seconds):
+        with self._lock:
+            self.paused_until = max(self.paused_until,
+                                    time.monotonic() + seconds)
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    wait = self.paused_until - now
+                else:
+                    self.tokens = min(self.capacity, self.tokens
+                                      + (now - self.updated) * self.rate)
+                    self.updated = now
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class LineSender:
+    """以 LINE Messaging API 送出 push / multicast / broadcast / reply"""
+
+    PATHS = {
+        'reply': '/v2/bot/message/reply',
+        'push': '/v2/bot/message/push',
+        'multicast': '/v2/bot/message/multicast',
+        'broadcast': '/v2/bot/message/broadcast',
+    }
+
+    def __init__(self, token, session, endpoint='https://api.line.me'):
+        self.token = token
+        self.session = session
+        self.endpoint = endpoint
+
+    def __call__(self, payload):
+        headers = {
+            'Content-Type': 'application/json',
+            'Authorization': f'Bearer {self.token}',
+        }
+        # 同一個 retry key 重送時,LINE 不會重複發送 (reply 不支援)
+        if payload['mode'] != 'reply':
+            headers['X-Line-Retry-Key'] = payload['retry_key']
+        response = self.session.post(
+            self.endpoint + self.PATHS[payload['mode']],
+            data=json.dumps(payload['body']), headers=headers)
+        # 409: 此 retry key 已被接受過,視為成功
+        return check_response(response, ok=(200, 409))
+
+
+class SlackSender:
+    """
+    送出 Slack incoming webhook
+
+    payload 只記錄目標的別名 (例如 'SLACK_WEBHOOK'、'SLACK_TARGETS[1]'),
+    網址在送出時才由 webhooks 查出: webhook 網址即憑證,不能寫進 dead-letter 檔。
+
+    Args:
+        webhooks: {別名: webhook 網址}
+    """
+
+    def __init__(self, session, webhooks=None):
+        self.session = session
+        self.webhooks = webhooks or {}
+
+    def __call__(self, payload):
+        target = payload.get('target')
+        url = self.webhooks.get(target)
+        if url is None:
+            raise DeliveryError(f"Unknown Slack target: {target}")
+        try:
+            response = self.session.post(
+                url, data=json.dumps(payload['body']),
+                headers={'Content-Type': 'application/json'})
+        except requests.exceptions.RequestException as e:
+            # requests 的錯誤訊息含完整網址,只記錄別名
+            raise DeliveryError(f"{type(e).__name__} posting to {target}",
+                                retryable=True) from None
+        return check_response(response)
+
+
+def replayable(record, now, max_age=DEAD_LETTER_MAX_AGE,
+               max_replays=DEAD_LETTER_MAX_REPLAYS):
+    """dead-letter 項目是否值得重送"""
+    status = record.get('status')
+    if record.get('retryable') is False or (
+            status is not None and 400 <= status < 500 and status != 429):
+        return False
+    first_failed_at = record.get('first_failed_at', record.get('failed_at'))
+    if first_failed_at is not None and now - first_failed_at > max_age:
+        return False
+    return record.get('replays', 0) < max_replays
+
+
+def line_payload(mode, messages, to=None, reply_token=None):
+    """建立 LINE 推送項目,messages 為 SendMessage 物件或 dict"""
+    body = {'messages': [m.as_json_dict() if hasattr(m, 'as_json_dict') else m
+                         for m in messages]}
+    if to is not None:
+        body['to'] = to
+    if reply_token is not None:
+        body['replyToken'] = reply_token
+    return {'mode': mode, 'body': body, 'retry_key': str(uuid.uuid4())}
+
+
+def line_batches(messages, user_ids=(), broadcast=False, max_messages=5,
+                 max_multicast=500):
+    """
+    將訊息與收件者切成 LINE API 請求
+
+    每 max_messages 則訊息為一批;單一收件者用 push,多位收件者用 multicast
+    (每批最多 max_multicast 位),broadcast=True 時推送給所有好友。
+    """
+    user_ids = list(user_ids)
+    payloads = []
+    for i in range(0, len(messages), max_messages):
+        chunk = messages[i:i + max_messages]
+        if broadcast:
+            payloads.append(line_payload('broadcast', chunk))
+        elif len(user_ids) == 1:
+            payloads.append(line_payload('push', chunk, to=user_ids[0]))
+        else:
+            for j in range(0, len(user_ids), max_multicast):
+                payloads.append(line_payload(
+                    'multicast', chunk, to=user_ids[j:j + max_multicast]))
+    return payloads
+
+
+def slack_payload(target, body):
+    """target 為 webhook 的別名 (見 SlackSender),不是網址"""
+    return {'target': target, 'body': body}
+
+
+class DeliveryQueue:
+    """
+    Args:
+        senders: {通道: callable(payload)}
+        workers: 背景 thread 數
+        rate_limits: {通道: 每秒請求數},同一通道可再依 limit_key 分開限速
+        max_attempts: 每個項目最多嘗試次數
+        base_delay / max_delay: 指數退避的起始與上限秒數
+        dead_letter_path: dead-letter 檔路徑,None 表示不寫檔
+    """
+
+    def __init__(self, senders, workers=8, rate_limits=None, max_attempts=5,
+                 base_delay=1.0, max_delay=60.0, dead_letter_path=None):
+        self.senders = senders
+        self.workers = workers
+        self.rates = dict(RATE_LIMITS, **(rate_limits or {}))
+        self.limiters = {}  # (通道, limit_key) -> RateLimiter
+        self._limiter_lock = threading.Lock()
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.dead_letter_path = dead_letter_path
+        self._heap = []  # (ready_at, seq, item)
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._threads = []
+        self._file_lock = threading.Lock()
+
+    def submit(self, channel, payload, limit_key=None):
+        """
+        加入佇列,回傳 Future (成功時為 response,失敗時為 DeliveryError)
+
+        limit_key 相同的項目共用一個限速器 (例如同一個 Slack webhook 別名)
+        """
+        return self._enqueue(channel, payload, limit_key)
+
+    def _enqueue(self, channel, payload, limit_key=None, replays=0,
+                 first_failed_at=None):
+        if channel not in self.senders:
+            raise ValueError(f"Unknown delivery channel: {channel}")
+        future = Future()
+        item = {'channel': channel, 'payload': payload, 'attempts': 0,
+                'limit_key': limit_key, 'future': future, 'replays': replays,
+                'first_failed_at': first_failed_at}
+        self._push(item, time.monotonic())
+        self._start()
+        return future
+
+    def limiter(self, channel, limit_key=None):
+        if channel not in self.rates:
+            return None
+        with self._limiter_lock:
+            key = (channel, limit_key)
+            if key not in self.limiters:
+                self.limiters[key] = RateLimiter(self.rates[channel])
+            return self.limiters[key]
+
+    def _push(self, item, ready_at):
+        with self._cond:
+            heapq.heappush(self._heap, (ready_at, next(self._seq), item))
+            self._cond.notify()
+
+    def _start(self):
+        with self._cond:
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._worker, daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _next(self):
+        with self._cond:
+            while True:
+                if self._heap:
+                    ready_at = self._heap[0][0]
+                    now = time.monotonic()
+                    if ready_at <= now:
+                        return heapq.heappop(self._heap)[2]
+                    self._cond.wait(ready_at - now)
+                else:
+                    self._cond.wait()
+
+    def backoff(self, attempts, retry_after=None):
+        """第 attempts 次失敗後的等待秒數 (full jitter)"""
+        if retry_after is not None:
+            return retry_after
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempts - 1))
+        return random.uniform(delay / 2, delay)
+
+    def _worker(self):
+        while True:
+            item = self._next()
+            channel = item['channel']
+            limiter = self.limiter(channel, item['limit_key'])
+            if limiter is not None:
+                limiter.acquire()
+            item['attempts'] += 1
+            try:
+                with span('deliver', channel=channel):
+                    result = self.senders[channel](item['payload'])
+            except DeliveryError as e:
+                error = e
+            except requests.exceptions.RequestException as e:
+                error = DeliveryError(str(e), retryable=True)
+            except Exception as e:
+                error = DeliveryError(str(e))
+            else:
+                item['future'].set_result(result)
+                continue
+
+            if error.retryable and item['attempts'] < self.max_attempts:
+                delay = self.backoff(item['attempts'], error.retry_after)
+                if error.status == 429 and limiter is not None:
+                    limiter.pause(delay)
+                incr('delivery_retries', channel=channel)
+                self._push(item, time.monotonic() + delay)
+                continue
+            self._dead_letter(item, error)
+            item['future'].set_exception(error)
+
+    def dead_letter(self, channel, payload, error, attempts=0, limit_key=None):
+        """記錄在佇列外 (例如其他程序) 失敗的項目,下次 replay 時重送"""
+        self._dead_letter({'channel': channel, 'payload': payload,
+                           'attempts': attempts, 'limit_key': limit_key},
+                          error)
+
+    def _dead_letter(self, item, error):
+        incr('delivery_dead_letters', channel=item['channel'])
+        print(f"Delivery to {item['channel']} failed after "
+              f"{item['attempts']} attempts: {error}")
+        if not self.dead_letter_path:
+            return
+        now = time.time()
+        record = {
+            'channel': item['channel'],
+            'payload': item['payload'],
+            'attempts': item['attempts'],
+            'limit_key': item['limit_key'],
+            'status': error.status,
+            'retryable': error.retryable,
+            'error': str(error),
+            'failed_at': now,
+            'first_failed_at': item.get('first_failed_at') or now,
+            'replays': item.get('replays', 0),
+        }
+        with self._file_lock:
+            directory = os.path.dirname(self.dead_letter_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.dead_letter_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+    def replay_dead_letters(self, max_age=DEAD_LETTER_MAX_AGE,
+                            max_replays=DEAD_LETTER_MAX_REPLAYS):
+        """
+        重新送出 dead-letter 檔中的項目,回傳 Future list
+
+        不可重試的失敗 (4xx,429 除外)、第一次失敗超過 max_age 秒或已重送
+        max_replays 次的項目直接丟棄;沒有對應 sender 的通道 (例如這次未設定
+        LINE_BOT_TOKEN) 保留在檔案中。重送失敗的項目會再寫回檔案。
+        """
+        if not self.dead_letter_path or not os.path.exists(self.dead_letter_path):
+            return []
+        now = time.time()
+        replay, kept, dropped = [], [], 0
+        with self._file_lock:
+            with open(self.dead_letter_path, encoding='utf-8') as f:
+                records = [json.loads(line) for line in f if line.strip()]
+            for record in records:
+                if not replayable(record, now, max_age, max_replays):
+                    dropped += 1
+                elif record['channel'] not in self.senders:
+                    kept.append(record)
+                else:
+                    replay.append(record)
+            self._rewrite_dead_letters(kept)
+        if dropped:
+            incr('delivery_dead_letters_dropped', dropped)
+            print(f"Dropped {dropped} dead letters (not retryable, expired "
+                  f"or replayed {max_replays} times)")
+        return [self._enqueue(r['channel'], r['payload'], r.get('limit_key'),
+                              replays=r.get('replays', 0) + 1,
+                              first_failed_at=r.get('first_failed_at',
+                                                    r.get('failed_at')))
+                for r in replay]
+
+    def _rewrite_dead_letters(self, records):
+        """以 records 取代 dead-letter 檔 (先寫暫存檔再 rename),呼叫前須持有 _file_lock"""
+        if not records:
+            os.remove(self.dead_letter_path)
+            return
+        directory = os.path.dirname(self.dead_letter_path) or '.'
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+        os.replace(tmp, self.dead_letter_path)
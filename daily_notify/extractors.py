@@ -0,0 +1,167 @@
+"""
+cnyes 指數頁面欄位擷取
+
+提供多種後端,輸出相同的欄位文字:
+- bs4: BeautifulSoup html.parser 完整 DOM (原本的作法)
+- lxml: lxml.html + XPath (需另外安裝 lxml)
+- stream: 標準函式庫 HTMLParser 串流掃描,只收集目標元素文字,
+  找齊所有欄位即停止,不建立 DOM
+"""
+import os
+from html.parser import HTMLParser
+
+# 欄位 -> 元素需具備的 class
+SELECTORS = {
+    'date': ('_zFXfK',),
+    'price': ('jsx-2214436525', 'info-price'),
+    'net': ('jsx-2214436525', 'change-net'),
+    'percent': ('jsx-2214436525', 'change-percent'),
+}
+
+# 沒有結束標籤的元素
+VOID_TAGS = frozenset([
+    'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link',
+    'meta', 'param', 'source', 'track', 'wbr',
+])
+
+
+def _missing(fields):
+    return ValueError(f"Fields not found in page: {', '.join(fields)}")
+
+
+class BS4Extractor:
+    name = 'bs4'
+
+    def __init__(self, selectors=SELECTORS):
+        from bs4 import BeautifulSoup
+        self._soup = BeautifulSoup
+        self.css = {field: '.' + '.'.join(classes)
+                    for field, classes in selectors.items()}
+
+    def extract(self, html):
+        soup = self._soup(html, 'html.parser')
+        fields = {}
+        for field, css in self.css.items():
+            found = soup.select(css)
+            if found:
+                fields[field] = found[0].text
+        missing = [f for f in self.css if f not in fields]
+        if missing:
+            raise _missing(missing)
+        return fields
+
+
+class LxmlExtractor:
+    name = 'lxml'
+
+    def __init__(self, selectors=SELECTORS):
+        import lxml.html
+        self._fromstring = lxml.html.fromstring
+        self.xpath = {}
+        for field, classes in selectors.items():
+            cond = ' and '.join(
+                f'contains(concat(" ", normalize-space(@class), " "), " {c} ")'
+                for c in classes)
+            self.xpath[field] = f'(//*[{cond}])[1]'
+
+    def extract(self, html):
+        tree = self._fromstring(html)
+        fields = {}
+        for field, xpath in self.xpath.items():
+            found = tree.xpath(xpath)
+            if found:
+                fields[field] = found[0].text_content()
+        missing = [f for f in self.xpath if f not in fields]
+        if missing:
+            raise _missing(missing)
+        return fields
+
+
+class _TargetParser(HTMLParser):
+    """只追蹤目標元素的 HTMLParser,結束標籤依標籤堆疊比對 (與 bs4 相同)"""
+
+    def __init__(self, selectors):
+        super().__init__()
+        self.selectors = selectors
+        self.found = {}
+        self.active = []  # [field, 堆疊深度, 文字片段]
+        self.stack = []
+
+    @property
+    def done(self):
+        return not self.active and len(self.found) == len(self.selectors)
+
+    def handle_starttag(self, tag, attrs):
+        classes = None
+        for key, value in attrs:
+            if key == 'class' and value:
+                classes = set(value.split())
+                break
+        if tag not in VOID_TAGS:
+            self.stack.append(tag)
+        if classes is None or tag in VOID_TAGS:
+            return
+        for field, wanted in self.selectors.items():
+            if field in self.found or any(a[0] == field for a in self.active):
+                continue
+            if wanted <= classes:
+                self.active.append([field, len(self.stack), []])
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_TAGS:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if tag not in self.stack:
+            return
+        while self.stack and self.stack.pop() != tag:
+            pass
+        depth = len(self.stack)
+        for entry in [a for a in self.active if a[1] > depth]:
+            self.found[entry[0]] = ''.join(entry[2])
+            self.active.remove(entry)
+
+    def handle_data(self, data):
+        for entry in self.active:
+            entry[2].append(data)
+
+
+class StreamExtractor:
+    name = 'stream'
+    chunk_size = 16 * 1024
+
+    def __init__(self, selectors=SELECTORS):
+        self.selectors = {field: frozenset(classes)
+                          for field, classes in selectors.items()}
+
+    def extract(self, html):
+        parser = _TargetParser(self.selectors)
+        for i in range(0, len(html), self.chunk_size):
+            parser.feed(html[i:i + self.chunk_size])
+            if parser.done:
+                break
+        else:
+            parser.close()
+            # 未關閉的元素視為到文件結尾
+            for entry in parser.active:
+                parser.found[entry[0]] = ''.join(entry[2])
+        missing = [f for f in self.selectors if f not in parser.found]
+        if missing:
+            raise _missing(missing)
+        return {f: parser.found[f] for f in self.selectors}
+
+
+EXTRACTORS = {
+    'bs4': BS4Extractor,
+    'lxml': LxmlExtractor,
+    'stream': StreamExtractor,
+}
+
+
+def get_extractor(name=None):
+    """依名稱建立擷取器,預設讀取環境變數 CNYES_EXTRACTOR (預設 stream)"""
+    name = name or os.getenv('CNYES_EXTRACTOR', 'stream')
+    if name not in EXTRACTORS:
+        raise ValueError(f"Unknown extractor: {name}")
+    return EXTRACTORS[name]()
@@ -0,0 +1,119 @@
+"""
+個人化推送的分組與分片
+
+1. plan: 依 (代號, 縣市) 將訂閱者分組,每組只產生一次訊息;
+   產生後內容仍相同的組 (例如缺少報價) 再合併
+2. deliver: 將 LINE 請求分片給多個子程序並行送出,
+   每個子程序分到通道限速的一部分,失敗的項目交回主程序寫入 dead-letter
+
+執行時間取決於不同內容的數量,與訂閱者人數無關 (multicast 每次 500 人)。
+"""
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from delivery import (RATE_LIMITS, DeliveryError, DeliveryQueue, LineSender,
+                      line_batches)
+from state_store import content_hash
+
+# 每個子程序至少分到的請求數,太少時不值得啟動子程序
+MIN_SHARD_SIZE = 200
+
+
+def plan(subscribers, render):
+    """
+    Args:
+        subscribers: [{'user_id', 'symbols' (網址 tuple), 'location'}]
+        render: callable(symbols, location) -> 訊息 list (dict)
+
+    Returns:
+        [(訊息 list, [user_id, ...])]
+    """
+    groups = {}
+    for sub in subscribers:
+        key = (tuple(sub['symbols']), sub['location'])
+        groups.setdefault(key, []).append(sub['user_id'])
+
+    merged = {}
+    for (symbols, location), user_ids in groups.items():
+        messages = render(symbols, location)
+        if not messages:
+            continue
+        digest = content_hash(messages)
+        if digest in merged:
+            merged[digest][1].extend(user_ids)
+        else:
+            merged[digest] = (messages, list(user_ids))
+    return list(merged.values())
+
+
+def payloads(groups, max_messages=5, max_multicast=500):
+    """分組結果 -> LINE 請求 (push / multicast)"""
+    return [payload
+            for messages, user_ids in groups
+            for payload in line_batches(messages, user_ids,
+                                        max_messages=max_messages,
+                                        max_multicast=max_multicast)]
+
+
+def _deliver_shard(token, endpoint, items, rate):
+    """子程序: 以自己的 session 與佇列送出一個分片"""
+    from transport import create_session
+
+    queue = DeliveryQueue(
+        {'line': LineSender(token, create_session(), endpoint)},
+        rate_limits={'line': rate})
+    futures = [queue.submit('line', item) for item in items]
+    failed = []
+    for item, future in zip(items, futures):
+        error = future.exception()
+        if error is not None:
+            failed.append((item, str(error), getattr(error, 'status', None)))
+    return len(items) - len(failed), failed
+
+
+def deliver(items, token, endpoint, queue, processes=None):
+    """
+    送出 LINE 請求,數量夠多時分片到多個子程序
+
+    Args:
+        queue: 主程序的 DeliveryQueue,請求少時直接使用,並負責寫入 dead-letter
+        processes: 子程序數上限,None 表示 CPU 數
+
+    Returns:
+        (成功數, 失敗數)
+    """
+    processes = min(processes or os.cpu_count() or 1,
+                    len(items) // MIN_SHARD_SIZE)
+    if processes <= 1:
+        futures = [queue.submit('line', item) for item in items]
+        failed = sum(1 for f in futures if f.exception() is not None)
+        return len(items) - failed, failed
+
+    shards = [items[i::processes] for i in range(processes)]
+    rate = RATE_LIMITS['line'] / processes
+    sent = failed = 0
+    # spawn: 主程序已有背景 thread,不適合 fork
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=processes,
+                             mp_context=context) as executor:
+        results = executor.map(_deliver_shard, [token] * processes,
+                               [endpoint] * processes, shards,
+                               [rate] * processes)
+        for shard_sent, shard_failed in results:
+            sent += shard_sent
+            failed += len(shard_failed)
+            for item, message, status in shard_failed:
+                queue.dead_letter('line', item,
+                                  DeliveryError(message, status=status))
+    return sent, failed
+
+
+def describe(groups):
+    """分組摘要 (dry-run 與紀錄用)"""
+    users = sum(len(user_ids) for _, user_ids in groups)
+    size = sum(len(json.dumps(messages, ensure_ascii=False).encode('utf-8'))
+               for messages, _ in groups)
+    return (f"{users} subscribers, {len(groups)} distinct payloads, "
+            f"{size / 1024:.0f} KiB rendered")
@@ -1,10 +1,290 @@
 """
 LINE Flex Message 模板
+
+骨架 (header、樣式、每列的固定設定) 只在載入時序列化一次,
+之後每次只填入資料欄位;相同內容的訊息只建立一次並重複使用。
 """
-from linebot.models import FlexSendMessage
+import hashlib
+import json
+import re
+from functools import lru_cache
+
+# LINE carousel 最多可放 12 個 bubble
+MAX_CAROUSEL_BUBBLES = 12
+
+
+class Slot:
+    """模板中的資料欄位"""
+
+    def __init__(self, name):
+        self.name = name
+
+
+class Splice(Slot):
+    """list 最後的任意個元素 (list of RawJson,可為空)"""
+
+
+class RawJson(str):
+    """已序列化的 JSON 片段,填入模板時不再轉義"""
+
+
+class JsonTemplate:
+    """
+    預先序列化的 JSON 模板
+
+    skeleton 中的 Slot 會在 render 時替換成對應的值;
+    Splice 只能放在 list 的最後,填入的元素會接在前面的元素之後
+    """
+    _MARKER = re.compile(r'"\\u0000(\w+)\\u0000"')
+
+    def __init__(self, skeleton):
+        text = json.dumps(self._mark(skeleton), separators=(',', ':'))
+        self._parts = self._MARKER.split(text)
+
+    def _mark(self, node):
+        if isinstance(node, Slot):
+            return f"\x00{node.name}\x00"
+        if isinstance(node, dict):
+            return {k: self._mark(v) for k, v in node.items()}
+        if isinstance(node, list):
+            return [self._mark(v) for v in node]
+        return node
+
+    def render(self, **values):
+        parts = list(self._parts)
+        for i in range(1, len(parts), 2):
+            value = values[parts[i]]
+            if isinstance(value, (list, tuple)):
+                value = ','.join(value)
+                if not value:
+                    # 空的 Splice: 去掉前一個元素後的逗號
+                    parts[i - 1] = parts[i - 1][:-1]
+            elif not isinstance(value, RawJson):
+                value = json.dumps(value, ensure_ascii=False)
+            parts[i] = value
+        return RawJson(''.join(parts))
+
+
+def content_hash(rendered):
+    """訊息內容的雜湊值,可作為快取 key"""
+    return hashlib.sha1(rendered.encode('utf-8')).hexdigest()
+
+
+@lru_cache(maxsize=1024)
+def _flex_message(alt_text, contents_json):
+    # 相同內容只建立一次 FlexSendMessage;linebot 載入較慢,用到時才 import
+    from linebot.models import FlexSendMessage
+    return FlexSendMessage(alt_text=alt_text, contents=json.loads(contents_json))
+
+
+def _json_list(items):
+    return RawJson('[' + ','.join(items) + ']')
+
+
+STOCK_ROW = JsonTemplate({
+    "type": "box",
+    "layout": "vertical",
+    "contents": [
+        {
+            "type": "box",
+            "layout": "horizontal",
+            "contents": [
+                {
+                    "type": "text",
+                    "text": Slot("name"),
+                    "weight": "bold",
+                    "size": "md",
+                    "color": "#1DB446",
+                    "flex": 0
+                },
+                {
+                    "type": "text",
+                    "text": Slot("date"),
+                    "size": "xs",
+                    "color": "#999999",
+                    "align": "end"
+                }
+            ]
+        },
+        {
+            "type": "box",
+            "layout": "horizontal",
+            "contents": [
+                {
+                    "type": "text",
+                    "text": Slot("price"),
+                    "size": "xl",
+                    "weight": "bold",
+                    "color": "#333333"
+                }
+            ],
+            "margin": "sm"
+        },
+        {
+            "type": "box",
+            "layout": "horizontal",
+            "contents": [
+                {
+                    "type": "text",
+                    "text": Slot("change"),
+                    "size": "sm",
+                    "color": Slot("trend_color"),
+                    "flex": 0
+                },
+                {
+                    "type": "text",
+                    "text": Slot("percent"),
+                    "size": "sm",
+                    "color": Slot("trend_color"),
+                    "margin": "md"
+                }
+            ],
+            "margin": "sm"
+        },
+        Splice("extra")
+    ],
+    "paddingAll": "15px",
+    "backgroundColor": Slot("background"),
+    "cornerRadius": "10px",
+    "margin": Slot("margin")
+})
+
+STOCK_BUBBLE = JsonTemplate({
+    "type": "bubble",
+    "size": "mega",
+    "header": {
+        "type": "box",
+        "layout": "vertical",
+        "contents": [
+            {
+                "type": "text",
+                "text": Slot("title"),
+                "color": "#ffffff",
+                "size": "xl",
+                "weight": "bold"
+            },
+            {
+                "type": "text",
+                "text": Slot("subtitle"),
+                "color": "#ffffff",
+                "size": "xs",
+                "margin": "xs"
+            }
+        ],
+        "backgroundColor": "#1E90FF",
+        "paddingAll": "20px"
+    },
+    "body": {
+        "type": "box",
+        "layout": "vertical",
+        "contents": Slot("rows"),
+        "paddingAll": "15px"
+    },
+    "styles": {
+        "header": {
+            "backgroundColor": "#1E90FF"
+        }
+    }
+})
+
+
+STOCK_STATS = JsonTemplate({
+    "type": "box",
+    "layout": "vertical",
+    "contents": [
+        {
+            "type": "text",
+            "text": Slot("averages"),
+            "size": "xxs",
+            "color": "#666666",
+            "wrap": True
+        },
+        {
+            "type": "text",
+            "text": Slot("ranges"),
+            "size": "xxs",
+            "color": "#666666",
+            "wrap": True,
+            "margin": "xs"
+        }
+    ],
+    "margin": "sm"
+})
+
+STOCK_SPARKLINE = JsonTemplate({
+    "type": "image",
+    "url": Slot("url"),
+    "size": "full",
+    "aspectRatio": "4:1",
+    "aspectMode": "fit",
+    "margin": "sm"
+})
+
+
+def _format_percent(value):
+    if value is None:
+        return "-"
+    return f"{'▼' if value < 0 else '▲'}{abs(value):.2f}%"
+
+
+def _format_price(value):
+    return "-" if value is None else f"{value:,.2f}"
+
+
+@lru_cache(maxsize=4096)
+def _stock_extra(ma, week, month, high52, low52, sparkline):
+    averages = " · ".join(f"MA{w} {_format_price(v)}" for w, v in ma)
+    ranges = (f"週 {_format_percent(week)} · 月 {_format_percent(month)} · "
+              f"52週 {_format_price(low52)} - {_format_price(high52)}")
+    extra = [STOCK_STATS.render(averages=averages, ranges=ranges)]
+    if sparkline:
+        extra.append(STOCK_SPARKLINE.render(url=sparkline))
+    return tuple(extra)
+
+
+def stock_extra(stats):
+    """技術指標 (analytics.analyze 的結果) -> 列下方的 Flex 元件"""
+    if not stats:
+        return ()
+    return _stock_extra(tuple(stats['ma'].items()), stats['week'],
+                        stats['month'], stats['high52'], stats['low52'],
+                        stats.get('sparkline'))
+
+
+@lru_cache(maxsize=4096)
+def _stock_row(i, name, date, price, change, percent, trend, extra=()):
+    trend_color = "#FF4444" if trend == "down" else "#00C851"
+    trend_icon = "▼" if trend == "down" else "▲"
+    return STOCK_ROW.render(
+        name=name,
+        date=date,
+        price=price,
+        change=f"{trend_icon} {change}",
+        percent=f"{trend_icon} {percent}",
+        trend_color=trend_color,
+        background="#F8F8F8" if i % 2 == 0 else "#FFFFFF",
+        margin="sm" if i > 0 else "none",
+        extra=extra,
+    )
+
+
+def render_stock_json(stocks_data, analytics=None, title="📊 美股日報",
+                      subtitle="US Stock Market"):
+    """美股 bubble 的 JSON 字串,analytics 為 {名稱: 技術指標}"""
+    analytics = analytics or {}
+    rows = [
+        # 背景色只與奇偶有關,margin 只與是否為第一列有關
+        _stock_row(min(i, 2 - i % 2), stock["name"], stock["date"],
+                   stock["price"], stock["change"], stock["percent"],
+                   stock["trend"], stock_extra(analytics.get(stock["name"])))
+        for i, stock in enumerate(stocks_data)
+    ]
+    return STOCK_BUBBLE.render(rows=_json_list(rows), title=title,
+                               subtitle=subtitle)
 
 
-def create_stock_flex_message(stocks_data):
+def create_stock_flex_message(stocks_data, analytics=None, title="📊 美股日報",
+                              subtitle="US Stock Market"):
     """
     建立美股資訊的 Flex Message
 
@@ -16,121 +296,216 @@ def create_stock_flex_message(stocks_data):
             - change: 漲跌點數
             - percent: 漲跌百分比
             - trend: 'up' or 'down'
+        analytics: {股票名稱: analytics.analyze 的結果},顯示均線、
+            週/月漲跌、52 週高低與走勢圖
+        title / subtitle: header 文字,title 同時作為通知替代文字
     """
-    contents = []
-    for i, stock in enumerate(stocks_data):
-        trend_color = "#FF4444" if stock["trend"] == "down" else "#00C851"
-        trend_icon = "▼" if stock["trend"] == "down" else "▲"
+    return _flex_message(title, render_stock_json(stocks_data, analytics,
+                                                  title, subtitle))
 
-        stock_box = {
+
+WEATHER_CARD = JsonTemplate({
+    "type": "box",
+    "layout": "vertical",
+    "contents": [
+        # 標題列: emoji + 時段 + 時間
+        {
             "type": "box",
-            "layout": "vertical",
+            "layout": "horizontal",
             "contents": [
+                {
+                    "type": "text",
+                    "text": Slot("emoji"),
+                    "size": "lg",
+                    "flex": 0,
+                    "margin": "none"
+                },
                 {
                     "type": "box",
-                    "layout": "horizontal",
+                    "layout": "vertical",
                     "contents": [
                         {
                             "type": "text",
-                            "text": stock["name"],
+                            "text": Slot("period"),
                             "weight": "bold",
                             "size": "md",
-                            "color": "#1DB446",
-                            "flex": 0
+                            "color": "#2C3E50"
                         },
                         {
                             "type": "text",
-                            "text": stock["date"],
-                            "size": "xs",
-                            "color": "#999999",
-                            "align": "end"
+                            "text": Slot("time"),
+                            "size": "xxs",
+                            "color": "#95A5A6"
                         }
-                    ]
+                    ],
+                    "margin": "md"
+                }
+            ]
+        },
+        {
+            "type": "separator",
+            "margin": "md"
+        },
+        # 天氣資訊
+        {
+            "type": "box",
+            "layout": "vertical",
+            "contents": [
+                {
+                    "type": "text",
+                    "text": Slot("weather"),
+                    "size": "md",
+                    "color": "#34495E",
+                    "weight": "bold",
+                    "wrap": True
                 },
+                {
+                    "type": "text",
+                    "text": Slot("comfort"),
+                    "size": "sm",
+                    "color": "#7F8C8D",
+                    "margin": "xs",
+                    "wrap": True
+                }
+            ],
+            "margin": "md"
+        },
+        # 溫度和降雨 - 並排顯示
+        {
+            "type": "box",
+            "layout": "horizontal",
+            "contents": [
                 {
                     "type": "box",
-                    "layout": "horizontal",
+                    "layout": "baseline",
                     "contents": [
                         {
                             "type": "text",
-                            "text": stock["price"],
-                            "size": "xl",
+                            "text": "🌡️",
+                            "size": "md",
+                            "flex": 0
+                        },
+                        {
+                            "type": "text",
+                            "text": Slot("temp"),
+                            "size": "md",
                             "weight": "bold",
-                            "color": "#333333"
+                            "color": "#FF6B35",
+                            "margin": "sm",
+                            "flex": 0
                         }
                     ],
-                    "margin": "sm"
+                    "flex": 1
                 },
                 {
                     "type": "box",
-                    "layout": "horizontal",
+                    "layout": "baseline",
                     "contents": [
                         {
                             "type": "text",
-                            "text": f"{trend_icon} {stock['change']}",
-                            "size": "sm",
-                            "color": trend_color,
+                            "text": "💧",
+                            "size": "md",
                             "flex": 0
                         },
                         {
                             "type": "text",
-                            "text": f"{trend_icon} {stock['percent']}",
-                            "size": "sm",
-                            "color": trend_color,
-                            "margin": "md"
+                            "text": Slot("rain"),
+                            "size": "md",
+                            "weight": "bold",
+                            "color": Slot("rain_color"),
+                            "margin": "sm",
+                            "flex": 0
                         }
                     ],
-                    "margin": "sm"
+                    "flex": 1
                 }
             ],
-            "paddingAll": "15px",
-            "backgroundColor": "#F8F8F8" if i % 2 == 0 else "#FFFFFF",
-            "cornerRadius": "10px",
-            "margin": "sm" if i > 0 else "none"
+            "margin": "md",
+            "spacing": "md"
         }
-        contents.append(stock_box)
-
-    flex_message = FlexSendMessage(
-        alt_text="📊 美股日報",
-        contents={
-            "type": "bubble",
-            "size": "mega",
-            "header": {
-                "type": "box",
-                "layout": "vertical",
-                "contents": [
-                    {
-                        "type": "text",
-                        "text": "📊 美股日報",
-                        "color": "#ffffff",
-                        "size": "xl",
-                        "weight": "bold"
-                    },
-                    {
-                        "type": "text",
-                        "text": "US Stock Market",
-                        "color": "#ffffff",
-                        "size": "xs",
-                        "margin": "xs"
-                    }
-                ],
-                "backgroundColor": "#1E90FF",
-                "paddingAll": "20px"
-            },
-            "body": {
-                "type": "box",
-                "layout": "vertical",
-                "contents": contents,
-                "paddingAll": "15px"
-            },
-            "styles": {
-                "header": {
-                    "backgroundColor": "#1E90FF"
-                }
-            }
+    ],
+    "backgroundColor": "#FAFAFA",
+    "cornerRadius": "10px",
+    "paddingAll": "15px",
+    "margin": "md"
+})
+
+WEATHER_BUBBLE = JsonTemplate({
+    "type": "bubble",
+    "size": "mega",
+    "body": {
+        "type": "box",
+        "layout": "vertical",
+        "contents": Slot("contents"),
+        "paddingAll": "20px"
+    },
+    "styles": {
+        "body": {
+            "backgroundColor": "#FFFFFF"
+        }
+    }
+})
+
+WEATHER_TITLE = JsonTemplate({
+    "type": "box",
+    "layout": "vertical",
+    "contents": [
+        {
+            "type": "text",
+            "text": Slot("title"),
+            "weight": "bold",
+            "size": "xl",
+            "color": "#2C3E50"
+        },
+        {
+            "type": "text",
+            "text": "36 小時預報",
+            "size": "xs",
+            "color": "#95A5A6",
+            "margin": "xs"
         }
+    ],
+    "paddingBottom": "15px"
+})
+
+SEPARATOR = RawJson(json.dumps({"type": "separator"}))
+
+
+def rain_color(rain):
+    """降雨機率顏色"""
+    rain_percent = int(rain)
+    if rain_percent >= 70:
+        return "#E53935"
+    elif rain_percent >= 30:
+        return "#FB8C00"
+    return "#43A047"
+
+
+@lru_cache(maxsize=4096)
+def _weather_card(emoji, period, time, weather, comfort, min_temp, max_temp,
+                  rain):
+    return WEATHER_CARD.render(
+        emoji=emoji,
+        period=period,
+        time=time,
+        weather=weather,
+        comfort=comfort,
+        temp=f"{min_temp}° - {max_temp}°",
+        rain=f"{rain}%",
+        rain_color=rain_color(rain),
     )
-    return flex_message
+
+
+def render_weather_json(location_name, weather_data):
+    """天氣 bubble 的 JSON 字串"""
+    contents = [WEATHER_TITLE.render(title=f"🌤️ {location_name}天氣"),
+                SEPARATOR]
+    for weather in weather_data:
+        contents.append(_weather_card(
+            weather["emoji"], weather["period"], weather["time"],
+            weather["weather"], weather["comfort"], weather["minTemp"],
+            weather["maxTemp"], weather["rain"]))
+    return WEATHER_BUBBLE.render(contents=_json_list(contents))
 
 
 def create_weather_flex_message(location_name, weather_data):
@@ -149,188 +524,66 @@ def create_weather_flex_message(location_name, weather_data):
             - maxTemp: 最高溫度
             - rain: 降雨機率
     """
-    # 建立天氣項目
-    contents = [
-        {
-            "type": "box",
-            "layout": "vertical",
-            "contents": [
-                {
-                    "type": "text",
-                    "text": f"🌤️ {location_name}天氣",
-                    "weight": "bold",
-                    "size": "xl",
-                    "color": "#2C3E50"
-                },
-                {
-                    "type": "text",
-                    "text": "36 小時預報",
-                    "size": "xs",
-                    "color": "#95A5A6",
-                    "margin": "xs"
-                }
-            ],
-            "paddingBottom": "15px"
-        },
-        {
-            "type": "separator"
-        }
-    ]
+    return _flex_message(f"🌤️ {location_name} 36 小時天氣預報",
+                         render_weather_json(location_name, weather_data))
 
-    for i, weather in enumerate(weather_data):
-        # 降雨機率顏色
-        rain_percent = int(weather["rain"])
-        if rain_percent >= 70:
-            rain_color = "#E53935"
-        elif rain_percent >= 30:
-            rain_color = "#FB8C00"
+
+def create_carousel_flex_message(flex_messages, alt_text="📬 每日資訊"):
+    """
+    將多個 bubble 合併成一則 carousel Flex Message
+
+    Args:
+        flex_messages: list of FlexSendMessage (每個內容為 bubble)
+        alt_text: 通知列顯示的替代文字
+
+    Returns:
+        list of FlexSendMessage, 每則最多 12 個 bubble (LINE 上限)
+    """
+    bubbles = []
+    for message in flex_messages:
+        contents = message.contents
+        if hasattr(contents, "as_json_dict"):
+            contents = contents.as_json_dict()
+        if contents.get("type") == "carousel":
+            bubbles.extend(contents["contents"])
         else:
-            rain_color = "#43A047"
+            bubbles.append(contents)
 
-        # 卡片式設計
-        weather_card = {
-            "type": "box",
-            "layout": "vertical",
-            "contents": [
-                # 標題列: emoji + 時段 + 時間
-                {
-                    "type": "box",
-                    "layout": "horizontal",
-                    "contents": [
-                        {
-                            "type": "text",
-                            "text": weather["emoji"],
-                            "size": "lg",
-                            "flex": 0,
-                            "margin": "none"
-                        },
-                        {
-                            "type": "box",
-                            "layout": "vertical",
-                            "contents": [
-                                {
-                                    "type": "text",
-                                    "text": weather["period"],
-                                    "weight": "bold",
-                                    "size": "md",
-                                    "color": "#2C3E50"
-                                },
-                                {
-                                    "type": "text",
-                                    "text": weather["time"],
-                                    "size": "xxs",
-                                    "color": "#95A5A6"
-                                }
-                            ],
-                            "margin": "md"
-                        }
-                    ]
-                },
-                {
-                    "type": "separator",
-                    "margin": "md"
-                },
-                # 天氣資訊
-                {
-                    "type": "box",
-                    "layout": "vertical",
-                    "contents": [
-                        {
-                            "type": "text",
-                            "text": weather["weather"],
-                            "size": "md",
-                            "color": "#34495E",
-                            "weight": "bold",
-                            "wrap": True
-                        },
-                        {
-                            "type": "text",
-                            "text": weather["comfort"],
-                            "size": "sm",
-                            "color": "#7F8C8D",
-                            "margin": "xs",
-                            "wrap": True
-                        }
-                    ],
-                    "margin": "md"
-                },
-                # 溫度和降雨 - 並排顯示
-                {
-                    "type": "box",
-                    "layout": "horizontal",
-                    "contents": [
-                        {
-                            "type": "box",
-                            "layout": "baseline",
-                            "contents": [
-                                {
-                                    "type": "text",
-                                    "text": "🌡️",
-                                    "size": "md",
-                                    "flex": 0
-                                },
-                                {
-                                    "type": "text",
-                                    "text": f"{weather['minTemp']}° - {weather['maxTemp']}°",
-                                    "size": "md",
-                                    "weight": "bold",
-                                    "color": "#FF6B35",
-                                    "margin": "sm",
-                                    "flex": 0
-                                }
-                            ],
-                            "flex": 1
-                        },
-                        {
-                            "type": "box",
-                            "layout": "baseline",
-                            "contents": [
-                                {
-                                    "type": "text",
-                                    "text": "💧",
-                                    "size": "md",
-                                    "flex": 0
-                                },
-                                {
-                                    "type": "text",
-                                    "text": f"{weather['rain']}%",
-                                    "size": "md",
-                                    "weight": "bold",
-                                    "color": rain_color,
-                                    "margin": "sm",
-                                    "flex": 0
-                                }
-                            ],
-                            "flex": 1
-                        }
-                    ],
-                    "margin": "md",
-                    "spacing": "md"
-                }
-            ],
-            "backgroundColor": "#FAFAFA",
-            "cornerRadius": "10px",
-            "paddingAll": "15px",
-            "margin": "md"
-        }
-        contents.append(weather_card)
-
-    flex_message = FlexSendMessage(
-        alt_text=f"🌤️ {location_name} 36 小時天氣預報",
-        contents={
-            "type": "bubble",
-            "size": "mega",
-            "body": {
-                "type": "box",
-                "layout": "vertical",
-                "contents": contents,
-                "paddingAll": "20px"
-            },
-            "styles": {
-                "body": {
-                    "backgroundColor": "#FFFFFF"
-                }
+    from linebot.models import FlexSendMessage
+    return [
+        FlexSendMessage(
+            alt_text=alt_text,
+            contents={
+                "type": "carousel",
+                "contents": bubbles[i:i + MAX_CAROUSEL_BUBBLES]
+            }
+        )
+        for i in range(0, len(bubbles), MAX_CAROUSEL_BUBBLES)
+    ]
+
+
+def bubble_message(bubble_json, alt_text):
+    """以已序列化的 bubble 組成單一 Flex 訊息 (dict)"""
+    return {"type": "flex", "altText": alt_text,
+            "contents": json.loads(bubble_json)}
+
+
+def carousel_messages(bubble_jsons, alt_text="📬 每日資訊"):
+    """
+    以已序列化的 bubble 直接組成 carousel 訊息 (dict)
+
+    不建立 SDK 物件,適合大量訊息 (例如每位使用者的自選清單);
+    dict 可直接交給 delivery.line_payload。
+    """
+    bubbles = [json.loads(b) for b in bubble_jsons]
+    return [
+        {
+            "type": "flex",
+            "altText": alt_text,
+            "contents": {
+                "type": "carousel",
+                "contents": bubbles[i:i + MAX_CAROUSEL_BUBBLES]
             }
         }
-    )
-    return flex_message
+        for i in range(0, len(bubbles), MAX_CAROUSEL_BUBBLES)
+    ]
@@ -0,0 +1,131 @@
+"""
+氣象署預報的欄式表格
+
+將 records.location 展開成 縣市 × 元素 × 時段 的平行 list: 每個元素一組
+starts / ends / values,各縣市在其中的範圍記錄於 offsets。全國各縣市的時段
+通常相同,同一個時間字串只解析一次。
+
+只支援 F-C0032 (縣市 36 小時預報) 的格式。
+"""
+from datetime import datetime
+
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# (起始小時, 結束小時, emoji, 名稱),與 WeatherForecast.get_period_name 相同
+DAY_PARTS = (
+    (5, 12, '🌅', '早上'),
+    (12, 18, '☀️', '白天'),
+    (18, 24, '🌃', '晚上'),
+    (0, 5, '🌙', '凌晨'),
+)
+
+
+def day_part(hour):
+    """小時 -> (emoji, 名稱)"""
+    for start, end, emoji, label in DAY_PARTS:
+        if start <= hour < end:
+            return emoji, label
+    raise ValueError(f"Invalid hour: {hour}")
+
+
+class Column:
+    """單一元素所有縣市的時段,第 i 個縣市為 offsets[i]:offsets[i + 1]"""
+
+    __slots__ = ('offsets', 'starts', 'ends', 'values')
+
+    def __init__(self, rows=0):
+        # 之前的縣市沒有這個元素: 範圍為空
+        self.offsets = [0] * (rows + 1)
+        self.starts = []
+        self.ends = []
+        self.values = []
+
+
+class ForecastTable:
+    """
+    Args:
+        locations: records.location
+
+    Attributes:
+        names: 縣市名稱,依原始順序
+        columns: {元素名稱: Column}
+        times: {時間字串: (datetime, emoji, 時段名稱)},每個字串只解析一次
+    """
+
+    def __init__(self, locations=()):
+        self.names = []
+        self.index = {}
+        self.columns = {}
+        self.times = {}
+        for location in locations:
+            self.add(location)
+
+    def __len__(self):
+        return len(self.names)
+
+    def add(self, location):
+        row = len(self.names)
+        name = location['locationName']
+        times = self.times
+        for element in location['weatherElement']:
+            column = self.columns.get(element['elementName'])
+            if column is None:
+                column = self.columns[element['elementName']] = Column(row)
+            starts, ends, values = column.starts, column.ends, column.values
+            for entry in element['time']:
+                start = entry['startTime']
+                if start not in times:
+                    parsed = datetime.strptime(start, TIME_FORMAT)
+                    times[start] = (parsed,) + day_part(parsed.hour)
+                starts.append(start)
+                ends.append(entry['endTime'])
+                values.append(entry['parameter']['parameterName'])
+        for column in self.columns.values():
+            column.offsets.append(len(column.values))
+        self.index[name] = row
+        self.names.append(name)
+
+    def series(self, name, element):
+        """單一縣市、單一元素的 (starts, ends, values)"""
+        column = self.columns[element]
+        row = self.index[name]
+        begin, end = column.offsets[row], column.offsets[row + 1]
+        return (column.starts[begin:end], column.ends[begin:end],
+                column.values[begin:end])
+
+
+def summarize(table, name, today, periods=3):
+    """
+    36 小時預報的 (文字訊息, weather_data),
+    結果與 WeatherForecast.parse_location 相同
+
+    Args:
+        today: 用來判斷時段是否為明天的日期
+    """
+    starts, ends, wx = table.series(name, 'Wx')
+    ci = table.series(name, 'CI')[2]
+    min_t = table.series(name, 'MinT')[2]
+    max_t = table.series(name, 'MaxT')[2]
+    pop = table.series(name, 'PoP')[2]
+
+    lines = [f"*{name} 36 小時天氣預報*"]
+    weather_data = []
+    for i in range(periods):
+        start, end = starts[i], ends[i]
+        parsed, emoji, label = table.times[start]
+        lines.append("")
+        lines.append(f"{emoji} {label}({start[0:16]} ~ {end[11:16]})")
+        lines.append(f"{wx[i]},{ci[i]}")
+        lines.append(f"溫度:{min_t[i]}°C ~ {max_t[i]}°C")
+        lines.append(f"降雨:{pop[i]}%")
+        weather_data.append({
+            "period": "明天" + label if parsed.date() > today else label,
+            "emoji": emoji,
+            "time": f"{start[5:16]} - {end[5:16]}",
+            "weather": wx[i],
+            "comfort": ci[i],
+            "minTemp": min_t[i],
+            "maxTemp": max_t[i],
+            "rain": pop[i]
+        })
+    return "\n".join(lines), weather_data
@@ -0,0 +1,183 @@
+"""
+磁碟 HTTP 快取
+
+- TTL 內直接回傳快取,不發請求
+- 過期後帶 If-None-Match / If-Modified-Since 重新驗證,304 時沿用快取
+- 總容量超過上限時,依最後使用時間淘汰舊項目
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+
+from metrics import incr
+
+
+class CachedResponse:
+    """與 requests.Response 相容的最小介面"""
+
+    def __init__(self, url, status_code, content, encoding=None, headers=None,
+                 from_cache=False):
+        self.url = url
+        self.status_code = status_code
+        self.content = content
+        self.encoding = encoding or 'utf-8'
+        self.headers = headers or {}
+        self.from_cache = from_cache
+
+    @property
+    def text(self):
+        return self.content.decode(self.encoding, errors='replace')
+
+    def json(self):
+        return json.loads(self.content)
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise Exception(f"{self.status_code} Error for url: {self.url}")
+
+
+class HttpCache:
+    """
+    Args:
+        directory: 快取目錄
+        max_bytes: 快取總容量上限
+    """
+
+    def __init__(self, directory, max_bytes=50 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def _key(self, url, params):
+        raw = url + '?' + json.dumps(params or {}, sort_keys=True,
+                                     ensure_ascii=False)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def _paths(self, key):
+        base = os.path.join(self.directory, key)
+        return base + '.json', base + '.body'
+
+    def _load(self, key):
+        meta_path, body_path = self._paths(key)
+        try:
+            with open(meta_path, encoding='utf-8') as f:
+                meta = json.load(f)
+            with open(body_path, 'rb') as f:
+                body = f.read()
+        except (OSError, ValueError):
+            return None, None
+        return meta, body
+
+    def _write(self, path, data):
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def _store(self, key, meta, body):
+        meta_path, body_path = self._paths(key)
+        os.makedirs(self.directory, exist_ok=True)
+        self._write(body_path, body)
+        self._write(meta_path, json.dumps(meta, ensure_ascii=False).encode('utf-8'))
+        self.evict()
+
+    def _touch(self, key):
+        for path in self._paths(key):
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+
+    def get(self, session, url, params=None, ttl=0, **kwargs):
+        """
+        透過快取發出 GET 請求
+
+        Args:
+            session: requests.Session
+            ttl: 快取有效秒數,期間內不發請求
+            kwargs: 傳給 session.get 的其他參數
+        """
+        key = self._key(url, params)
+        meta, body = self._load(key)
+
+        if meta is not None and time.time() - meta['stored_at'] < ttl:
+            incr('http_cache', result='hit')
+            self._touch(key)
+            return self._response(url, meta, body)
+
+        headers = dict(kwargs.pop('headers', None) or {})
+        if meta is not None:
+            if meta.get('etag'):
+                headers['If-None-Match'] = meta['etag']
+            if meta.get('last_modified'):
+                headers['If-Modified-Since'] = meta['last_modified']
+
+        response = session.get(url, params=params, headers=headers, **kwargs)
+
+        if response.status_code == 304 and meta is not None:
+            incr('http_cache', result='revalidated')
+            meta['stored_at'] = time.time()
+            self._store(key, meta, body)
+            return self._response(url, meta, body)
+
+        incr('http_cache', result='miss')
+        if response.status_code == 200:
+            meta = {
+                'url': url,
+                'stored_at': time.time(),
+                'status_code': response.status_code,
+                'encoding': response.encoding,
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+            }
+            self._store(key, meta, response.content)
+        return response
+
+    def _response(self, url, meta, body):
+        return CachedResponse(url, meta['status_code'], body,
+                              encoding=meta.get('encoding'), from_cache=True)
+
+    def evict(self):
+        """超過容量上限時刪除最久未使用的項目"""
+        with self._lock:
+            entries = {}
+            total = 0
+            if not os.path.isdir(self.directory):
+                return
+            for name in os.listdir(self.directory):
+                if name.endswith('.tmp'):
+                    continue
+                path = os.path.join(self.directory, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                key = name.rsplit('.', 1)[0]
+                size, mtime = entries.get(key, (0, 0))
+                entries[key] = (size + stat.st_size, max(mtime, stat.st_mtime))
+                total += stat.st_size
+            if total <= self.max_bytes:
+                return
+            for key, (size, _) in sorted(entries.items(),
+                                         key=lambda kv: kv[1][1]):
+                for path in self._paths(key):
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+                total -= size
+                if total <= self.max_bytes:
+                    break
+
+    def clear(self):
+        """清除全部快取"""
+        with self._lock:
+            if not os.path.isdir(self.directory):
+                return
+            for name in os.listdir(self.directory):
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    pass
@@ -0,0 +1,249 @@
+"""
+美股與天氣摘要的 PNG 卡片
+
+給無法顯示 Flex Message 的通道 (Slack、email...) 使用,需要 Pillow
+(pip install pillow);只有實際繪製時才載入。
+
+- 檔名為 (卡片種類, 資料) 的雜湊值: 相同內容只繪製一次,
+  之後的請求 (例如多位收件者共用同一張卡片) 直接使用既有檔案
+- 同一批需要繪製的卡片較多時分給子程序並行繪製
+
+中文需要 CJK 字型,以 CARD_FONT 指定字型檔 (.ttf / .ttc),未指定時依序
+尋找常見的 Noto / 文泉驛 / 微軟正黑體路徑。
+
+本模組只負責寫檔: CARD_DIR 必須另外以 CARD_BASE_URL 對外提供 (例如同步到
+靜態網站或 bucket)。Slack 只要有一個 image_url 讀不到就會拒收整則訊息,
+所以 published_urls 會先確認網址可以讀取,讀不到的卡片不附上。
+"""
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+from flex_templates import rain_color
+from metrics import incr, span
+
+WIDTH = 720
+PADDING = 32
+HEADER_HEIGHT = 96
+STOCK_ROW_HEIGHT = 72
+WEATHER_ROW_HEIGHT = 112
+
+HEADER_COLOR = '#1E90FF'
+BACKGROUND = ('#F8F8F8', '#FFFFFF')
+TEXT_COLOR = '#333333'
+MUTED_COLOR = '#999999'
+UP_COLOR = '#00C851'
+DOWN_COLOR = '#FF4444'
+
+FONT_PATHS = [
+    '/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc',
+    '/usr/share/fonts/noto-cjk/NotoSansCJK-Regular.ttc',
+    '/usr/share/fonts/google-noto-cjk/NotoSansCJK-Regular.ttc',
+    '/usr/share/fonts/truetype/wqy/wqy-microhei.ttc',
+    '/System/Library/Fonts/PingFang.ttc',
+    'C:/Windows/Fonts/msjh.ttc',
+    # 沒有 CJK 字型時至少顯示 ▲▼ 與數字
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf',
+]
+
+# 同一批需要繪製的卡片少於此數時直接在本程序繪製 (子程序啟動成本較高)
+MIN_POOL_CARDS = 8
+
+
+@lru_cache(maxsize=None)
+def _font(size):
+    from PIL import ImageFont
+
+    for path in [os.getenv('CARD_FONT')] + FONT_PATHS:
+        if path and os.path.exists(path):
+            return ImageFont.truetype(path, size)
+    return ImageFont.load_default(size)
+
+
+def _canvas(height, title, subtitle):
+    from PIL import Image, ImageDraw
+
+    image = Image.new('RGB', (WIDTH, height), '#FFFFFF')
+    draw = ImageDraw.Draw(image)
+    draw.rectangle((0, 0, WIDTH, HEADER_HEIGHT), fill=HEADER_COLOR)
+    draw.text((PADDING, 18), title, font=_font(32), fill='#FFFFFF')
+    draw.text((PADDING, 62), subtitle, font=_font(16), fill='#FFFFFF')
+    return image, draw
+
+
+def _png(image):
+    buffer = io.BytesIO()
+    # optimize=True 檔案只小 2%,繪製時間卻多將近兩倍
+    image.save(buffer, 'PNG', compress_level=6)
+    return buffer.getvalue()
+
+
+def render_stock_card(stocks_data, title="美股日報"):
+    """stocks_data (與 create_stock_flex_message 相同) -> PNG bytes"""
+    date = stocks_data[0]['date'] if stocks_data else ''
+    height = HEADER_HEIGHT + STOCK_ROW_HEIGHT * len(stocks_data) + PADDING // 2
+    image, draw = _canvas(height, title, f"US Stock Market  {date}")
+    for i, stock in enumerate(stocks_data):
+        top = HEADER_HEIGHT + i * STOCK_ROW_HEIGHT
+        draw.rectangle((0, top, WIDTH, top + STOCK_ROW_HEIGHT),
+                       fill=BACKGROUND[i % 2])
+        down = stock['trend'] == 'down'
+        color = DOWN_COLOR if down else UP_COLOR
+        arrow = '▼' if down else '▲'
+        draw.text((PADDING, top + 12), stock['name'], font=_font(24),
+                  fill=TEXT_COLOR)
+        draw.text((PADDING, top + 44), stock['date'], font=_font(14),
+                  fill=MUTED_COLOR)
+        draw.text((WIDTH - PADDING, top + 12), stock['price'], font=_font(24),
+                  fill=TEXT_COLOR, anchor='ra')
+        draw.text((WIDTH - PADDING, top + 44),
+                  f"{arrow} {stock['change']}  {arrow} {stock['percent']}",
+                  font=_font(16), fill=color, anchor='ra')
+    return _png(image)
+
+
+def render_weather_card(location_name, weather_data):
+    """weather_data (與 create_weather_flex_message 相同) -> PNG bytes"""
+    height = (HEADER_HEIGHT + WEATHER_ROW_HEIGHT * len(weather_data)
+              + PADDING // 2)
+    image, draw = _canvas(height, f"{location_name}天氣", "36 小時天氣預報")
+    for i, weather in enumerate(weather_data):
+        top = HEADER_HEIGHT + i * WEATHER_ROW_HEIGHT
+        draw.rectangle((0, top, WIDTH, top + WEATHER_ROW_HEIGHT),
+                       fill=BACKGROUND[i % 2])
+        draw.text((PADDING, top + 14), weather['period'], font=_font(22),
+                  fill='#2C3E50')
+        draw.text((PADDING + 150, top + 20), weather['time'], font=_font(14),
+                  fill='#95A5A6')
+        draw.text((PADDING, top + 48),
+                  f"{weather['weather']},{weather['comfort']}",
+                  font=_font(18), fill='#34495E')
+        draw.text((PADDING, top + 78),
+                  f"{weather['minTemp']}° - {weather['maxTemp']}°",
+                  font=_font(18), fill='#FF6B35')
+        draw.text((WIDTH - PADDING, top + 78), f"降雨 {weather['rain']}%",
+                  font=_font(18), fill=rain_color(weather['rain']),
+                  anchor='ra')
+    return _png(image)
+
+
+CARD_RENDERERS = {
+    'stock': render_stock_card,
+    'weather': render_weather_card,
+}
+
+
+def render_card(kind, data):
+    """子程序的進入點: (種類, 參數 dict) -> PNG bytes"""
+    return CARD_RENDERERS[kind](**data)
+
+
+def card_key(kind, data):
+    """卡片內容的雜湊值 (檔名)"""
+    frozen = json.dumps([kind, data], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha1(frozen.encode('utf-8')).hexdigest()[:16]
+
+
+class CardStore:
+    """
+    Args:
+        directory: PNG 存放目錄 (第一次寫入時建立)
+        base_url: 目錄對外公開的網址,Slack image block 需要;None 時只能取得路徑
+        processes: 繪製用的子程序數上限,None 表示 CPU 數,1 表示不用子程序
+    """
+
+    def __init__(self, directory, base_url=None, processes=None):
+        self.directory = directory
+        self.base_url = base_url.rstrip('/') if base_url else None
+        self.processes = processes or os.cpu_count() or 1
+        self._pool = None
+        self._lock = threading.Lock()
+        self._published = set()
+
+    def path(self, key):
+        return os.path.join(self.directory, f'{key}.png')
+
+    def render(self, cards):
+        """
+        Args:
+            cards: [(種類, 參數 dict)],例如 ('weather', {'location_name': ...,
+                'weather_data': [...]})
+
+        Returns:
+            與 cards 同順序的檔案路徑;已存在的卡片不會重新繪製
+        """
+        keys = [card_key(kind, data) for kind, data in cards]
+        missing = {}
+        for key, card in zip(keys, cards):
+            if key not in missing and not os.path.exists(self.path(key)):
+                missing[key] = card
+        incr('card_cache', len(keys) - len(missing), result='hit')
+        if missing:
+            incr('card_cache', len(missing), result='miss')
+            with span('render', template='card'):
+                self._render_missing(missing)
+        return [self.path(key) for key in keys]
+
+    def urls(self, cards):
+        """與 render 相同,回傳公開網址"""
+        if not self.base_url:
+            raise ValueError("CardStore needs a base_url to build URLs")
+        return [f'{self.base_url}/{os.path.basename(path)}'
+                for path in self.render(cards)]
+
+    def published_urls(self, cards, session, timeout=5):
+        """
+        與 urls 相同,但以 HEAD 確認網址可讀取 (回應為圖片);
+        讀不到的卡片為 None。檔名即內容雜湊,確認過的網址不再重新檢查。
+        """
+        urls = self.urls(cards)
+        for url in dict.fromkeys(urls):
+            if url in self._published:
+                continue
+            try:
+                response = session.head(url, timeout=timeout,
+                                        allow_redirects=True)
+                ok = (response.status_code == 200 and response.headers.get(
+                    'Content-Type', '').startswith('image/'))
+            except Exception:
+                ok = False
+            if ok:
+                self._published.add(url)
+            else:
+                incr('card_unpublished')
+        return [url if url in self._published else None for url in urls]
+
+    def _executor(self):
+        with self._lock:
+            if self._pool is None:
+                # spawn: 主程序已有背景 thread,不適合 fork
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.processes,
+                    mp_context=multiprocessing.get_context('spawn'))
+            return self._pool
+
+    def _render_missing(self, missing):
+        kinds = [kind for kind, _ in missing.values()]
+        datas = [data for _, data in missing.values()]
+        if self.processes <= 1 or len(missing) < MIN_POOL_CARDS:
+            pngs = map(render_card, kinds, datas)
+        else:
+            pngs = self._executor().map(render_card, kinds, datas)
+        os.makedirs(self.directory, exist_ok=True)
+        for key, png in zip(missing, pngs):
+            fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(png)
+            os.replace(tmp, self.path(key))
+
+    def close(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
@@ -0,0 +1,154 @@
+"""
+輕量計時與計數
+
+    with span('fetch', source='cwa'):
+        ...
+    incr('bytes', len(body), source='cwa')
+
+設定 METRICS_JSON 或 METRICS_PROM (檔案路徑) 才會啟用;
+未啟用時 span() 回傳共用的空 context manager,incr() 直接返回。
+"""
+import json
+import os
+import threading
+import time
+
+PREFIX = 'daily_notify'
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    def __init__(self, registry, name, labels):
+        self.registry = registry
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self.start
+        self.registry.observe(self.name, elapsed, **self.labels)
+        if exc_type is not None:
+            self.registry.incr('failures', span=self.name, **self.labels)
+        return False
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+class Metrics:
+    def __init__(self, enabled=False, json_path=None, prom_path=None):
+        self.enabled = enabled
+        self.json_path = json_path
+        self.prom_path = prom_path
+        self.started_at = time.time()
+        self.spans = {}  # (name, labels) -> [count, sum, max]
+        self.counters = {}  # (name, labels) -> value
+        self._lock = threading.Lock()
+
+    def span(self, name, **labels):
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name, labels)
+
+    def observe(self, name, seconds, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            stat = self.spans.setdefault(key, [0, 0.0, 0.0])
+            stat[0] += 1
+            stat[1] += seconds
+            stat[2] = max(stat[2], seconds)
+
+    def incr(self, name, value=1, **labels):
+        if not self.enabled:
+            return
+        key = _key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def report(self):
+        """JSON 格式的執行報告"""
+        with self._lock:
+            return {
+                'started_at': self.started_at,
+                'duration': time.time() - self.started_at,
+                'spans': [
+                    {'name': name, 'labels': dict(labels), 'count': count,
+                     'seconds': total, 'max_seconds': peak}
+                    for (name, labels), (count, total, peak)
+                    in sorted(self.spans.items())
+                ],
+                'counters': [
+                    {'name': name, 'labels': dict(labels), 'value': value}
+                    for (name, labels), value in sorted(self.counters.items())
+                ],
+            }
+
+    def prometheus(self):
+        """Prometheus textfile collector 格式"""
+        def fmt(labels):
+            if not labels:
+                return ''
+            pairs = ','.join(
+                '{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"'))
+                for k, v in labels)
+            return '{' + pairs + '}'
+
+        lines = []
+        with self._lock:
+            span_name = f'{PREFIX}_span_seconds'
+            if self.spans:
+                lines.append(f'# TYPE {span_name} summary')
+            for (name, labels), (count, total, _) in sorted(self.spans.items()):
+                label_text = fmt((('span', name),) + labels)
+                lines.append(f'{span_name}_sum{label_text} {total:.6f}')
+                lines.append(f'{span_name}_count{label_text} {count}')
+            declared = set()
+            for (name, labels), value in sorted(self.counters.items()):
+                metric = f'{PREFIX}_{name}_total'
+                if metric not in declared:
+                    lines.append(f'# TYPE {metric} counter')
+                    declared.add(metric)
+                lines.append(f'{metric}{fmt(labels)} {value}')
+        lines.append(f'# TYPE {PREFIX}_last_run_timestamp_seconds gauge')
+        lines.append(f'{PREFIX}_last_run_timestamp_seconds {self.started_at:.0f}')
+        return '\n'.join(lines) + '\n'
+
+    def export(self):
+        """寫出 JSON 報告與 Prometheus textfile (暫存檔再改名,避免讀到一半)"""
+        if not self.enabled:
+            return
+        if self.json_path:
+            _atomic_write(self.json_path,
+                          json.dumps(self.report(), ensure_ascii=False, indent=2))
+        if self.prom_path:
+            _atomic_write(self.prom_path, self.prometheus())
+
+
+def _atomic_write(path, text):
+    tmp = f'{path}.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+_json_path = os.getenv('METRICS_JSON')
+_prom_path = os.getenv('METRICS_PROM')
+metrics = Metrics(enabled=bool(_json_path or _prom_path),
+                  json_path=_json_path, prom_path=_prom_path)
+
+span = metrics.span
+incr = metrics.incr
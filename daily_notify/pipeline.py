@@ -0,0 +1,102 @@
+"""
+工作排程器: 以相依關係圖並行執行互不相干的工作
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from metrics import span
+
+
+class Pipeline:
+    """
+    簡單的 DAG 執行器
+
+    每個工作在其相依工作全部成功後才會開始,互不相依的工作同時執行;
+    相依工作失敗時,後續工作標記為略過。
+
+    after 中的工作只需結束 (成功或失敗) 即可開始,適合合併多個來源、
+    有部分內容就能執行的工作;after 的工作全部失敗時才略過。
+    """
+
+    def __init__(self, max_workers=4):
+        self.max_workers = max_workers
+        self.jobs = {}  # name -> (func, deps, after),保留加入順序
+        self.results = {}
+
+    def add(self, name, func, deps=(), after=()):
+        """加入工作,相依的工作必須先加入 (因此不會產生循環)"""
+        if name in self.jobs:
+            raise ValueError(f"Duplicate job: {name}")
+        for dep in (*deps, *after):
+            if dep not in self.jobs:
+                raise ValueError(f"Unknown dependency '{dep}' for job '{name}'")
+        self.jobs[name] = (func, tuple(deps), tuple(after))
+        return self
+
+    def _run_job(self, name):
+        func = self.jobs[name][0]
+        start = time.perf_counter()
+        try:
+            with span('job', job=name):
+                func()
+            return {"status": "ok", "elapsed": time.perf_counter() - start,
+                    "error": None}
+        except Exception as e:
+            return {"status": "failed", "elapsed": time.perf_counter() - start,
+                    "error": str(e)}
+
+    def run(self):
+        """執行所有工作,回傳 {name: {status, elapsed, error}}"""
+        self.results = {}
+        pending = dict(self.jobs)
+        running = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while pending or running:
+                for name in list(pending):
+                    _, deps, after = pending[name]
+                    states = [self.results.get(d, {}).get("status")
+                              for d in deps]
+                    inputs = [self.results.get(d, {}).get("status")
+                              for d in after]
+                    if any(s in ("failed", "skipped") for s in states):
+                        failed = [d for d, s in zip(deps, states)
+                                  if s in ("failed", "skipped")]
+                        self.results[name] = {
+                            "status": "skipped", "elapsed": 0.0,
+                            "error": f"dependency failed: {', '.join(failed)}"}
+                        del pending[name]
+                    elif (all(s == "ok" for s in states)
+                          and all(s is not None for s in inputs)):
+                        if inputs and "ok" not in inputs:
+                            self.results[name] = {
+                                "status": "skipped", "elapsed": 0.0,
+                                "error": f"all inputs failed: {', '.join(after)}"}
+                        else:
+                            running[executor.submit(self._run_job, name)] = name
+                        del pending[name]
+                if not running:
+                    continue
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    self.results[running.pop(future)] = future.result()
+        return self.results
+
+    def report(self):
+        """輸出每個工作的耗時與成敗"""
+        labels = {"ok": "成功", "failed": "失敗", "skipped": "略過"}
+        lines = ["=" * 50, "執行結果", "=" * 50]
+        for name in self.jobs:
+            r = self.results.get(name)
+            if r is None:
+                continue
+            line = f"{labels[r['status']]}  {name:<20} {r['elapsed']:.2f}s"
+            if r["error"]:
+                line += f"  ({r['error']})"
+            lines.append(line)
+        report = "\n".join(lines)
+        print(report)
+        return report
+
+    @property
+    def ok(self):
+        return all(r["status"] == "ok" for r in self.results.values())
@@ -0,0 +1,403 @@
+"""
+查詢機器人 (LINE webhook)
+
+使用者傳送文字即回覆對應的 bubble:
+
+    天氣 / 天氣 台北 / 臺中天氣      36 小時天氣預報 (未指定時為 QUERYBOT_LOCATION)
+    美股 / 指數                      預設美股指數
+    SOX / 費城半導體 / twstock/TWS/2330   單一代號 (名稱見 WATCHLIST_PATH)
+
+回覆內容取自記憶體快取 (HotCache):
+- 同一個 key 同時只有一個上游請求,同時到達的查詢等待同一個結果
+- 最近被查詢的 key 在過期前由背景工作更新,查詢不必等待上游
+- 過期但仍在 max_stale 內的資料先回覆,同時背景更新
+- 超過 idle 秒未被查詢的 key 移出快取,不再更新
+
+    python querybot.py [--stub] [--host HOST] [--port PORT]
+
+LINE 後台的 webhook URL 設為 http(s)://<host>/webhook,並以 LINE_CHANNEL_SECRET
+驗證 X-Line-Signature;未設定時拒絕啟動。--stub 不呼叫 LINE API,只印出回覆
+內容 (本機測試用),此時可不設定 LINE_CHANNEL_SECRET (不驗證簽章)。
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import os
+import signal
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from delivery import DeliveryQueue, LineSender, line_payload
+from flex_templates import bubble_message, render_stock_json, render_weather_json
+from metrics import incr
+from run import (WeatherForecast, WebCrawlerUSA, line_api_endpoint,
+                 line_bot_token, watchlist_path)
+from transport import get_session
+from watchlist import DEFAULT_SYMBOLS, Watchlists, cnyes_symbol_url
+
+querybot_host = os.getenv('QUERYBOT_HOST', '127.0.0.1')
+querybot_port = int(os.getenv('QUERYBOT_PORT', '8788'))
+querybot_location = os.getenv('QUERYBOT_LOCATION', '高雄市')
+line_channel_secret = os.getenv('LINE_CHANNEL_SECRET')
+
+# 快取有效秒數: 報價盤中會變動,預報一天只更新數次
+QUOTE_TTL = 60
+WEATHER_TTL = 30 * 60
+# 經過 TTL 的這個比例後由背景更新,熱門 key 不會過期
+REFRESH_AHEAD = 0.8
+MAX_BODY = 1 << 20
+
+# 氣象署 F-C0032-001 的 22 縣市
+COUNTIES = [
+    '臺北市', '新北市', '桃園市', '臺中市', '臺南市', '高雄市', '基隆市',
+    '新竹縣', '新竹市', '苗栗縣', '彰化縣', '南投縣', '雲林縣', '嘉義縣',
+    '嘉義市', '屏東縣', '宜蘭縣', '花蓮縣', '臺東縣', '澎湖縣', '金門縣',
+    '連江縣',
+]
+INDEX_QUERIES = ('美股', '指數', '美股指數')
+
+HELP_TEXT = ("可查詢:\n"
+             "・天氣 / 天氣 台北\n"
+             "・美股\n"
+             "・代號或名稱 (例如 SOX、道瓊指數)")
+
+
+def normalize_location(text):
+    """'台北' / '臺北市' -> '臺北市',無法對應時回傳 None"""
+    place = text.strip().replace('台', '臺')
+    for candidate in (place, place + '市', place + '縣'):
+        if candidate in COUNTIES:
+            return candidate
+    return None
+
+
+def signature(secret, body):
+    """X-Line-Signature: base64(HMAC-SHA256(channel secret, body))"""
+    digest = hmac.new(secret.encode('utf-8'), body, hashlib.sha256).digest()
+    return base64.b64encode(digest).decode('ascii')
+
+
+class HotCache:
+    """
+    Args:
+        executor: 執行 loader (阻塞的 HTTP 請求) 的 thread pool
+        idle: 超過此秒數未被查詢的 key 移出快取
+        max_stale: 過期超過此秒數的資料不再直接回覆,None 表示不限
+    """
+
+    def __init__(self, executor=None, idle=60 * 60, max_stale=None):
+        self.executor = executor
+        self.idle = idle
+        self.max_stale = max_stale
+        self._entries = {}  # key -> {'value', 'fetched', 'accessed', 'ttl', 'loader'}
+        self._inflight = {}  # key -> asyncio.Task
+
+    def __len__(self):
+        return len(self._entries)
+
+    async def get(self, key, loader, ttl):
+        """
+        取得 key 的資料,沒有快取時呼叫 loader()
+
+        Args:
+            loader: 阻塞的 callable,在 executor 中執行
+            ttl: 資料有效秒數
+        """
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        if entry is not None:
+            entry['accessed'] = now
+            age = now - entry['fetched']
+            if age < entry['ttl']:
+                incr('querybot_cache', result='hit')
+                return entry['value']
+            if self.max_stale is None or age < entry['ttl'] + self.max_stale:
+                incr('querybot_cache', result='stale')
+                self.refresh(key, loader, ttl)
+                return entry['value']
+        incr('querybot_cache', result='miss')
+        # shield: 查詢被取消時不取消其他查詢共用的上游請求
+        return await asyncio.shield(self.refresh(key, loader, ttl))
+
+    def refresh(self, key, loader, ttl):
+        """開始更新 key,已有進行中的更新時回傳同一個 Task"""
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._load(key, loader, ttl))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._done(key, t))
+        else:
+            incr('querybot_cache', result='coalesced')
+        return task
+
+    async def _load(self, key, loader, ttl):
+        loop = asyncio.get_running_loop()
+        value = await loop.run_in_executor(self.executor, loader)
+        now = time.monotonic()
+        previous = self._entries.get(key)
+        self._entries[key] = {
+            'value': value,
+            'fetched': now,
+            'accessed': previous['accessed'] if previous else now,
+            'ttl': ttl,
+            'loader': loader,
+        }
+        return value
+
+    def _done(self, key, task):
+        self._inflight.pop(key, None)
+        # 背景更新沒有人等待結果,在這裡取出例外並記錄
+        if not task.cancelled() and task.exception() is not None:
+            incr('querybot_refresh_failures')
+            print(f"Failed to refresh {key}: {task.exception()}")
+
+    def refresh_due(self):
+        """更新即將過期的熱門 key,移除閒置的 key"""
+        now = time.monotonic()
+        for key, entry in list(self._entries.items()):
+            if now - entry['accessed'] > self.idle:
+                del self._entries[key]
+            elif now - entry['fetched'] >= entry['ttl'] * REFRESH_AHEAD:
+                self.refresh(key, entry['loader'], entry['ttl'])
+
+    async def refresh_forever(self, interval=5):
+        while True:
+            await asyncio.sleep(interval)
+            self.refresh_due()
+
+
+class StubLineClient:
+    """不呼叫 LINE API,記錄並印出回覆 (本機測試用)"""
+
+    def __init__(self, verbose=True):
+        self.verbose = verbose
+        self.replies = []
+
+    def __call__(self, payload):
+        self.replies.append(payload)
+        if self.verbose:
+            for message in payload['body']['messages']:
+                text = message.get('text') or message.get('altText')
+                print(f"[reply {payload['body'].get('replyToken')}] {text}")
+        return payload
+
+
+class QueryBot:
+    """
+    Args:
+        client: 送出 LINE 請求的 callable(payload),預設為 LineSender
+        cache: HotCache,預設使用 8 個 thread 抓取上游
+    """
+
+    def __init__(self, client=None, cache=None, location=None):
+        if client is None:
+            if not line_bot_token:
+                raise Exception("LINE Bot token is missing.")
+            # 不驗證簽章時任何人都能以 bot 身分觸發上游查詢與回覆
+            if not line_channel_secret:
+                raise Exception("LINE channel secret is missing "
+                                "(set LINE_CHANNEL_SECRET or use --stub).")
+            client = LineSender(line_bot_token, get_session(),
+                                endpoint=line_api_endpoint)
+        # reply token 一分鐘內有效且只能使用一次: 少量重試,不寫 dead-letter
+        self.queue = DeliveryQueue({'line': client}, max_attempts=2,
+                                   base_delay=0.2)
+        self.cache = cache or HotCache(ThreadPoolExecutor(max_workers=8))
+        self.location = location or querybot_location
+        self.source = WebCrawlerUSA(ttl=QUOTE_TTL).source
+        watchlists = (Watchlists.load(watchlist_path) if watchlist_path
+                      else Watchlists())
+        self.watchlists = watchlists
+        # 名稱或代號 (路徑最後一段) -> 網址,不分大小寫
+        self.aliases = {}
+        for name, url in watchlists.catalog.items():
+            self.aliases.setdefault(name.upper(), url)
+            self.aliases.setdefault(url.rstrip('/').rsplit('/', 1)[-1].upper(),
+                                    url)
+        self._tasks = set()
+
+    def lookup(self, text):
+        """
+        代號、名稱或 cnyes 路徑 -> 網址,無法對應時回傳 None
+
+        路徑只接受 invest.cnyes.com 的頁面,且不加入共用的 watchlists
+        """
+        url = self.aliases.get(text.strip().upper())
+        if url is None and '/' in text:
+            url = cnyes_symbol_url(text)
+        return url
+
+    def _load_quote(self, url):
+        quotes = self.source.fetch([url])
+        if url not in quotes:
+            raise LookupError(f"No quote for {url}")
+        name = self.watchlists.names.get(url) or url.rsplit('/', 1)[-1]
+        return WebCrawlerUSA.quote_entry(name, quotes[url])[1]
+
+    def _load_weather(self, location):
+        forecast = WeatherForecast(location)
+        forecast.fetch()
+        if not forecast.ready:
+            raise LookupError(forecast.result)
+        return forecast.weather_data
+
+    async def quote(self, url):
+        return await self.cache.get(('quote', url),
+                                    lambda: self._load_quote(url), QUOTE_TTL)
+
+    async def weather(self, location):
+        return await self.cache.get(('weather', location),
+                                    lambda: self._load_weather(location),
+                                    WEATHER_TTL)
+
+    async def answer(self, text):
+        """查詢文字 -> 回覆訊息 list (dict)"""
+        text = text.strip()
+        try:
+            if '天氣' in text:
+                place = text.replace('天氣', '').strip()
+                location = normalize_location(place) if place else self.location
+                if location is None:
+                    return [{'type': 'text', 'text': f"找不到縣市: {place}"}]
+                weather_data = await self.weather(location)
+                return [bubble_message(
+                    render_weather_json(location, weather_data),
+                    f"🌤️ {location} 36 小時天氣預報")]
+            if text in INDEX_QUERIES:
+                stocks = await asyncio.gather(
+                    *(self.quote(url) for _, url in DEFAULT_SYMBOLS))
+                return [bubble_message(render_stock_json(stocks),
+                                       "📊 美股日報")]
+            url = self.lookup(text)
+            if url is None:
+                return [{'type': 'text', 'text': HELP_TEXT}]
+            stock = await self.quote(url)
+            return [bubble_message(
+                render_stock_json([stock], title=f"📊 {stock['name']}",
+                                  subtitle="Quote"),
+                f"📊 {stock['name']} {stock['price']}")]
+        except Exception as e:
+            print(f"Failed to answer {text!r}: {e}")
+            return [{'type': 'text', 'text': "暫時無法取得資料,請稍後再試"}]
+
+    async def handle_event(self, event):
+        message = event.get('message') or {}
+        if (event.get('type') != 'message' or message.get('type') != 'text'
+                or not event.get('replyToken')):
+            return
+        incr('querybot_queries')
+        messages = await self.answer(message['text'])
+        payload = line_payload('reply', messages,
+                               reply_token=event['replyToken'])
+        try:
+            await asyncio.wrap_future(self.queue.submit('line', payload))
+        except Exception as e:
+            print(f"Failed to reply: {e}")
+
+    def handle_webhook(self, headers, body):
+        """驗證並解析 webhook,事件在背景處理,回傳 HTTP 狀態碼"""
+        if line_channel_secret and not hmac.compare_digest(
+                headers.get('x-line-signature', ''),
+                signature(line_channel_secret, body)):
+            return 403
+        try:
+            events = json.loads(body)['events']
+        except (ValueError, KeyError, TypeError):
+            return 400
+        # LINE 要求 webhook 儘快回應,回覆改以 reply API 送出
+        for event in events:
+            task = asyncio.ensure_future(self.handle_event(event))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        return 200
+
+    async def handle_connection(self, reader, writer):
+        """HTTP/1.1 (keep-alive): POST /webhook、GET /health"""
+        try:
+            while True:
+                request = await read_request(reader)
+                if request is None:
+                    break
+                method, path, headers, body = request
+                if method == 'POST' and path == '/webhook':
+                    status, reply = self.handle_webhook(headers, body), {}
+                elif method == 'GET' and path == '/health':
+                    status, reply = 200, {'status': 'ok',
+                                          'cached': len(self.cache)}
+                else:
+                    status, reply = 404, {'error': 'not found'}
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                write_response(writer, status, reply, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+
+async def read_request(reader):
+    """讀取一個 HTTP 請求,連線關閉時回傳 None"""
+    line = await reader.readline()
+    if not line.strip():
+        return None
+    method, target, _ = line.decode('latin-1').split(' ', 2)
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    length = int(headers.get('content-length') or 0)
+    if length > MAX_BODY:
+        raise ValueError('request body too large')
+    body = await reader.readexactly(length) if length else b''
+    return method, target.split('?', 1)[0], headers, body
+
+
+def write_response(writer, status, body, keep_alive=True):
+    data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+    reason = {200: 'OK', 400: 'Bad Request', 403: 'Forbidden',
+              404: 'Not Found'}.get(status, '')
+    writer.write(
+        f"HTTP/1.1 {status} {reason}\r\n"
+        f"Content-Type: application/json; charset=utf-8\r\n"
+        f"Content-Length: {len(data)}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+        f"\r\n".encode('latin-1') + data)
+
+
+async def serve(bot, host, port):
+    server = await asyncio.start_server(bot.handle_connection, host, port)
+    refresher = asyncio.ensure_future(bot.cache.refresh_forever())
+    stop = asyncio.Event()
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stop.set)
+    print(f"daily_notify query bot listening on {host}:{port}")
+    try:
+        async with server:
+            await stop.wait()
+    finally:
+        refresher.cancel()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='LINE 查詢機器人')
+    parser.add_argument('--host', default=querybot_host)
+    parser.add_argument('--port', type=int, default=querybot_port)
+    parser.add_argument('--stub', action='store_true',
+                        help='不呼叫 LINE API,只印出回覆內容')
+    args = parser.parse_args(argv)
+    bot = QueryBot(client=StubLineClient() if args.stub else None)
+    try:
+        asyncio.run(serve(bot, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
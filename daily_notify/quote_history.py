@@ -0,0 +1,234 @@
+"""
+指數歷史報價
+
+每個指數一個目錄,每個欄位一個二進位檔 (array 原生位元組序,固定寬度):
+
+    history/0001/time.q       報價時間 (epoch 秒)
+    history/0001/price.d      收盤價
+    history/0001/change.d     漲跌
+    history/0001/percent.d    漲跌幅 (%)
+    history/symbols.json      指數名稱 -> 目錄
+
+每次執行只在檔尾附加;查詢時以 mmap 讀取時間欄位二分搜尋,
+只複製範圍內的資料,不需要把整個歷史載入成 dict。
+"""
+import bisect
+import json
+import mmap
+import os
+import threading
+from array import array
+from datetime import datetime
+
+from quote_sources import TAIPEI
+
+# 欄位名稱 -> array typecode
+COLUMNS = {
+    'time': 'q',
+    'price': 'd',
+    'change': 'd',
+    'percent': 'd',
+}
+
+
+def parse_number(text):
+    """'46,190.61'、'+123.45'、'-0.27%' -> float"""
+    return float(text.replace(',', '').replace('%', '').replace('+', ''))
+
+
+def parse_time(text):
+    """
+    cnyes 的 '2026/10/16 16:00' (台北時間) -> epoch 秒
+
+    HTML 頁面的日期後面還有說明文字 ('2026/10/16 16:00 收盤價'),
+    只解析開頭的日期與時間
+    """
+    tokens = text.split()
+    for candidate, fmt in ((' '.join(tokens[:2]), '%Y/%m/%d %H:%M'),
+                           (' '.join(tokens[:1]), '%Y/%m/%d')):
+        try:
+            return int(datetime.strptime(candidate, fmt).replace(
+                tzinfo=TAIPEI).timestamp())
+        except ValueError:
+            continue
+    raise ValueError(f"Unknown quote time format: {text}")
+
+
+def quote_record(name, fields):
+    """報價欄位 (date / price / net / percent) -> 數值紀錄"""
+    return {
+        'name': name,
+        'time': parse_time(fields['date']),
+        'price': parse_number(fields['price']),
+        'change': parse_number(fields['net']),
+        'percent': parse_number(fields['percent']),
+    }
+
+
+class _Column:
+    """以 mmap 唯讀開啟的單一欄位,rows 之後的資料 (寫到一半) 忽略"""
+
+    def __init__(self, path, typecode, rows):
+        self.typecode = typecode
+        self._file = open(path, 'rb')
+        self._map = None
+        self._raw = memoryview(b'')
+        if rows:
+            self._map = mmap.mmap(self._file.fileno(), 0,
+                                  access=mmap.ACCESS_READ)
+            self._raw = memoryview(self._map)[:rows * array(typecode).itemsize]
+        self.view = self._raw.cast(typecode)
+
+    def copy(self, start, stop):
+        values = array(self.typecode)
+        values.frombytes(self.view[start:stop].tobytes())
+        return values
+
+    def close(self):
+        # mmap 必須在所有 memoryview 釋放後才能關閉
+        self.view.release()
+        self._raw.release()
+        if self._map is not None:
+            self._map.close()
+        self._file.close()
+
+
+class QuoteHistory:
+    """
+    Args:
+        directory: 歷史資料目錄 (第一次寫入時建立)
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._symbols = None
+
+    def _index_path(self):
+        return os.path.join(self.directory, 'symbols.json')
+
+    def _load_symbols(self):
+        if self._symbols is None:
+            try:
+                with open(self._index_path(), encoding='utf-8') as f:
+                    self._symbols = json.load(f)
+            except (OSError, ValueError):
+                self._symbols = {}
+        return self._symbols
+
+    def symbols(self):
+        with self._lock:
+            return list(self._load_symbols())
+
+    def _symbol_dir(self, name, create=False):
+        symbols = self._load_symbols()
+        if name not in symbols:
+            if not create:
+                return None
+            symbols[name] = f'{len(symbols) + 1:04d}'
+            os.makedirs(os.path.join(self.directory, symbols[name]),
+                        exist_ok=True)
+            tmp = self._index_path() + '.tmp'
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(symbols, f, ensure_ascii=False, indent=1)
+            os.replace(tmp, self._index_path())
+        return os.path.join(self.directory, symbols[name])
+
+    @staticmethod
+    def _rows(directory):
+        """各欄位完整的列數 (中斷寫入時以最短的欄位為準)"""
+        sizes = []
+        for column, typecode in COLUMNS.items():
+            path = os.path.join(directory, f'{column}.{typecode}')
+            size = os.path.getsize(path) if os.path.exists(path) else 0
+            sizes.append(size // array(typecode).itemsize)
+        return min(sizes)
+
+    def _open(self, directory, rows):
+        return {column: _Column(os.path.join(directory, f'{column}.{typecode}'),
+                                typecode, rows)
+                for column, typecode in COLUMNS.items()}
+
+    def append(self, records):
+        """
+        附加報價紀錄 (quote_record 的輸出),回傳實際寫入筆數
+
+        時間不晚於該指數最後一筆的紀錄 (例如同一天重複執行) 會略過
+        """
+        by_name = {}
+        for record in records:
+            by_name.setdefault(record['name'], []).append(record)
+        written = 0
+        with self._lock:
+            for name, rows in by_name.items():
+                directory = self._symbol_dir(name, create=True)
+                count = self._rows(directory)
+                last = self._last_time(directory, count)
+                new = []
+                for record in sorted(rows, key=lambda r: r['time']):
+                    if last is None or record['time'] > last:
+                        new.append(record)
+                        last = record['time']
+                if not new:
+                    continue
+                for column, typecode in COLUMNS.items():
+                    path = os.path.join(directory, f'{column}.{typecode}')
+                    with open(path, 'ab') as f:
+                        # 丟棄上次中斷時多寫的部分,各欄位維持相同列數
+                        f.truncate(count * array(typecode).itemsize)
+                        f.write(array(typecode, [r[column] for r in new])
+                                .tobytes())
+                written += len(new)
+        return written
+
+    def _last_time(self, directory, rows):
+        if not rows:
+            return None
+        typecode = COLUMNS['time']
+        with open(os.path.join(directory, f'time.{typecode}'), 'rb') as f:
+            size = array(typecode).itemsize
+            f.seek((rows - 1) * size)
+            return array(typecode, f.read(size))[0]
+
+    def range(self, name, start=None, end=None):
+        """
+        查詢 start <= time < end 的資料 (epoch 秒或 datetime,None 表示不限)
+
+        Returns:
+            {欄位: array},指數不存在時每個欄位為空 array
+        """
+        if isinstance(start, datetime):
+            start = int(start.timestamp())
+        if isinstance(end, datetime):
+            end = int(end.timestamp())
+        with self._lock:
+            directory = self._symbol_dir(name)
+            rows = self._rows(directory) if directory else 0
+        if not rows:
+            return {column: array(typecode)
+                    for column, typecode in COLUMNS.items()}
+        columns = self._open(directory, rows)
+        try:
+            times = columns['time'].view
+            lo = 0 if start is None else bisect.bisect_left(times, start)
+            hi = rows if end is None else bisect.bisect_left(times, end)
+            return {column: col.copy(lo, max(lo, hi))
+                    for column, col in columns.items()}
+        finally:
+            for col in columns.values():
+                col.close()
+
+    def latest(self, name, count=1):
+        """最近 count 筆資料"""
+        with self._lock:
+            directory = self._symbol_dir(name)
+            rows = self._rows(directory) if directory else 0
+        if not rows:
+            return self.range(name)
+        columns = self._open(directory, rows)
+        try:
+            return {column: col.copy(max(0, rows - count), rows)
+                    for column, col in columns.items()}
+        finally:
+            for col in columns.values():
+                col.close()
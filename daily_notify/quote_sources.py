@@ -0,0 +1,169 @@
+"""
+報價來源
+
+每個來源的 fetch(urls) 回傳 {指數頁網址: 欄位},欄位格式與頁面擷取相同:
+    {'date': '2026/10/16 16:00', 'price': '46,190.61',
+     'net': '+238.37', 'percent': '+0.52%'}
+取不到的網址不會出現在結果中,由 FallbackQuoteSource 交給下一個來源。
+"""
+import math
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from urllib.parse import urlsplit
+
+from metrics import span
+
+TAIPEI = timezone(timedelta(hours=8))
+
+# cnyes 報價 API,可一次查詢多個代號 (以逗號分隔)
+CNYES_QUOTE_API = 'https://ws.api.cnyes.com/ws/api/v1/quote/quotes/{symbols}'
+
+# API 回應欄位代號
+FIELD_SYMBOL = '0'
+FIELD_PRICE = '6'
+FIELD_CHANGE = '11'
+FIELD_PERCENT = '56'
+FIELD_TIME = '200007'
+# 漲跌幅與 漲跌 / 前一日收盤 的容許差距 (百分點);欄位代號對應錯誤時
+# 通常遠超過此值,該代號即交給下一個來源
+PERCENT_TOLERANCE = 0.05
+
+
+def api_symbol(url):
+    """
+    cnyes 頁面網址 -> API 代號
+
+        /index/GI/DJI          -> GI:DJI:INDEX
+        /twstock/TWS/2330      -> TWS:2330:STOCK
+        /usstock/detail/AAPL   -> USS:AAPL:STOCK
+    """
+    parts = urlsplit(url).path.strip('/').split('/')
+    if len(parts) >= 3:
+        if parts[0] == 'index':
+            return f"{parts[1]}:{parts[2]}:INDEX"
+        if parts[0] == 'twstock':
+            return f"{parts[1]}:{parts[2]}:STOCK"
+        if parts[0] == 'usstock':
+            return f"USS:{parts[2]}:STOCK"
+    raise ValueError(f"Unsupported quote url: {url}")
+
+
+class HtmlQuoteSource:
+    """逐頁下載指數頁面並擷取欄位 (原本的作法)"""
+    name = 'html'
+
+    def __init__(self, fetcher, extractor):
+        self.fetcher = fetcher
+        self.extractor = extractor
+
+    def fetch(self, urls):
+        responses = self.fetcher.fetch_all(urls, verify=False)
+        quotes = {}
+        for url, res in zip(urls, responses):
+            with span('parse', source='cnyes'):
+                quotes[url] = self.extractor.extract(res.text)
+        return quotes
+
+
+class CnyesApiQuoteSource:
+    """cnyes JSON 報價 API,每個請求取得 batch_size 個代號,各批次並行"""
+    name = 'api'
+
+    def __init__(self, session, cache=None, ttl=0, timeout=10, batch_size=50,
+                 api_url=CNYES_QUOTE_API, max_workers=4):
+        self.session = session
+        self.api_url = api_url
+        self.cache = cache
+        self.ttl = ttl
+        self.timeout = timeout
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+
+    def _get(self, url):
+        if self.cache is not None:
+            return self.cache.get(self.session, url, ttl=self.ttl,
+                                  timeout=self.timeout, verify=False)
+        return self.session.get(url, timeout=self.timeout, verify=False)
+
+    @staticmethod
+    def validate(price, change, percent):
+        """檢查數值合理且彼此一致,不符時拋出 ValueError"""
+        if not all(math.isfinite(v) for v in (price, change, percent)):
+            raise ValueError("Non-finite quote value")
+        if price <= 0 or price - change <= 0:
+            raise ValueError(f"Invalid price {price} (change {change})")
+        expected = change / (price - change) * 100
+        if abs(expected - percent) > PERCENT_TOLERANCE:
+            raise ValueError(f"Percent {percent} does not match change "
+                             f"{change} / price {price} ({expected:.2f})")
+
+    @classmethod
+    def to_fields(cls, item):
+        """API 數值轉成與頁面相同的顯示字串,數值不合理時拋出 ValueError"""
+        price = float(item[FIELD_PRICE])
+        change = float(item[FIELD_CHANGE])
+        percent = float(item[FIELD_PERCENT])
+        cls.validate(price, change, percent)
+        when = datetime.fromtimestamp(int(item[FIELD_TIME]), TAIPEI)
+        return {
+            'date': when.strftime('%Y/%m/%d %H:%M'),
+            'price': f'{price:,.2f}',
+            'net': f'{change:+,.2f}',
+            'percent': f'{percent:+.2f}%',
+        }
+
+    def _fetch_batch(self, batch):
+        response = self._get(self.api_url.format(symbols=','.join(batch)))
+        response.raise_for_status()
+        return response.json().get('data') or []
+
+    def fetch(self, urls):
+        symbols = {}
+        for url in urls:
+            try:
+                symbols[api_symbol(url)] = url
+            except ValueError:
+                # 不支援的網址留給下一個來源
+                continue
+        names = list(symbols)
+        batches = [names[i:i + self.batch_size]
+                   for i in range(0, len(names), self.batch_size)]
+        quotes = {}
+        if not batches:
+            return quotes
+        with ThreadPoolExecutor(
+                max_workers=min(self.max_workers, len(batches))) as executor:
+            for items in executor.map(self._fetch_batch, batches):
+                for item in items:
+                    url = symbols.get(item.get(FIELD_SYMBOL))
+                    if url is None:
+                        continue
+                    try:
+                        quotes[url] = self.to_fields(item)
+                    except (KeyError, TypeError, ValueError) as e:
+                        # 交給下一個來源 (FallbackQuoteSource)
+                        print(f"Rejected API quote {item.get(FIELD_SYMBOL)}: {e}")
+                        continue
+        return quotes
+
+
+class FallbackQuoteSource:
+    """依序嘗試各來源,前一個來源缺少或失敗的網址交給下一個"""
+    name = 'fallback'
+
+    def __init__(self, sources):
+        self.sources = sources
+
+    def fetch(self, urls):
+        quotes = {}
+        remaining = list(urls)
+        for source in self.sources:
+            if not remaining:
+                break
+            try:
+                quotes.update(source.fetch(remaining))
+            except Exception as e:
+                print(f"Quote source '{source.name}' failed: {e}")
+                continue
+            remaining = [url for url in remaining if url not in quotes]
+        return quotes
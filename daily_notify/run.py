@@ -1,48 +1,212 @@
-import requests
 import json
 import os
-from bs4 import BeautifulSoup
-from linebot import LineBotApi
-from linebot.models import TextSendMessage, FlexSendMessage
-from datetime import datetime
+import sys
+import time
+from datetime import date, datetime
 import urllib3
-from flex_templates import create_stock_flex_message, create_weather_flex_message
+from flex_templates import (create_stock_flex_message, create_weather_flex_message,
+                            create_carousel_flex_message, render_stock_json,
+                            render_weather_json, carousel_messages)
+from concurrent_fetch import ConcurrentFetcher
+from pipeline import Pipeline
+from transport import get_session, get_line_bot_api
+from http_cache import HttpCache
+from extractors import get_extractor
+from metrics import metrics, span
+from slack_blocks import stock_blocks, weather_blocks, pack_messages
+from state_store import StateStore
+from delivery import (DeliveryQueue, LineSender, SlackSender, line_batches,
+                      slack_payload)
+from quote_sources import (HtmlQuoteSource, CnyesApiQuoteSource,
+                           FallbackQuoteSource)
+from quote_history import QuoteHistory, quote_record
+from analytics import LOOKBACK, analyze
+from sparkline import SparklineStore
+from watchlist import DEFAULT_SYMBOLS, Watchlists
+from alerts import (QUOTE_FIELDS, AlertEngine, group_messages, load_rules,
+                    weather_values)
+from subscribers import SubscriberStore
+from forecast_table import ForecastTable, summarize
+from image_cards import CardStore
+import fanout
 
 # 禁用 SSL 警告
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
 # Slack
 slack_webhook = os.getenv('SLACK_WEBHOOK')
+# 多個 Slack 目標: JSON list ([{"webhook": ..., "channel": ...}]) 或以逗號分隔的 webhook
+slack_targets = os.getenv('SLACK_TARGETS')
 # LineBot
 line_bot_token = os.getenv('LINE_BOT_TOKEN')
 line_user_id = os.getenv('LINE_USER_ID')
+line_api_endpoint = os.getenv('LINE_API_ENDPOINT', 'https://api.line.me')
+# 批次推送: 合併 bubble 成 carousel,多位收件者改用 multicast
+line_batch = os.getenv('LINE_BATCH') == '1'
 # 氣象署 API
 cwa_api_key = os.getenv('CWA_API_KEY')
+# HTTP 快取目錄 (設為空字串可停用)
+http_cache_dir = os.getenv('HTTP_CACHE_DIR', os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '.cache', 'http'))
+http_cache = HttpCache(http_cache_dir) if http_cache_dir else None
+# 推送失敗項目的 dead-letter 檔,下次執行時會重送
+dead_letter_path = os.getenv('DEAD_LETTER_PATH', os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '.cache', 'dead_letters.jsonl'))
+# 增量模式: 內容與上次推送相同時略過推送
+push_only_changed = os.getenv('PUSH_ONLY_CHANGED') == '1'
+state_path = os.getenv('STATE_PATH', os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '.cache', 'state.json'))
+# 快取有效秒數: 氣象署預報一天只更新數次,cnyes 收盤後頁面不再變動
+CWA_CACHE_TTL = 60 * 60
+CNYES_CACHE_TTL = 10 * 60
+# 指數歷史報價目錄 (設為空字串可停用)
+history_dir = os.getenv('HISTORY_DIR', os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '.cache', 'history'))
+quote_history = QuoteHistory(history_dir) if history_dir else None
+# 走勢圖: LINE 圖片必須是公開 HTTPS 網址,設定 SPARKLINE_BASE_URL
+# (對應 SPARKLINE_DIR 的公開位置) 才會產生並加入 bubble
+sparkline_dir = os.getenv('SPARKLINE_DIR', os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '.cache', 'sparklines'))
+sparkline_base_url = os.getenv('SPARKLINE_BASE_URL')
+sparklines = (SparklineStore(sparkline_dir, sparkline_base_url)
+              if sparkline_base_url else None)
+# PNG 卡片 (需要 Pillow): 設定 CARD_BASE_URL (對應 CARD_DIR 的公開位置)
+# 後 Slack 摘要會附上美股與天氣卡片。CARD_DIR 必須另外發布到該網址,
+# 推送前會確認網址可讀取,讀不到的卡片不附上
+card_dir = os.getenv('CARD_DIR', os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '.cache', 'cards'))
+card_base_url = os.getenv('CARD_BASE_URL')
+card_store = CardStore(card_dir, card_base_url) if card_base_url else None
+# 自選清單設定檔 (JSON),設定後依各使用者的清單另外推送
+watchlist_path = os.getenv('WATCHLIST_PATH')
+# 門檻警示規則 (JSON) 與觸發紀錄;警示輪詢時報價快取只保留 ALERT_CACHE_TTL 秒
+alert_rules_path = os.getenv('ALERT_RULES_PATH')
+alert_state_path = os.getenv('ALERT_STATE_PATH', os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '.cache', 'alerts.json'))
+ALERT_CACHE_TTL = 30
+# 訂閱者名單 (SQLite),設定後可依每位訂閱者的縣市、代號與推送時間推送
+subscribers_db = os.getenv('SUBSCRIBERS_DB')
+# 個人化推送的子程序數上限 (未設定時為 CPU 數)
+fanout_processes = int(os.getenv('FANOUT_PROCESSES', '0')) or None
+# 美股報價來源: api (JSON API,失敗時改抓頁面) 或 html (只抓頁面)
+cnyes_quote_source = os.getenv('CNYES_QUOTE_SOURCE', 'api')
+
+
+_delivery_queue = None
+
+
+def get_delivery_queue():
+    """共用的推送佇列,LINE 與 Slack 各自限速"""
+    global _delivery_queue
+    if _delivery_queue is None:
+        session = get_session()
+        senders = {'slack': SlackSender(session, slack_webhooks())}
+        if line_bot_token:
+            senders['line'] = LineSender(line_bot_token, session,
+                                         endpoint=line_api_endpoint)
+        _delivery_queue = DeliveryQueue(
+            senders, dead_letter_path=dead_letter_path or None)
+    return _delivery_queue
+
+
+def replay_dead_letters():
+    """重送上次執行失敗的推送"""
+    futures = get_delivery_queue().replay_dead_letters()
+    failed = 0
+    for future in futures:
+        try:
+            future.result()
+        except Exception:
+            failed += 1
+    print(f"Replayed {len(futures)} dead letters, {failed} failed again.")
+    if failed:
+        raise Exception(f"{failed} dead letters failed again")
 
 
 # LineBot
 class LineBot:
-    def __init__(self, context=None, flex_message=None):
+    MAX_MESSAGES = 5  # 每次請求最多 5 則訊息
+    MAX_MULTICAST = 500  # multicast 每次最多 500 位收件者
+
+    def __init__(self, context=None, flex_message=None, user_ids=None):
         self.context = context
         self.flex_message = flex_message
-        self.line_bot_api = LineBotApi(line_bot_token)
-        self.user_id = line_user_id
+        # LINE_USER_ID 可用逗號分隔多位收件者
+        if user_ids is None:
+            user_ids = [u.strip() for u in (line_user_id or '').split(',')
+                        if u.strip()]
+        self.user_ids = list(user_ids)
+
+    @property
+    def line_bot_api(self):
+        # 推送走 delivery 佇列,只有需要 SDK 時才載入 linebot
+        return get_line_bot_api(line_bot_token) if line_bot_token else None
 
     def push_message(self):
-        if not self.user_id or not self.line_bot_api:
+        if not self.user_ids or not line_bot_token:
             raise Exception("LINE Bot token or user ID is missing.")
+        # 如果有 Flex Message 就用 Flex,否則用純文字
+        message = self.flex_message or {'type': 'text', 'text': self.context}
         try:
-            # 如果有 Flex Message 就用 Flex,否則用純文字
-            if self.flex_message:
-                self.line_bot_api.push_message(self.user_id, self.flex_message)
-            else:
-                self.line_bot_api.push_message(
-                    self.user_id,
-                    TextSendMessage(text=self.context)
-                )
-            print("Message sent successfully via LINE Bot.")
+            # 多位收件者時與 push_batch 相同改用 multicast
+            with span('push', channel='line'):
+                for future in self.submit_batch([message])[1]:
+                    future.result()
         except Exception as e:
             print(f"Failed to send message via LINE Bot: {e}")
+            raise
+        print("Message sent successfully via LINE Bot.")
+        return True
+
+    def push_batch(self, messages, broadcast=False):
+        """
+        批次推送多則訊息
+
+        每 5 則訊息為一批;單一收件者用 push,多位收件者用 multicast
+        (每批最多 500 位),broadcast=True 時推送給所有好友。
+        API 呼叫次數 = 訊息批數 × 收件者批數,與收件者人數無關。
+
+        Returns:
+            API 呼叫次數
+        """
+        payloads, futures = self.submit_batch(messages, broadcast)
+        with span('push', channel='line', mode=payloads[0]['mode']
+                  if payloads else 'none'):
+            errors = [f.exception() for f in futures]
+        failed = sum(1 for e in errors if e is not None)
+        calls = len(payloads)
+        print(f"Batch sent via LINE Bot: {len(messages)} messages, "
+              f"{len(self.user_ids)} recipients, {calls} API calls, "
+              f"{failed} failed.")
+        if failed:
+            raise Exception(f"{failed} of {calls} LINE batches failed")
+        return calls
+
+    def submit_batch(self, messages, broadcast=False):
+        """
+        將 push_batch 的所有批次放入推送佇列,不等待結果
+
+        Returns:
+            (payloads, futures)
+        """
+        if not line_bot_token or (not broadcast and not self.user_ids):
+            raise Exception("LINE Bot token or user ID is missing.")
+        payloads = line_batches(messages, self.user_ids, broadcast,
+                                self.MAX_MESSAGES, self.MAX_MULTICAST)
+
+        # 所有批次同時送出,失敗的項目已由佇列重試並寫入 dead-letter
+        queue = get_delivery_queue()
+        return payloads, [queue.submit('line', p) for p in payloads]
+
+
+def push_line_digest(*sources, broadcast=False):
+    """將各來源的 Flex bubble 合併成 carousel,一次推送"""
+    bubbles = [m for m in (src.flex_message() for src in sources) if m]
+    if not bubbles:
+        print("Skipping LINE digest: no content")
+        return 0
+    messages = create_carousel_flex_message(bubbles)
+    return LineBot().push_batch(messages, broadcast=broadcast)
 
 
 # Slack
@@ -69,11 +233,183 @@ class SlackNotification:
                 }
             ]
         }
-        headers = {'Content-Type': "application/json"}
-        response = requests.post(
-            self.slack_webhook, data=json.dumps(slack_data), headers=headers)
-        if response.status_code != 200:
-            raise Exception(response.status_code, response.text)
+        with span('push', channel='slack'):
+            get_delivery_queue().submit(
+                'slack', slack_payload(SLACK_WEBHOOK_ALIAS, slack_data)
+            ).result()
+
+
+SLACK_WEBHOOK_ALIAS = 'SLACK_WEBHOOK'
+
+
+def parse_slack_targets(text=None):
+    """
+    解析 SLACK_TARGETS,未設定時使用 SLACK_WEBHOOK
+
+    每個目標另有 alias ('SLACK_TARGETS[i]' 或 'SLACK_WEBHOOK'),
+    推送項目與 dead-letter 只記錄 alias,網址由 slack_webhooks() 查出
+    """
+    text = slack_targets if text is None else text
+    if not text:
+        if not slack_webhook:
+            return []
+        return [{'webhook': slack_webhook, 'channel': '#測試',
+                 'alias': SLACK_WEBHOOK_ALIAS}]
+    text = text.strip()
+    if text.startswith('['):
+        targets = [dict(t) if isinstance(t, dict) else {'webhook': t}
+                   for t in json.loads(text)]
+    else:
+        targets = [{'webhook': w.strip()} for w in text.split(',') if w.strip()]
+    for i, target in enumerate(targets):
+        target['alias'] = f'SLACK_TARGETS[{i}]'
+    return targets
+
+
+def slack_webhooks():
+    """{別名: webhook 網址},只從環境變數讀取"""
+    webhooks = {t['alias']: t['webhook'] for t in parse_slack_targets()}
+    if slack_webhook:
+        webhooks[SLACK_WEBHOOK_ALIAS] = slack_webhook
+    return webhooks
+
+
+class SlackFanout:
+    """
+    將美股與天氣摘要以 Block Kit 同時推送到多個 Slack webhook / 頻道
+
+    blocks 只產生一次;所有內容合併成最少則訊息;設定相同的目標共用同一份
+    payload。每個 webhook 各自限速,所有目標同時送出。
+    設定 CARD_BASE_URL 時每段另附 PNG 卡片 (同一批一起繪製,已有的直接使用)。
+    """
+
+    def __init__(self, targets=None, username="美股追蹤", icon_emoji=':panda_face:',
+                 cards=None):
+        self.targets = parse_slack_targets() if targets is None else targets
+        self.username = username
+        self.icon_emoji = icon_emoji
+        self.cards = card_store if cards is None else cards
+        self.sections = []
+        self.card_specs = []  # 與 sections 同順序的 (種類, 參數, 替代文字)
+        self.results = []
+
+    def add_stocks(self, stocks_data):
+        if stocks_data:
+            self.sections.append(stock_blocks(stocks_data))
+            self.card_specs.append(('stock', {'stocks_data': stocks_data},
+                                    "美股日報"))
+        return self
+
+    def add_weather(self, location_name, weather_data):
+        if weather_data:
+            self.sections.append(weather_blocks(location_name, weather_data))
+            self.card_specs.append(
+                ('weather', {'location_name': location_name,
+                             'weather_data': weather_data},
+                 f"{location_name} 36 小時天氣預報"))
+        return self
+
+    def card_blocks(self):
+        """
+        每段的 image block,未設定卡片、繪製失敗或網址讀不到時為空
+        (Slack 遇到讀不到的 image_url 會拒收整則訊息)
+        """
+        if not self.cards or not self.card_specs:
+            return [[] for _ in self.sections]
+        try:
+            urls = self.cards.published_urls(
+                [(kind, data) for kind, data, _ in self.card_specs],
+                get_session())
+        except Exception as e:
+            print(f"Skipping Slack image cards: {e}")
+            return [[] for _ in self.sections]
+        if None in urls:
+            print(f"Skipping {urls.count(None)} Slack image cards: "
+                  f"not reachable under {self.cards.base_url}")
+        return [[{"type": "image", "image_url": url, "alt_text": alt_text}]
+                if url else []
+                for url, (_, _, alt_text) in zip(urls, self.card_specs)]
+
+    def messages(self):
+        sections = [blocks + images for blocks, images
+                    in zip(self.sections, self.card_blocks())]
+        return pack_messages(sections, fallback_text="每日資訊")
+
+    @staticmethod
+    def _mark_done(finished):
+        def callback(_):
+            finished['at'] = max(finished.get('at', 0), time.perf_counter())
+        return callback
+
+    def push(self):
+        """
+        推送到所有目標
+
+        Returns:
+            list of {target, messages, status, seconds, error}
+        """
+        if not self.targets:
+            raise Exception("Slack targets are missing.")
+        messages = self.messages()
+        if not messages:
+            print("Skipping Slack fan-out: no content")
+            return []
+
+        # 依 (username, icon, channel) 分組,同組只組一次 payload
+        bodies = {}
+        queue = get_delivery_queue()
+        pending = []
+        start = time.perf_counter()
+        for target in self.targets:
+            key = (target.get('username', self.username),
+                   target.get('icon_emoji', self.icon_emoji),
+                   target.get('channel'))
+            if key not in bodies:
+                extra = {'username': key[0], 'icon_emoji': key[1]}
+                if key[2]:
+                    extra['channel'] = key[2]
+                bodies[key] = [dict(m, **extra) for m in messages]
+            futures = [queue.submit('slack', slack_payload(target['alias'], body),
+                                    limit_key=target['alias'])
+                       for body in bodies[key]]
+            finished = {}
+            for future in futures:
+                future.add_done_callback(self._mark_done(finished))
+            label = (target.get('name') or target.get('channel')
+                     or target['alias'])
+            pending.append((label, futures, finished))
+
+        self.results = []
+        for label, futures, finished in pending:
+            errors = [str(e) for e in (f.exception() for f in futures) if e]
+            self.results.append({
+                'target': label,
+                'messages': len(futures),
+                'status': 'failed' if errors else 'ok',
+                'seconds': finished.get('at', time.perf_counter()) - start,
+                'error': '; '.join(errors) or None,
+            })
+        for r in self.results:
+            print(f"Slack {r['status']:<6} {r['target']:<20} "
+                  f"{r['messages']} messages {r['seconds']:.2f}s"
+                  + (f"  ({r['error']})" if r['error'] else ""))
+        failed = [r['target'] for r in self.results if r['status'] != 'ok']
+        if failed:
+            raise Exception(f"Slack fan-out failed for: {', '.join(failed)}")
+        return self.results
+
+
+def push_slack_digest(crawler=None, weather=None):
+    """美股與天氣合併成 Block Kit 訊息,推送到所有 Slack 目標 (來源可只有一個)"""
+    fanout = SlackFanout()
+    if crawler is not None:
+        fanout.add_stocks(crawler.stocks_data)
+    if weather is not None and weather.flex_message() is not None:
+        fanout.add_weather(weather.location, weather.weather_data)
+    if not fanout.sections:
+        print("Skipping Slack digest: no content")
+        return
+    return fanout.push()
 
 
 # 氣象資訊
@@ -83,6 +419,20 @@ class WeatherForecast:
         self.api_url = 'https://opendata.cwa.gov.tw/api/v1/rest/datastore/F-C0032-001'
         self.result = ''
         self.weather_data = []  # 儲存結構化資料用於 Flex Message
+        # 多縣市模式 (fetch_many) 的結果
+        self.forecasts = {}  # 縣市名稱 -> weather_data
+        self.results = {}  # 縣市名稱 -> 文字訊息
+
+    def _get(self, params):
+        """經由快取呼叫氣象署 API"""
+        # 禁用 SSL 驗證以避免 GitHub Actions 環境的憑證問題
+        with span('fetch', source='cwa'):
+            if http_cache is not None:
+                return http_cache.get(get_session(), self.api_url,
+                                      params=params, ttl=CWA_CACHE_TTL,
+                                      verify=False)
+            return get_session().get(self.api_url, params=params,
+                                     verify=False)
 
     def get_period_name(self, start_time):
         """根據時間判斷時段並加上 emoji"""
@@ -97,188 +447,704 @@ class WeatherForecast:
             return "🌙 凌晨"
 
     def fetch(self):
-        """取得天氣預報資料"""
+        """
+        取得天氣預報資料
+
+        失敗時 self.result 為錯誤說明並拋出例外 (pipeline 的工作才會標記為失敗)
+        """
         if not cwa_api_key:
-            print("Warning: CWA_API_KEY not set")
             self.result = "無法取得天氣資料：API Key 未設定"
-            return self.result
+            raise Exception("CWA_API_KEY not set")
 
         params = {
             'Authorization': cwa_api_key,
             'locationName': self.location
         }
         try:
-            # 禁用 SSL 驗證以避免 GitHub Actions 環境的憑證問題
-            response = requests.get(self.api_url, params=params, verify=False)
+            response = self._get(params)
             response.raise_for_status()
             data = response.json()
 
             location_data = data['records']['location'][0]
-            location_name = location_data['locationName']
-            elements = location_data['weatherElement']
-
-            # 建立元素對照表
-            element_map = {el['elementName']: el['time'] for el in elements}
-
-            # 格式化訊息
-            lines = [f"*{location_name} 36 小時天氣預報*"]
-            self.weather_data = []  # 清空並重新填充
-
-            # 取得今天的日期用於比對
-            from datetime import datetime as dt
-            today = dt.now().date()
-
-            for i in range(3):
-                start = element_map['Wx'][i]['startTime']
-                end = element_map['Wx'][i]['endTime']
-                period = self.get_period_name(start)
-
-                wx = element_map['Wx'][i]['parameter']['parameterName']
-                ci = element_map['CI'][i]['parameter']['parameterName']
-                minT = element_map['MinT'][i]['parameter']['parameterName']
-                maxT = element_map['MaxT'][i]['parameter']['parameterName']
-                pop = element_map['PoP'][i]['parameter']['parameterName']
-
-                lines.append("")
-                lines.append(f"{period}({start[0:16]} ~ {end[11:16]})")
-                lines.append(f"{wx},{ci}")
-                lines.append(f"溫度:{minT}°C ~ {maxT}°C")
-                lines.append(f"降雨:{pop}%")
-
-                # 儲存結構化資料用於 Flex Message
-                emoji_map = {"🌅 早上": "🌅", "☀️ 白天": "☀️",
-                             "🌃 晚上": "🌃", "🌙 凌晨": "🌙"}
-                period_text = period.replace(
-                    emoji_map.get(period, ""), "").strip()
-
-                # 判斷是否為明天
-                start_date = dt.strptime(start, "%Y-%m-%d %H:%M:%S").date()
-                if start_date > today:
-                    period_text = "明天" + period_text
-
-                self.weather_data.append({
-                    "period": period_text,
-                    "emoji": emoji_map.get(period, "🌤️"),
-                    "time": f"{start[5:16]} - {end[5:16]}",
-                    "weather": wx,
-                    "comfort": ci,
-                    "minTemp": minT,
-                    "maxTemp": maxT,
-                    "rain": pop
-                })
-
-            self.result = "\n".join(lines)
+            with span('parse', source='cwa'):
+                table = ForecastTable([location_data])
+                self.result, self.weather_data = summarize(
+                    table, table.names[0], date.today())
             return self.result
 
-        except Exception as e:
-            print(f"Failed to fetch weather data: {e}")
+        except Exception:
             self.result = f"無法取得{self.location}天氣資料"
-            return self.result
+            raise
+
+    def parse_location(self, location_data):
+        """
+        逐筆解析單一 records.location 項目
+
+        一般改用 forecast_table (欄式表格,時間只解析一次);這裡保留作為
+        格式不符時的備援與效能比較的基準。
+
+        Returns:
+            (文字訊息, weather_data)
+        """
+        location_name = location_data['locationName']
+        elements = location_data['weatherElement']
+
+        # 建立元素對照表
+        element_map = {el['elementName']: el['time'] for el in elements}
+
+        # 格式化訊息
+        lines = [f"*{location_name} 36 小時天氣預報*"]
+        weather_data = []
+
+        # 取得今天的日期用於比對
+        from datetime import datetime as dt
+        today = dt.now().date()
+
+        for i in range(3):
+            start = element_map['Wx'][i]['startTime']
+            end = element_map['Wx'][i]['endTime']
+            period = self.get_period_name(start)
+
+            wx = element_map['Wx'][i]['parameter']['parameterName']
+            ci = element_map['CI'][i]['parameter']['parameterName']
+            minT = element_map['MinT'][i]['parameter']['parameterName']
+            maxT = element_map['MaxT'][i]['parameter']['parameterName']
+            pop = element_map['PoP'][i]['parameter']['parameterName']
+
+            lines.append("")
+            lines.append(f"{period}({start[0:16]} ~ {end[11:16]})")
+            lines.append(f"{wx},{ci}")
+            lines.append(f"溫度:{minT}°C ~ {maxT}°C")
+            lines.append(f"降雨:{pop}%")
+
+            # 儲存結構化資料用於 Flex Message
+            emoji_map = {"🌅 早上": "🌅", "☀️ 白天": "☀️",
+                         "🌃 晚上": "🌃", "🌙 凌晨": "🌙"}
+            period_text = period.replace(
+                emoji_map.get(period, ""), "").strip()
+
+            # 判斷是否為明天
+            start_date = dt.strptime(start, "%Y-%m-%d %H:%M:%S").date()
+            if start_date > today:
+                period_text = "明天" + period_text
+
+            weather_data.append({
+                "period": period_text,
+                "emoji": emoji_map.get(period, "🌤️"),
+                "time": f"{start[5:16]} - {end[5:16]}",
+                "weather": wx,
+                "comfort": ci,
+                "minTemp": minT,
+                "maxTemp": maxT,
+                "rain": pop
+            })
+
+        return "\n".join(lines), weather_data
+
+    def fetch_many(self, locations=None, batch_size=None):
+        """
+        一次請求取得多個縣市的天氣預報
+
+        Args:
+            locations: 縣市名稱 list,None 表示全部 22 縣市
+            batch_size: 每次請求的縣市數 (以逗號合併 locationName),
+                None 表示全部放在同一個請求
+
+        Returns:
+            {縣市名稱: weather_data},同時存於 self.forecasts
+        """
+        self.forecasts = {}
+        self.results = {}
+        if not cwa_api_key:
+            print("Warning: CWA_API_KEY not set")
+            return self.forecasts
+
+        if locations is None:
+            batches = [None]
+        else:
+            locations = list(dict.fromkeys(locations))
+            size = batch_size or len(locations) or 1
+            batches = [locations[i:i + size]
+                       for i in range(0, len(locations), size)]
+
+        for batch in batches:
+            params = {'Authorization': cwa_api_key}
+            if batch is not None:
+                params['locationName'] = ','.join(batch)
+            try:
+                response = self._get(params)
+                response.raise_for_status()
+                records = response.json()['records']['location']
+            except Exception as e:
+                # 回應格式不符時 (例如錯誤訊息) 只略過這一批
+                print(f"Failed to fetch weather data for {batch or 'all'}: {e}")
+                continue
+            try:
+                with span('parse', source='cwa'):
+                    table = ForecastTable(records)
+            except Exception as e:
+                print(f"Falling back to per-location parsing: {e}")
+                table = None
+            today = date.today()
+            # 每個縣市只解析一次
+            for location_data in records:
+                name = location_data.get('locationName')
+                try:
+                    with span('parse', source='cwa'):
+                        if table is not None:
+                            result, weather_data = summarize(table, name,
+                                                             today)
+                        else:
+                            result, weather_data = self.parse_location(
+                                location_data)
+                except Exception as e:
+                    print(f"Failed to parse {name}: {e}")
+                    continue
+                self.results[name] = result
+                self.forecasts[name] = weather_data
+        if locations is not None:
+            missing = [name for name in locations
+                       if name not in self.forecasts]
+            if missing:
+                print(f"Warning: no forecast for: {', '.join(missing)}")
+        return self.forecasts
+
+    @property
+    def ready(self):
+        """是否有完整的天氣資料可推送"""
+        return bool(self.result) and "無法取得" not in self.result \
+            and "未設定" not in self.result
+
+    def flex_message(self):
+        """天氣 Flex Message,資料不完整時回傳 None"""
+        if not self.ready:
+            return None
+        with span('render', template='weather'):
+            return create_weather_flex_message(
+                self.location, self.weather_data)
 
     def push(self):
         """推送天氣訊息到 LINE"""
-        if not self.result or "無法取得" in self.result or "未設定" in self.result:
+        if not self.ready:
             print(f"Skipping weather notification: {self.result}")
             return
-        try:
-            # 使用 Flex Message
-            flex_msg = create_weather_flex_message(
-                self.location, self.weather_data)
-            weather_line_bot = LineBot(flex_message=flex_msg)
-            weather_line_bot.push_message()
-            print("Weather message sent successfully")
-        except Exception as e:
-            print(f"Failed to send weather info: {e}")
+        # 使用 Flex Message,失敗時由 push_message 拋出例外
+        weather_line_bot = LineBot(flex_message=self.flex_message())
+        weather_line_bot.push_message()
+        print("Weather message sent successfully")
+        return True
+
+    def state_items(self):
+        """增量模式比對用的內容,資料不完整時為空"""
+        if not self.ready:
+            return {}
+        return {f'weather:{self.location}': self.weather_data}
+
+    def preview(self):
+        """dry-run: 只輸出將推送的內容"""
+        print(self.result)
+        if self.ready:
+            size = len(render_weather_json(self.location, self.weather_data))
+            print(f"(LINE bubble: {size} bytes)")
 
 
 # 爬蟲
 class WebCrawlerUSA:
-    def __init__(self):
-        self.rs = requests.session()
-        self.urls = [
-            ('道瓊指數', 'https://invest.cnyes.com/index/GI/DJI'),  # DJI
-            ('S&P 500', 'https://invest.cnyes.com/index/GI/INX'),  # SPX
-            ('費城半導體', 'https://invest.cnyes.com/index/GI/SOX'),  # 費城半導體
-            ('那斯達克綜合指數', 'https://invest.cnyes.com/index/GI/IXIC'),  # NASDAQ
-        ]
+    # 自選清單每個 bubble 最多幾列,超過時拆成多個 bubble (carousel)
+    WATCHLIST_ROWS = 8
+
+    def __init__(self, max_workers=8, per_host=4, timeout=10, extractor=None,
+                 source=None, watchlists=None, ttl=CNYES_CACHE_TTL):
+        self.rs = get_session()
+        self.urls = list(DEFAULT_SYMBOLS)
+        # 自選清單: 所有使用者的代號合併去重,與預設指數一起抓取
+        self.watchlists = watchlists
+        self.quote_table = {}  # 網址 -> stocks_data 格式的報價
+        # 並行抓取: 總並行數、單一主機並行數、每個請求逾時秒數
+        self.fetcher = ConcurrentFetcher(
+            self.rs, max_workers=max_workers, per_host=per_host,
+            timeout=timeout, cache=http_cache, ttl=ttl)
+        self.ttl = ttl
+        # 頁面欄位擷取後端 (bs4 / lxml / stream),預設讀取 CNYES_EXTRACTOR
+        self.extractor = get_extractor(extractor)
+        self.source = self.build_source(source or cnyes_quote_source, timeout)
         self.result = []
         self.stocks_data = []  # 儲存結構化資料用於 Flex Message
+        self.quotes = []  # 數值格式,寫入歷史報價
+        self._analytics = None
+
+    def build_source(self, name, timeout):
+        """建立報價來源,頁面擷取永遠作為最後的備援"""
+        html_source = HtmlQuoteSource(self.fetcher, self.extractor)
+        if name == 'html':
+            return html_source
+        if name != 'api':
+            raise ValueError(f"Unknown quote source: {name}")
+        api_source = CnyesApiQuoteSource(
+            self.rs, cache=http_cache, ttl=self.ttl, timeout=timeout)
+        return FallbackQuoteSource([api_source, html_source])
 
     def fetch(self):
-        for url in self.urls:
-            res = self.rs.get(url[1], verify=False)
-            soup = BeautifulSoup(res.text, 'html.parser')
-            info_date = soup.select('._zFXfK')[0].text
-            info_date = info_date.split(' ')[0]
-            info_price = soup.select('.jsx-2214436525.info-price')[0].text
-            info_net = soup.select('.jsx-2214436525.change-net')[0].text
-            info_percent = soup.select(
-                '.jsx-2214436525.change-percent')[0].text
-
-            # 判斷漲跌
-            if '+' in info_net:
-                info = '{}▲  {}▲'.format(info_net, info_percent)
-                info = info.replace('+', '')
-                trend = 'up'
-                change = info_net.replace('+', '')
-                percent = info_percent.replace('+', '')
-            else:
-                info = '{}▼  {}▼'.format(info_net, info_percent)
-                info = info.replace('-', '')
-                trend = 'down'
-                change = info_net.replace('-', '')
-                percent = info_percent.replace('-', '')
-
-            # 儲存文字格式
-            self.result.append(
-                '{}\n{}\n{}\n{}'.format(info_date, url[0], info_price, info))
+        # 一次取得所有報價 (每個網址只抓一次),再依 self.urls 順序加入
+        watched = self.watchlists.symbols() if self.watchlists else []
+        urls = list(dict.fromkeys(url for _, url in self.urls + watched))
+        with span('fetch', source='cnyes'):
+            quotes = self.source.fetch(urls)
+        missing = [url[0] for url in self.urls if url[1] not in quotes]
+        if missing:
+            raise Exception(f"Failed to fetch quotes: {', '.join(missing)}")
+        for name, url in self.urls:
+            self.add_quote(name, quotes[url])
+            self.quote_table[url] = self.stocks_data[-1]
+        default_urls = {url for _, url in self.urls}
+        skipped = []
+        for name, url in watched:
+            if url in default_urls:
+                continue
+            if url not in quotes:
+                skipped.append(name)
+                continue
+            self.quote_table[url] = self.quote_entry(name, quotes[url])[1]
+            self.add_record(name, quotes[url])
+        if skipped:
+            print(f"Watchlist quotes not available: {', '.join(skipped)}")
 
-            # 儲存結構化資料用於 Flex Message
-            self.stocks_data.append({
-                "name": url[0],
-                "date": info_date,
-                "price": info_price,
-                "change": change,
-                "percent": percent,
-                "trend": trend
-            })
+    def add_record(self, name, fields):
+        """加入數值格式的報價 (寫入歷史與計算指標用)"""
+        try:
+            self.quotes.append(quote_record(name, fields))
+        except ValueError as e:
+            print(f"Skipping history for {name}: {e}")
+
+    def add_quote(self, name, fields):
+        """將報價欄位 (date / price / net / percent) 加入 result / stocks_data"""
+        text, stock = self.quote_entry(name, fields)
+        self.add_record(name, fields)
+        self.result.append(text)
+        self.stocks_data.append(stock)
+
+    @staticmethod
+    def quote_entry(name, fields):
+        """報價欄位 -> (文字訊息, stocks_data 項目)"""
+        info_date = fields['date'].split(' ')[0]
+        info_price = fields['price']
+        info_net = fields['net']
+        info_percent = fields['percent']
+
+        # 判斷漲跌
+        if '+' in info_net:
+            info = '{}▲  {}▲'.format(info_net, info_percent)
+            info = info.replace('+', '')
+            trend = 'up'
+            change = info_net.replace('+', '')
+            percent = info_percent.replace('+', '')
+        else:
+            info = '{}▼  {}▼'.format(info_net, info_percent)
+            info = info.replace('-', '')
+            trend = 'down'
+            change = info_net.replace('-', '')
+            percent = info_percent.replace('-', '')
+
+        # 文字格式
+        text = '{}\n{}\n{}\n{}'.format(info_date, name, info_price, info)
+
+        # 結構化資料用於 Flex Message
+        return text, {
+            "name": name,
+            "date": info_date,
+            "price": info_price,
+            "change": change,
+            "percent": percent,
+            "trend": trend
+        }
+
+    def analytics(self):
+        """
+        各指數的均線、週/月漲跌、52 週高低與走勢圖 (依歷史報價)
+
+        未啟用歷史或計算失敗時為空,不影響推送
+        """
+        if self._analytics is None:
+            results = {}
+            if quote_history:
+                with span('analytics'):
+                    for record in self.quotes:
+                        try:
+                            history = quote_history.latest(record['name'],
+                                                           LOOKBACK)
+                            results[record['name']] = analyze(
+                                history, record, sparklines)
+                        except Exception as e:
+                            print(f"Skipping analytics for {record['name']}: {e}")
+            self._analytics = results
+        return self._analytics
+
+    def flex_message(self):
+        """美股 Flex Message,沒有資料時回傳 None"""
+        if not self.stocks_data:
+            return None
+        analytics = self.analytics()
+        with span('render', template='stock'):
+            return create_stock_flex_message(self.stocks_data, analytics)
+
+    def push_line(self):
+        """LineOA - 美股資訊 (使用 Flex Message)"""
+        analytics = self.analytics()
+        with span('render', template='stock'):
+            flex_msg = create_stock_flex_message(self.stocks_data, analytics)
+        usa_stock_line_bot = LineBot(flex_message=flex_msg)
+        return usa_stock_line_bot.push_message()
+
+    def watchlist_bubbles(self, urls):
+        """單一自選清單的 bubble JSON,每個 bubble 最多 WATCHLIST_ROWS 列"""
+        stocks = [self.quote_table[url] for url in urls
+                  if url in self.quote_table]
+        analytics = self.analytics() if stocks else {}
+        with span('render', template='watchlist'):
+            return [
+                render_stock_json(stocks[i:i + self.WATCHLIST_ROWS], analytics,
+                                  title="📊 自選清單", subtitle="Watchlist")
+                for i in range(0, len(stocks), self.WATCHLIST_ROWS)
+            ]
+
+    def watchlist_messages(self, urls):
+        """單一自選清單的 carousel 訊息 (dict,不建立 SDK 物件)"""
+        return carousel_messages(self.watchlist_bubbles(urls),
+                                 alt_text="📊 自選清單")
+
+    def push_watchlists(self):
+        """
+        依自選清單推送,清單相同的使用者共用同一組訊息並以 multicast 發送;
+        所有清單先放入推送佇列再一起等待結果
+
+        Returns:
+            推送成功的清單數
+        """
+        pending = []
+        with span('push', channel='line', mode='watchlist'):
+            for urls, user_ids in self.watchlists.groups().items():
+                messages = self.watchlist_messages(urls)
+                if not messages:
+                    print(f"Skipping watchlist for {len(user_ids)} users: "
+                          f"no quotes")
+                    continue
+                _, futures = LineBot(user_ids=user_ids).submit_batch(messages)
+                pending.append(futures)
+            failed = sum(1 for futures in pending
+                         if any(f.exception() is not None for f in futures))
+        print(f"Watchlists sent via LINE Bot: {len(pending)} lists, "
+              f"{failed} failed.")
+        if failed:
+            raise Exception(f"{failed} of {len(pending)} watchlist pushes failed")
+        return len(pending) - failed
+
+    def push_slack(self):
+        """Slack (使用文字格式)"""
+        result = '\n'+'\n\n'.join(self.result)
+        slack = SlackNotification(result)
+        slack.push()
+
+    def state_items(self):
+        """增量模式比對用的內容 (每個指數一筆)"""
+        return {f'stock:{s["name"]}': s for s in self.stocks_data}
+
+    def record_history(self):
+        """將本次報價附加到歷史資料,回傳寫入筆數"""
+        with span('history', op='append'):
+            written = quote_history.append(self.quotes)
+        print(f"Recorded {written} quotes to history")
+        return written
+
+    def preview(self):
+        """dry-run: 只輸出將推送的內容"""
+        print('\n\n'.join(self.result))
+        if self.stocks_data:
+            size = len(render_stock_json(self.stocks_data))
+            print(f"(LINE bubble: {size} bytes)")
+
+
+_alert_engine = None
+
+
+def get_alert_engine():
+    """共用的警示引擎 (常駐模式下保留觸發紀錄與索引)"""
+    global _alert_engine
+    if _alert_engine is None:
+        rules = load_rules(alert_rules_path,
+                           lambda symbols: Watchlists(symbols=symbols).resolve)
+        _alert_engine = AlertEngine(rules, state_path=alert_state_path or None)
+    return _alert_engine
+
+
+def poll_alerts():
+    """
+    抓取規則參照的報價與天氣 (短 TTL 快取 + 條件式請求),
+    觸發的警示合併成每位使用者一則 LINE 訊息
+
+    Returns:
+        觸發的警示數
+    """
+    engine = get_alert_engine()
+    alerts = []
+    symbols = engine.symbols()
+    if symbols:
+        crawler = WebCrawlerUSA(ttl=ALERT_CACHE_TTL)
+        with span('fetch', source='cnyes'):
+            quotes = crawler.source.fetch(list(symbols))
+        for url, fields in quotes.items():
+            try:
+                record = quote_record(symbols[url], fields)
+            except ValueError as e:
+                print(f"Skipping alerts for {symbols[url]}: {e}")
+                continue
+            alerts.extend(engine.evaluate(
+                'quote', url, {f: record[f] for f in QUOTE_FIELDS}))
+    locations = engine.locations()
+    if locations:
+        forecasts = WeatherForecast().fetch_many(locations)
+        for location, weather_data in forecasts.items():
+            if weather_data:
+                alerts.extend(engine.evaluate('weather', location,
+                                              weather_values(weather_data)))
+
+    futures = []
+    for text, user_ids in group_messages(alerts).items():
+        futures.extend(LineBot(user_ids=user_ids).submit_batch(
+            [{'type': 'text', 'text': text}])[1])
+    failed = sum(1 for f in futures if f.exception() is not None)
+    engine.save()
+    print(f"Alerts: {len(alerts)} triggered, {len(futures)} LINE requests, "
+          f"{failed} failed.")
+    if failed:
+        raise Exception(f"{failed} of {len(futures)} alert pushes failed")
+    return len(alerts)
+
+
+def build_alert_pipeline():
+    """警示輪詢: 先重送失敗的推送,再檢查規則"""
+    pipeline = Pipeline()
+    pipeline.add('dead_letter_replay', replay_dead_letters)
+    pipeline.add('alert_poll', poll_alerts)
+    return pipeline
+
+
+class SubscriberDigest:
+    """
+    依訂閱者名單推送個人化每日資訊 (自選代號 + 所在縣市天氣)
+
+    所有訂閱者的代號與縣市合併去重後只抓一次;內容相同的訂閱者共用
+    同一組訊息,再分片給多個子程序以 multicast 送出。
+
+    Args:
+        deliver_at: 只推送設定此時間 (HH:MM) 的訂閱者,None 表示全部
+    """
+
+    def __init__(self, deliver_at=None, store=None):
+        self.deliver_at = deliver_at
+        self.store = store or SubscriberStore(subscribers_db)
+        self.subscribers = []
+        self.crawler = None
+        self.forecasts = {}
+        self.groups = []
+
+    def _resolve(self, catalog, sub):
+        urls = []
+        for entry in sub['symbols']:
+            try:
+                urls.append(catalog.resolve(entry))
+            except ValueError as e:
+                print(f"Skipping symbol for {sub['user_id']}: {e}")
+        return urls or [url for _, url in DEFAULT_SYMBOLS]
+
+    def fetch(self):
+        """抓取所有訂閱者需要的報價與天氣 (每個代號、縣市只抓一次)"""
+        subs = self.store.subscribers(self.deliver_at)
+        catalog = (Watchlists.load(watchlist_path) if watchlist_path
+                   else Watchlists())
+        self.subscribers = [dict(sub, symbols=self._resolve(catalog, sub))
+                            for sub in subs]
+        if not self.subscribers:
+            return
+        self.crawler = WebCrawlerUSA(watchlists=Watchlists(
+            users={s['user_id']: s['symbols'] for s in self.subscribers},
+            symbols=catalog.catalog))
+        self.crawler.fetch()
+        locations = {s['location'] for s in self.subscribers if s['location']}
+        if locations:
+            self.forecasts = WeatherForecast().fetch_many(sorted(locations))
+
+    def render(self, symbols, location):
+        bubbles = self.crawler.watchlist_bubbles(symbols)
+        weather_data = self.forecasts.get(location)
+        if weather_data:
+            with span('render', template='weather'):
+                bubbles.append(render_weather_json(location, weather_data))
+        return carousel_messages(bubbles)
+
+    def plan(self):
+        with span('plan', stage='subscribers'):
+            self.groups = fanout.plan(self.subscribers, self.render)
+        print(f"Subscriber digest: {fanout.describe(self.groups)}")
+        return self.groups
 
     def push(self):
-        try:
-            # LineOA - 美股資訊 (使用 Flex Message)
-            flex_msg = create_stock_flex_message(self.stocks_data)
-            usa_stock_line_bot = LineBot(flex_message=flex_msg)
-            usa_stock_line_bot.push_message()
-
-            # Slack (使用文字格式)
-            result = '\n'+'\n\n'.join(self.result)
-            slack = SlackNotification(result)
-            slack.push()
-        except Exception as e:
-            print(e)
+        """回傳成功的 LINE 請求數"""
+        if not self.subscribers:
+            print(f"No subscribers to deliver at {self.deliver_at or 'any time'}")
+            return 0
+        if not line_bot_token:
+            raise Exception("LINE Bot token is missing.")
+        items = fanout.payloads(self.plan(), LineBot.MAX_MESSAGES,
+                                LineBot.MAX_MULTICAST)
+        with span('push', channel='line', mode='subscribers'):
+            sent, failed = fanout.deliver(items, line_bot_token,
+                                          line_api_endpoint,
+                                          get_delivery_queue(),
+                                          processes=fanout_processes)
+        print(f"Subscriber digest sent: {sent} LINE requests, {failed} failed.")
+        if failed:
+            raise Exception(f"{failed} of {len(items)} subscriber pushes failed")
+        return sent
+
+    def preview(self):
+        """dry-run: 只輸出分組結果"""
+        if self.subscribers:
+            self.plan()
+        else:
+            print(f"No subscribers to deliver at {self.deliver_at or 'any time'}")
+
+
+def build_subscriber_pipeline(deliver_at=None, dry_run=False):
+    """
+    訂閱者推送流程
+
+        subscriber_fetch ── subscriber_push (dry-run 時為 subscriber_preview)
+    """
+    digest = SubscriberDigest(deliver_at=deliver_at)
+    pipeline = Pipeline()
+    if not dry_run:
+        pipeline.add('dead_letter_replay', replay_dead_letters)
+    pipeline.add('subscriber_fetch', digest.fetch)
+    if dry_run:
+        pipeline.add('subscriber_preview', digest.preview,
+                     deps=['subscriber_fetch'])
+    else:
+        pipeline.add('subscriber_push', digest.push, deps=['subscriber_fetch'])
+    return pipeline
+
+
+def only_if_changed(store, channel, push, *sources):
+    """
+    包裝推送工作: 所有來源的內容都與上次推送到此通道時相同,就略過
+    產生訊息與推送;推送成功後記錄新內容
+    """
+    def job():
+        items = {}
+        for source in sources:
+            items.update({f'{channel}:{k}': v
+                          for k, v in source.state_items().items()})
+        if items and not store.changed_keys(items):
+            print(f"Skipping {channel} push: nothing changed since last push")
+            return
+        if push() is not False:
+            store.mark(items)
+    return job
+
+
+def build_pipeline(location='高雄市', batch=False, incremental=False,
+                   stocks=True, weather=True, dry_run=False, push=True):
+    """
+    建立每日工作流程: 美股與氣象兩條流程互不相依,同時執行
+
+        stock_fetch ─┬─ stock_line_push
+                     ├─ stock_slack_push
+                     └─ stock_history
+        weather_fetch ── weather_push
+        dead_letter_replay
+
+    batch=True 時,兩個 LINE 推送合併成一則 carousel (line_digest_push),
+    只要其中一個來源抓取成功就推送;
+    設定 SLACK_TARGETS 時,Slack 改以 Block Kit 推送到多個目標 (slack_digest_push,
+    只建立其中一條流程時也是;與 line_digest_push 相同,有一個來源成功就推送);
+    設定 WATCHLIST_PATH 時,另依各使用者的自選清單推送 (watchlist_push);
+    incremental=True 時,內容與上次推送相同的推送工作會直接略過;
+    stocks / weather 可只建立其中一條流程;
+    dry_run=True 時只抓取並輸出內容 (stock_preview / weather_preview),不推送;
+    push=False 時只抓取 (更新 HTTP 快取),不輸出也不推送
+    """
+    watchlists = Watchlists.load(watchlist_path) if watchlist_path else None
+    crawler = WebCrawlerUSA(watchlists=watchlists) if stocks else None
+    forecast = WeatherForecast(location=location) if weather else None
+    store = StateStore(state_path) if incremental else None
+
+    def push_job(channel, push, *sources):
+        if store is None:
+            return push
+        return only_if_changed(store, channel, push, *sources)
+
+    pipeline = Pipeline()
+    if dry_run or not push:
+        if crawler:
+            pipeline.add('stock_fetch', crawler.fetch)
+            if dry_run:
+                pipeline.add('stock_preview', crawler.preview,
+                             deps=['stock_fetch'])
+        if forecast:
+            pipeline.add('weather_fetch', forecast.fetch)
+            if dry_run:
+                pipeline.add('weather_preview', forecast.preview,
+                             deps=['weather_fetch'])
+        return pipeline
+
+    pipeline.add('dead_letter_replay', replay_dead_letters)
+    if crawler:
+        pipeline.add('stock_fetch', crawler.fetch)
+        if quote_history:
+            pipeline.add('stock_history', crawler.record_history,
+                         deps=['stock_fetch'])
+    if forecast:
+        pipeline.add('weather_fetch', forecast.fetch)
+    if batch and crawler and forecast:
+        # 其中一個來源抓取失敗時仍推送另一個
+        pipeline.add('line_digest_push',
+                     push_job('line',
+                              lambda: push_line_digest(crawler, forecast),
+                              crawler, forecast),
+                     after=['stock_fetch', 'weather_fetch'])
+    else:
+        if crawler:
+            pipeline.add('stock_line_push',
+                         push_job('line', crawler.push_line, crawler),
+                         deps=['stock_fetch'])
+        if forecast:
+            pipeline.add('weather_push',
+                         push_job('line', forecast.push, forecast),
+                         deps=['weather_fetch'])
+    if crawler and watchlists:
+        pipeline.add('watchlist_push', crawler.push_watchlists,
+                     deps=['stock_fetch'])
+    if slack_targets and (crawler or forecast):
+        # 只有美股或只有天氣時也走 SLACK_TARGETS (不一定有設定 SLACK_WEBHOOK)
+        sources = [source for source in (crawler, forecast) if source]
+        fetches = (['stock_fetch'] if crawler else []) + (
+            ['weather_fetch'] if forecast else [])
+        pipeline.add('slack_digest_push',
+                     push_job('slack',
+                              lambda: push_slack_digest(crawler, forecast),
+                              *sources),
+                     after=fetches)
+    elif crawler:
+        pipeline.add('stock_slack_push',
+                     push_job('slack', crawler.push_slack, crawler),
+                     deps=['stock_fetch'])
+    return pipeline
 
 
 if __name__ == '__main__':
-    # 美股資訊
-    try:
-        print("=" * 50)
-        print("開始執行美股資訊爬蟲...")
-        print("=" * 50)
-        crawler = WebCrawlerUSA()
-        crawler.fetch()
-        crawler.push()
-        print("美股資訊推送完成")
-    except Exception as e:
-        print(f"美股資訊執行失敗: {e}")
-
-    # 氣象資訊
-    try:
-        print("\n" + "=" * 50)
-        print("開始執行氣象資訊...")
-        print("=" * 50)
-        weather = WeatherForecast(location='高雄市')
-        weather.fetch()
-        weather.push()
-        print("氣象資訊推送完成")
-    except Exception as e:
-        print(f"氣象資訊執行失敗: {e}")
+    pipeline = build_pipeline(location='高雄市', batch=line_batch,
+                              incremental=push_only_changed)
+    pipeline.run()
+    pipeline.report()
+    metrics.export()
+    # 任一工作失敗時以非零結束,GitHub Actions 才會標示失敗
+    sys.exit(0 if pipeline.ok else 1)
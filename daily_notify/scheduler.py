@@ -0,0 +1,187 @@
+"""
+程式內排程器
+
+支援多個 cron 格式 (分 時 日 月 星期) 的工作,也可隨時手動觸發。
+同一個工作執行中時,新的觸發會被略過,不會重疊執行。
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+# 分、時、日、月、星期 (0 與 7 都是星期日)
+FIELD_RANGES = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 7)]
+
+
+def _parse_field(text, low, high):
+    values = set()
+    for part in text.split(','):
+        step = 1
+        if '/' in part:
+            part, step_text = part.split('/', 1)
+            step = int(step_text)
+        if part == '*':
+            start, end = low, high
+        elif '-' in part:
+            start, end = (int(v) for v in part.split('-', 1))
+        else:
+            start = int(part)
+            end = high if step != 1 else start
+        if start < low or end > high or start > end or step < 1:
+            raise ValueError(f"Invalid cron field: {text}")
+        values.update(range(start, end + 1, step))
+    return frozenset(values)
+
+
+class CronSchedule:
+    """5 欄位 cron 表示式"""
+
+    def __init__(self, expr):
+        fields = expr.split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron expression needs 5 fields: {expr}")
+        self.expr = expr
+        (self.minutes, self.hours, self.days, self.months,
+         weekdays) = (_parse_field(f, *r)
+                      for f, r in zip(fields, FIELD_RANGES))
+        self.weekdays = frozenset(d % 7 for d in weekdays)
+        # 日與星期都有限制時,任一符合即可 (與 cron 相同)
+        self.any_day = fields[2] == '*'
+        self.any_weekday = fields[4] == '*'
+
+    def _day_matches(self, dt):
+        day_ok = dt.day in self.days
+        weekday_ok = (dt.weekday() + 1) % 7 in self.weekdays
+        if self.any_day or self.any_weekday:
+            return day_ok and weekday_ok
+        return day_ok or weekday_ok
+
+    def next_after(self, dt):
+        """dt 之後 (不含) 的下一次執行時間"""
+        dt = dt.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = dt + timedelta(days=366 * 5)
+        while dt < limit:
+            if dt.month not in self.months or not self._day_matches(dt):
+                dt = (dt + timedelta(days=1)).replace(hour=0, minute=0)
+                continue
+            if dt.hour not in self.hours:
+                dt = (dt + timedelta(hours=1)).replace(minute=0)
+                continue
+            if dt.minute not in self.minutes:
+                dt += timedelta(minutes=1)
+                continue
+            return dt
+        raise ValueError(f"Cron expression never matches: {self.expr}")
+
+
+class Scheduler:
+    """
+    Args:
+        tz: 排程使用的時區 (tzinfo),None 表示系統時區
+        max_workers: 同時執行的工作數上限
+    """
+
+    def __init__(self, tz=None, max_workers=4):
+        self.tz = tz
+        self.jobs = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._thread = None
+
+    def now(self):
+        return datetime.now(self.tz)
+
+    def add(self, name, func, cron=None):
+        """加入工作,cron 為 None 時只能手動觸發"""
+        schedule = CronSchedule(cron) if cron else None
+        with self._lock:
+            self.jobs[name] = {
+                'func': func,
+                'schedule': schedule,
+                'next_run': schedule.next_after(self.now()) if schedule else None,
+                'running': False,
+                'last_run': None,
+                'last_status': None,
+                'last_error': None,
+                'last_seconds': None,
+            }
+        self._wake.set()
+        return self
+
+    def trigger(self, name):
+        """立即執行工作,回傳是否有開始執行"""
+        with self._lock:
+            job = self.jobs.get(name)
+            if job is None:
+                raise KeyError(name)
+            if job['running']:
+                return False
+            job['running'] = True
+        self._executor.submit(self._run, name)
+        return True
+
+    def _run(self, name):
+        job = self.jobs[name]
+        start = time.perf_counter()
+        started_at = self.now()
+        try:
+            job['func']()
+            status, error = 'ok', None
+        except Exception as e:
+            status, error = 'failed', str(e)
+            print(f"Scheduled job '{name}' failed: {e}")
+        with self._lock:
+            job.update(running=False, last_run=started_at.isoformat(),
+                       last_status=status, last_error=error,
+                       last_seconds=time.perf_counter() - start)
+
+    def status(self):
+        with self._lock:
+            return {
+                name: {
+                    'cron': job['schedule'].expr if job['schedule'] else None,
+                    'next_run': job['next_run'].isoformat() if job['next_run'] else None,
+                    'running': job['running'],
+                    'last_run': job['last_run'],
+                    'last_status': job['last_status'],
+                    'last_error': job['last_error'],
+                    'last_seconds': job['last_seconds'],
+                }
+                for name, job in self.jobs.items()
+            }
+
+    def _loop(self):
+        while not self._stop.is_set():
+            now = self.now()
+            due = []
+            with self._lock:
+                upcoming = []
+                for name, job in self.jobs.items():
+                    if job['next_run'] is None:
+                        continue
+                    if job['next_run'] <= now:
+                        due.append(name)
+                        job['next_run'] = job['schedule'].next_after(now)
+                    upcoming.append(job['next_run'])
+            for name in due:
+                if not self.trigger(name):
+                    print(f"Skipping '{name}': previous run still in progress")
+            wait = 60.0
+            if upcoming:
+                wait = max(0.0, min((min(upcoming) - self.now()).total_seconds(), 60.0))
+            self._wake.wait(wait)
+            self._wake.clear()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+        self._executor.shutdown(wait=True)
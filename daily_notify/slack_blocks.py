@@ -0,0 +1,75 @@
+"""
+Slack Block Kit 模板
+"""
+# 每則 Slack 訊息最多 50 個 blocks
+MAX_BLOCKS = 50
+
+
+def stock_blocks(stocks_data):
+    """美股 Block Kit blocks"""
+    blocks = [
+        {"type": "header",
+         "text": {"type": "plain_text", "text": "📊 美股日報", "emoji": True}},
+    ]
+    if stocks_data:
+        blocks.append({
+            "type": "context",
+            "elements": [{"type": "mrkdwn", "text": stocks_data[0]["date"]}],
+        })
+    for stock in stocks_data:
+        icon = "▼" if stock["trend"] == "down" else "▲"
+        blocks.append({
+            "type": "section",
+            "text": {
+                "type": "mrkdwn",
+                "text": (f"*{stock['name']}*\n{stock['price']}  "
+                         f"{icon} {stock['change']}  {icon} {stock['percent']}"),
+            },
+        })
+    return blocks
+
+
+def weather_blocks(location_name, weather_data):
+    """天氣 Block Kit blocks"""
+    blocks = [
+        {"type": "header",
+         "text": {"type": "plain_text", "text": f"🌤️ {location_name} 36 小時預報",
+                  "emoji": True}},
+    ]
+    for weather in weather_data:
+        blocks.append({
+            "type": "section",
+            "text": {
+                "type": "mrkdwn",
+                "text": (f"{weather['emoji']} *{weather['period']}* "
+                         f"({weather['time']})\n{weather['weather']},"
+                         f"{weather['comfort']}\n"
+                         f"🌡️ {weather['minTemp']}° - {weather['maxTemp']}°  "
+                         f"💧 {weather['rain']}%"),
+            },
+        })
+    return blocks
+
+
+def pack_messages(sections, fallback_text):
+    """
+    將多段 blocks 合併成最少則訊息,每則不超過 MAX_BLOCKS
+
+    Args:
+        sections: list of blocks list,同一段不會被拆開 (除非本身超過上限)
+    """
+    messages = []
+    current = []
+    for blocks in sections:
+        if current and len(current) + 1 + len(blocks) > MAX_BLOCKS:
+            messages.append(current)
+            current = []
+        if current:
+            current.append({"type": "divider"})
+        current.extend(blocks)
+        while len(current) > MAX_BLOCKS:
+            messages.append(current[:MAX_BLOCKS])
+            current = current[MAX_BLOCKS:]
+    if current:
+        messages.append(current)
+    return [{"text": fallback_text, "blocks": blocks} for blocks in messages]
@@ -0,0 +1,87 @@
+"""
+走勢小圖 (sparkline) PNG
+
+不依賴影像套件: 以調色盤 PNG (背景透明 + 一種線條顏色) 直接編碼。
+檔名為內容雜湊值,相同資料只會產生一次。
+"""
+import hashlib
+import os
+import struct
+import tempfile
+import zlib
+
+WIDTH = 240
+HEIGHT = 60
+PADDING = 3
+UP_COLOR = (0x00, 0xC8, 0x51)
+DOWN_COLOR = (0xFF, 0x44, 0x44)
+
+
+def _chunk(kind, data):
+    return (struct.pack('>I', len(data)) + kind + data
+            + struct.pack('>I', zlib.crc32(kind + data) & 0xFFFFFFFF))
+
+
+def encode_png(pixels, width, height, color):
+    """pixels: 每列一個 bytearray (0 = 透明, 1 = 線條)"""
+    raw = b''.join(b'\x00' + bytes(row) for row in pixels)
+    return b''.join([
+        b'\x89PNG\r\n\x1a\n',
+        _chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 3, 0, 0, 0)),
+        _chunk(b'PLTE', bytes((255, 255, 255)) + bytes(color)),
+        _chunk(b'tRNS', b'\x00\xff'),
+        _chunk(b'IDAT', zlib.compress(raw, 9)),
+        _chunk(b'IEND', b''),
+    ])
+
+
+def render_png(values, width=WIDTH, height=HEIGHT):
+    """將數列畫成折線圖,最後一點高於第一點用綠色,否則紅色"""
+    pixels = [bytearray(width) for _ in range(height)]
+    low, high = min(values), max(values)
+    span = (high - low) or 1.0
+    inner_w = width - 2 * PADDING - 1
+    inner_h = height - 2 * PADDING - 1
+    step = inner_w / max(1, len(values) - 1)
+    points = [(PADDING + i * step,
+               PADDING + inner_h - (v - low) / span * inner_h)
+              for i, v in enumerate(values)]
+    if len(points) == 1:
+        points.append((PADDING + inner_w, points[0][1]))
+    for (x0, y0), (x1, y1) in zip(points, points[1:]):
+        steps = int(max(abs(x1 - x0), abs(y1 - y0))) + 1
+        for s in range(steps + 1):
+            x = round(x0 + (x1 - x0) * s / steps)
+            y = round(y0 + (y1 - y0) * s / steps)
+            # 線寬 2px
+            for yy in (y, y + 1):
+                if 0 <= yy < height:
+                    pixels[yy][x] = 1
+    color = UP_COLOR if values[-1] >= values[0] else DOWN_COLOR
+    return encode_png(pixels, width, height, color)
+
+
+class SparklineStore:
+    """
+    Args:
+        directory: PNG 存放目錄 (第一次寫入時建立)
+        base_url: 目錄對外公開的 HTTPS 網址,LINE 圖片必須能從外部讀取
+    """
+
+    def __init__(self, directory, base_url):
+        self.directory = directory
+        self.base_url = base_url.rstrip('/')
+
+    def url(self, values):
+        """回傳數列對應圖片的網址,尚未產生時才繪製"""
+        key = hashlib.sha1(
+            ','.join(f'{v:.10g}' for v in values).encode('ascii')).hexdigest()
+        filename = f'{key[:16]}.png'
+        path = os.path.join(self.directory, filename)
+        if not os.path.exists(path):
+            os.makedirs(self.directory, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(render_png(values))
+            os.replace(tmp, path)
+        return f'{self.base_url}/{filename}'
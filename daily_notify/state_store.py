@@ -0,0 +1,62 @@
+"""
+推送狀態紀錄
+
+以 key (例如 line:stock:道瓊指數、slack:weather:高雄市) 記錄最後一次推送的
+內容與雜湊值,用來判斷資料是否有變動。
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+
+
+def content_hash(data):
+    text = json.dumps(data, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+class StateStore:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._state = None
+
+    def _load(self):
+        if self._state is None:
+            try:
+                with open(self.path, encoding='utf-8') as f:
+                    self._state = json.load(f)
+            except (OSError, ValueError):
+                self._state = {}
+        return self._state
+
+    def get(self, key):
+        with self._lock:
+            return self._load().get(key)
+
+    def changed_keys(self, items):
+        """回傳內容與上次推送不同 (或從未推送) 的 key"""
+        with self._lock:
+            state = self._load()
+            return [key for key, data in items.items()
+                    if state.get(key, {}).get('hash') != content_hash(data)]
+
+    def mark(self, items):
+        """記錄已推送的內容並寫回檔案"""
+        now = time.time()
+        with self._lock:
+            state = self._load()
+            for key, data in items.items():
+                state[key] = {'hash': content_hash(data), 'value': data,
+                              'pushed_at': now}
+            self._save(state)
+
+    def _save(self, state):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp = f'{self.path}.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(state, f, ensure_ascii=False, indent=1)
+        os.replace(tmp, self.path)
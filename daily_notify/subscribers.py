@@ -0,0 +1,100 @@
+"""
+訂閱者名單 (SQLite)
+
+每位訂閱者可設定自己的天氣縣市、追蹤代號與推送時間 (台北時間 HH:MM)。
+代號為自選清單的名稱、cnyes 路徑或網址 (見 watchlist.py)。
+"""
+import json
+import sqlite3
+import threading
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS subscribers (
+    user_id TEXT PRIMARY KEY,
+    location TEXT,
+    symbols TEXT NOT NULL DEFAULT '[]',
+    deliver_at TEXT,
+    active INTEGER NOT NULL DEFAULT 1,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS subscribers_deliver_at
+    ON subscribers (deliver_at, active);
+"""
+
+
+def _row(row):
+    return {
+        'user_id': row[0],
+        'location': row[1],
+        'symbols': json.loads(row[2]),
+        'deliver_at': row[3],
+        'active': bool(row[4]),
+    }
+
+
+class SubscriberStore:
+    """
+    Args:
+        path: SQLite 檔案路徑 (':memory:' 可用於測試)
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(SCHEMA)
+
+    def upsert(self, user_id, location=None, symbols=None, deliver_at=None,
+               active=True):
+        """新增或更新訂閱者,未指定的欄位保留原值"""
+        with self._lock, self._conn:
+            current = self._conn.execute(
+                'SELECT location, symbols, deliver_at FROM subscribers '
+                'WHERE user_id = ?', (user_id,)).fetchone()
+            if current is not None:
+                location = current[0] if location is None else location
+                symbols = (json.loads(current[1]) if symbols is None
+                           else symbols)
+                deliver_at = current[2] if deliver_at is None else deliver_at
+            self._conn.execute(
+                'INSERT OR REPLACE INTO subscribers '
+                '(user_id, location, symbols, deliver_at, active, updated_at) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (user_id, location, json.dumps(list(symbols or []),
+                                               ensure_ascii=False),
+                 deliver_at, int(active), time.time()))
+
+    def remove(self, user_id):
+        with self._lock, self._conn:
+            self._conn.execute('DELETE FROM subscribers WHERE user_id = ?',
+                               (user_id,))
+
+    def get(self, user_id):
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT user_id, location, symbols, deliver_at, active '
+                'FROM subscribers WHERE user_id = ?', (user_id,)).fetchone()
+        return _row(row) if row else None
+
+    def subscribers(self, deliver_at=None):
+        """啟用中的訂閱者,指定 deliver_at 時只回傳該時間推送的"""
+        query = ('SELECT user_id, location, symbols, deliver_at, active '
+                 'FROM subscribers WHERE active = 1')
+        params = ()
+        if deliver_at is not None:
+            query += ' AND deliver_at = ?'
+            params = (deliver_at,)
+        with self._lock:
+            rows = self._conn.execute(query + ' ORDER BY user_id',
+                                      params).fetchall()
+        return [_row(row) for row in rows]
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute(
+                'SELECT COUNT(*) FROM subscribers WHERE active = 1'
+            ).fetchone()[0]
+
+    def close(self):
+        self._conn.close()
@@ -0,0 +1,134 @@
+"""
+共用 HTTP 連線層
+
+所有抓取 (cnyes、氣象署) 與推送 (LINE、Slack) 都透過同一個
+requests.Session,重複使用 keep-alive 連線,避免每次推送重新做 TCP/TLS 握手。
+"""
+import threading
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from metrics import metrics
+
+# 連線池設定
+POOL_CONNECTIONS = 10  # 快取的主機數
+POOL_MAXSIZE = 20  # 每個主機保留的連線數
+DEFAULT_TIMEOUT = (5, 15)  # (連線, 讀取) 秒數
+RETRY_TOTAL = 3
+RETRY_BACKOFF = 0.5
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+_session = None
+_line_bot_api = None
+_lock = threading.RLock()
+
+
+class TimeoutHTTPAdapter(HTTPAdapter):
+    """未指定 timeout 的請求自動套用預設值"""
+
+    def __init__(self, *args, timeout=DEFAULT_TIMEOUT, **kwargs):
+        self.timeout = timeout
+        super().__init__(*args, **kwargs)
+
+    def send(self, request, **kwargs):
+        if kwargs.get('timeout') is None:
+            kwargs['timeout'] = self.timeout
+        return super().send(request, **kwargs)
+
+
+def _record_response(response, *args, **kwargs):
+    """統計每個主機的請求數、狀態碼、重試次數與下載位元組"""
+    if not metrics.enabled:
+        return
+    host = urlsplit(response.url).netloc
+    metrics.incr('http_requests', host=host, status=response.status_code)
+    retries = getattr(getattr(response.raw, 'retries', None), 'history', ())
+    if retries:
+        metrics.incr('http_retries', len(retries), host=host)
+    # 串流請求不能在這裡讀取內容
+    if not kwargs.get('stream'):
+        metrics.incr('http_bytes', len(response.content), host=host)
+
+
+def create_session(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE,
+                   timeout=DEFAULT_TIMEOUT, retries=RETRY_TOTAL):
+    """建立帶連線池、逾時與重試設定的 Session"""
+    # 只重試 idempotent 方法,POST 推送不自動重送以免重複發送
+    retry = Retry(
+        total=retries,
+        backoff_factor=RETRY_BACKOFF,
+        status_forcelist=RETRY_STATUS,
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = TimeoutHTTPAdapter(
+        pool_connections=pool_connections, pool_maxsize=pool_maxsize,
+        max_retries=retry, timeout=timeout)
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.hooks['response'].append(_record_response)
+    return session
+
+
+def get_session():
+    """取得全域共用的 Session"""
+    global _session
+    with _lock:
+        if _session is None:
+            _session = create_session()
+        return _session
+
+
+def _session_http_client():
+    """
+    讓 LINE SDK 走共用 Session 的 HttpClient
+
+    linebot 載入很慢,只在第一次建立 LineBotApi 時才 import
+    """
+    from linebot.http_client import RequestsHttpClient, RequestsHttpResponse
+
+    class SessionHttpClient(RequestsHttpClient):
+        def __init__(self, timeout=RequestsHttpClient.DEFAULT_TIMEOUT,
+                     session=None):
+            super().__init__(timeout)
+            self.session = session or get_session()
+
+        def get(self, url, headers=None, params=None, stream=False, timeout=None):
+            response = self.session.get(
+                url, headers=headers, params=params, stream=stream,
+                timeout=timeout or self.timeout)
+            return RequestsHttpResponse(response)
+
+        def post(self, url, headers=None, data=None, timeout=None):
+            response = self.session.post(
+                url, headers=headers, data=data, timeout=timeout or self.timeout)
+            return RequestsHttpResponse(response)
+
+        def delete(self, url, headers=None, data=None, timeout=None):
+            response = self.session.delete(
+                url, headers=headers, data=data, timeout=timeout or self.timeout)
+            return RequestsHttpResponse(response)
+
+        def put(self, url, headers=None, data=None, timeout=None):
+            response = self.session.put(
+                url, headers=headers, data=data, timeout=timeout or self.timeout)
+            return RequestsHttpResponse(response)
+
+    return SessionHttpClient
+
+
+def get_line_bot_api(channel_access_token):
+    """取得共用的 LineBotApi (同一 token 只建立一次)"""
+    global _line_bot_api
+    with _lock:
+        if (_line_bot_api is None
+                or _line_bot_api[0] != channel_access_token):
+            from linebot import LineBotApi
+            api = LineBotApi(channel_access_token,
+                             http_client=_session_http_client())
+            _line_bot_api = (channel_access_token, api)
+        return _line_bot_api[1]
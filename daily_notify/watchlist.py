@@ -0,0 +1,107 @@
+"""
+自選清單
+
+每位訂閱者可追蹤自己的一組代號 (美股指數、台股、美股個股...),
+所有清單合併去重後每個代號每次執行只抓一次,再依清單組成各自的 bubble。
+
+設定檔 (JSON):
+    {
+      "symbols": {"台積電": "twstock/TWS/2330", "蘋果": "usstock/detail/AAPL"},
+      "users": {"Uxxxxxxxx": ["道瓊指數", "台積電"],
+                "Uyyyyyyyy": ["台積電", "index/GI/SOX"]}
+    }
+
+清單項目可以是 symbols 或預設指數中的名稱,也可以直接寫 cnyes 路徑或網址
+(此時以路徑最後一段作為顯示名稱)。
+"""
+import json
+import re
+from urllib.parse import urlsplit
+
+CNYES_BASE = 'https://invest.cnyes.com'
+CNYES_HOST = 'invest.cnyes.com'
+# 支援的 cnyes 頁面路徑 (與 quote_sources.api_symbol 相同)
+CNYES_PATH = re.compile(
+    r'(?:index/[A-Za-z0-9]+|twstock/[A-Za-z0-9]+|usstock/detail)/[A-Za-z0-9._-]+')
+
+# 預設追蹤的美股指數 (名稱, 網址)
+DEFAULT_SYMBOLS = [
+    ('道瓊指數', f'{CNYES_BASE}/index/GI/DJI'),  # DJI
+    ('S&P 500', f'{CNYES_BASE}/index/GI/INX'),  # SPX
+    ('費城半導體', f'{CNYES_BASE}/index/GI/SOX'),  # 費城半導體
+    ('那斯達克綜合指數', f'{CNYES_BASE}/index/GI/IXIC'),  # NASDAQ
+]
+
+
+def symbol_url(path):
+    """'index/GI/DJI' -> 'https://invest.cnyes.com/index/GI/DJI'"""
+    if path.startswith(('http://', 'https://')):
+        return path
+    return f"{CNYES_BASE}/{path.strip('/')}"
+
+
+def cnyes_symbol_url(text):
+    """
+    使用者輸入的 cnyes 路徑或網址 -> 網址,不是 invest.cnyes.com 的
+    index/、twstock/、usstock/ 頁面時回傳 None (避免替外部輸入抓取任意網址)
+    """
+    text = text.strip()
+    if text.startswith(('http://', 'https://')):
+        parts = urlsplit(text)
+        if parts.hostname != CNYES_HOST or parts.query or parts.fragment:
+            return None
+        text = parts.path
+    path = text.strip('/')
+    if not CNYES_PATH.fullmatch(path):
+        return None
+    return f"{CNYES_BASE}/{path}"
+
+
+class Watchlists:
+    """
+    Args:
+        users: {user_id: [名稱或路徑, ...]}
+        symbols: {名稱: 路徑或網址},與 DEFAULT_SYMBOLS 合併
+    """
+
+    def __init__(self, users=None, symbols=None):
+        self.catalog = dict(DEFAULT_SYMBOLS)
+        self.catalog.update({name: symbol_url(path)
+                             for name, path in (symbols or {}).items()})
+        self.names = {}  # 網址 -> 顯示名稱
+        for name, url in self.catalog.items():
+            self.names.setdefault(url, name)
+        self.users = {}  # user_id -> [網址, ...] (去重,保留順序)
+        for user_id, entries in (users or {}).items():
+            self.users[user_id] = list(dict.fromkeys(
+                self.resolve(entry) for entry in entries))
+
+    def resolve(self, entry):
+        """名稱、cnyes 路徑或網址 -> 網址"""
+        if entry in self.catalog:
+            return self.catalog[entry]
+        if '/' not in entry:
+            raise ValueError(f"Unknown watchlist symbol: {entry}")
+        url = symbol_url(entry)
+        self.names.setdefault(url, url.rstrip('/').rsplit('/', 1)[-1])
+        return url
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding='utf-8') as f:
+            config = json.load(f)
+        return cls(users=config.get('users'), symbols=config.get('symbols'))
+
+    def symbols(self):
+        """所有清單合併去重後的 (名稱, 網址)"""
+        urls = dict.fromkeys(url for urls in self.users.values()
+                             for url in urls)
+        return [(self.names[url], url) for url in urls]
+
+    def groups(self):
+        """{(網址, ...): [user_id, ...]},清單相同的使用者共用同一組訊息"""
+        groups = {}
+        for user_id, urls in self.users.items():
+            if urls:
+                groups.setdefault(tuple(urls), []).append(user_id)
+        return groups